@@ -1,16 +1,87 @@
-from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiResponse
+from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiParameter, OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
 
 SEARCH_HISTORY_RESPONSE = {
     "stats": [
         {"city__name": "Moscow", "count": 5},
         {"city__name": "London", "count": 3}
-    ]
+    ],
+    "searches": [
+        {"id": 42, "city": "Moscow", "search_date": "2025-05-26T14:07:00+03:00"},
+        {"id": 41, "city": "London", "search_date": "2025-05-26T13:55:12+03:00"}
+    ],
+    "next": "WyIyMDI1LTA1LTI2VDEwOjU1OjEyKzAwOjAwIiw0MV0"
 }
 
+SEARCH_HISTORY_PARAMETERS = [
+    OpenApiParameter(
+        name="cursor",
+        type=OpenApiTypes.STR,
+        description="Курсор следующей страницы из поля next предыдущего ответа",
+    ),
+    OpenApiParameter(
+        name="page_size",
+        type=OpenApiTypes.INT,
+        description="Количество запросов на странице",
+    ),
+]
+
+FORECAST_CACHE_STATS_RESPONSE = {
+    "hits": 120,
+    "misses": 30,
+    "hit_ratio": 0.8,
+    "tiers": {
+        "default": {"l1_hits": 900, "l1_misses": 150, "l2_hits": 120, "l2_misses": 30, "l1_entries": 85},
+        "forecasts": {"l1_hits": 100, "l1_misses": 50, "l2_hits": 20, "l2_misses": 30, "l1_entries": 12}
+    },
+    "circuit_breakers": {
+        "geocoding-api.open-meteo.com/v1/search": {"state": "closed", "failures": 0},
+        "api.open-meteo.com/v1/forecast": {"state": "open", "failures": 5}
+    }
+}
+
+FORECAST_RESPONSE = {
+    "city": {"name": "London", "latitude": 51.50853, "longitude": -0.12574},
+    "current": {
+        "temperature": 15.5,
+        "windspeed": 10.2,
+        "winddirection": 180,
+        "weathercode": "Пасмурно",
+        "time": "2025-05-26T14:00"
+    },
+    "hourly": [
+        {"time": "2025-05-26T00:00", "temperature": 11.2, "humidity": 84, "weathercode": 3,
+         "weather": "Пасмурно", "temperature_f": 52.2}
+    ],
+    "daily": [
+        {"date": "2025-05-26", "max_temp": 18.0, "min_temp": 10.4, "weathercode": 3, "weather": "Пасмурно",
+         "max_temp_f": 64.4, "min_temp_f": 50.7, "avg_temp": 14.1, "avg_humidity": 72.5}
+    ],
+    "stale": False
+}
+
+FORECAST_PARAMETERS = [
+    OpenApiParameter(
+        name="city",
+        type=OpenApiTypes.STR,
+        description="Название города",
+    ),
+    OpenApiParameter(
+        name="lat",
+        type=OpenApiTypes.FLOAT,
+        description="Широта (вместо city, вместе с lon)",
+    ),
+    OpenApiParameter(
+        name="lon",
+        type=OpenApiTypes.FLOAT,
+        description="Долгота (вместо city, вместе с lat)",
+    ),
+]
+
 search_history_docs = extend_schema(
     summary="История поиска",
-    description="Возвращает статистику поиска городов пользователем",
+    description="Возвращает статистику поиска городов пользователем и постраничный список его запросов",
+    parameters=SEARCH_HISTORY_PARAMETERS,
     responses={
         200: OpenApiResponse(
             response=OpenApiTypes.OBJECT,
@@ -22,6 +93,10 @@ search_history_docs = extend_schema(
                 )
             ]
         ),
+        400: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Некорректный курсор",
+        ),
         401: OpenApiResponse(
             response=OpenApiTypes.OBJECT,
             description="Ошибка авторизации",
@@ -37,7 +112,8 @@ search_history_docs = extend_schema(
 
 search_history_dict = {
     "summary": "История поиска",
-    "description": "Возвращает статистику поиска городов пользователем",
+    "description": "Возвращает статистику поиска городов пользователем и постраничный список его запросов",
+    "parameters": SEARCH_HISTORY_PARAMETERS,
     "responses": {
         200: OpenApiResponse(
             response=OpenApiTypes.OBJECT,
@@ -63,3 +139,179 @@ search_history_dict = {
     # "auth": [{'basic': []}],
     "tags": ["История"]
 }
+
+SEARCH_HISTORY_EXPORT_PARAMETERS = [
+    OpenApiParameter(
+        name="export_format",
+        type=OpenApiTypes.STR,
+        enum=["csv", "ndjson"],
+        default="csv",
+        description="Формат выгрузки",
+    ),
+    OpenApiParameter(
+        name="date_from",
+        type=OpenApiTypes.STR,
+        description="Начало периода (ГГГГ-ММ-ДД или дата и время ISO 8601), включительно",
+    ),
+    OpenApiParameter(
+        name="date_to",
+        type=OpenApiTypes.STR,
+        description="Конец периода: дата включительно или дата и время ISO 8601 (не включая)",
+    ),
+    OpenApiParameter(
+        name="all_users",
+        type=OpenApiTypes.STR,
+        enum=["1"],
+        description="Выгрузить историю всех пользователей (только для администраторов)",
+    ),
+]
+
+search_history_export_docs = extend_schema(
+    summary="Выгрузка истории поиска",
+    description="Потоково выгружает всю историю поиска пользователя в CSV или NDJSON, от новых запросов "
+                "к старым. Колонки: id, user_id, city, latitude, longitude, search_date",
+    parameters=SEARCH_HISTORY_EXPORT_PARAMETERS,
+    responses={
+        (200, "text/csv"): OpenApiResponse(
+            response=OpenApiTypes.STR,
+            description="CSV с заголовком",
+            examples=[
+                OpenApiExample(
+                    "Пример выгрузки",
+                    value="id,user_id,city,latitude,longitude,search_date\r\n"
+                          "42,7,Moscow,55.75222,37.61556,2025-05-26T11:07:00+00:00\r\n"
+                )
+            ]
+        ),
+        (200, "application/x-ndjson"): OpenApiResponse(
+            response=OpenApiTypes.STR,
+            description="По одной строке JSON на запрос",
+            examples=[
+                OpenApiExample(
+                    "Пример строки",
+                    value={"id": 42, "user_id": 7, "city": "Moscow", "latitude": 55.75222,
+                           "longitude": 37.61556, "search_date": "2025-05-26T11:07:00+00:00"}
+                )
+            ]
+        ),
+        400: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Некорректный формат или дата",
+        ),
+        401: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Ошибка авторизации",
+        ),
+        403: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Выгрузка истории всех пользователей без прав администратора",
+        ),
+    },
+    tags=["История"],
+)
+
+forecast_cache_stats_docs = extend_schema(
+    summary="Статистика кэша прогнозов",
+    description="Возвращает количество попаданий и промахов кэша прогнозов погоды и уровней кэша "
+                "(локального L1 и общего L2), а также состояние автоматических выключателей запросов "
+                "к Open-Meteo в текущем процессе",
+    responses={
+        200: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Успешный ответ",
+            examples=[
+                OpenApiExample(
+                    "Пример успешного ответа",
+                    value=FORECAST_CACHE_STATS_RESPONSE
+                )
+            ]
+        ),
+        403: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Доступ только для администраторов",
+        )
+    },
+    tags=["Кэш"],
+)
+
+forecast_api_docs = extend_schema(
+    summary="Прогноз погоды",
+    description="Возвращает текущую погоду, почасовой прогноз на 7 дней и прогноз по дням. "
+                "Ответ можно кэшировать до следующего ежечасного обновления модели (Cache-Control), "
+                "повторные запросы с If-None-Match или If-Modified-Since получают 304. "
+                "Если сервис погоды недоступен, возвращается последний полученный прогноз с stale=true",
+    parameters=FORECAST_PARAMETERS,
+    auth=[],
+    responses={
+        200: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Успешный ответ",
+            examples=[
+                OpenApiExample(
+                    "Пример успешного ответа",
+                    value=FORECAST_RESPONSE
+                )
+            ]
+        ),
+        304: OpenApiResponse(description="Прогноз не изменился"),
+        400: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Не указан город или некорректные координаты",
+        ),
+        404: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Город не найден",
+        ),
+        503: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Сервис погоды недоступен",
+        )
+    },
+    tags=["Прогноз"],
+)
+
+forecast_batch_api_docs = extend_schema(
+    summary="Прогноз погоды для нескольких городов",
+    description="Принимает список названий или идентификаторов городов (до 200) и возвращает "
+                "поток NDJSON: по одной строке с прогнозом (как в /api/forecast/) на каждый город. "
+                "Названия, которых ещё нет в базе, ищутся через геокодер, как в /api/forecast/, "
+                "параллельно с выдачей уже известных городов; их прогнозы идут в конце потока. "
+                "Неизвестные идентификаторы возвращают ошибку. "
+                "Прогнозы из кэша отдаются сразу, остальные запрашиваются у Open-Meteo пакетами "
+                "по несколько координат и выводятся по мере получения",
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {
+                "cities": {
+                    "type": "array",
+                    "items": {"oneOf": [{"type": "string"}, {"type": "integer"}]},
+                }
+            },
+            "required": ["cities"],
+        }
+    },
+    auth=[],
+    responses={
+        (200, "application/x-ndjson"): OpenApiResponse(
+            response=OpenApiTypes.STR,
+            description="Поток строк JSON в порядке готовности; у ненайденных городов и при ошибке сервиса "
+                        "погоды строка содержит поле error",
+            examples=[
+                OpenApiExample(
+                    "Пример строки ответа",
+                    value={"query": "London", **FORECAST_RESPONSE}
+                ),
+                OpenApiExample(
+                    "Пример строки с ошибкой",
+                    value={"query": "Nowhere", "error": "Город не найден"}
+                )
+            ]
+        ),
+        400: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Некорректный список городов",
+        )
+    },
+    tags=["Прогноз"],
+)
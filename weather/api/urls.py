@@ -7,6 +7,10 @@ app_name = 'api'
 
 urlpatterns = [
     path('history/', views.search_history_api, name='search_history_api'),
+    path('history/export/', views.search_history_export_api, name='search_history_export_api'),
+    path('forecast/', views.forecast_api, name='forecast_api'),
+    path('forecast/batch/', views.forecast_batch_api, name='forecast_batch_api'),
+    path('forecast-cache/', views.forecast_cache_stats_api, name='forecast_cache_stats_api'),
     path('schema/', SpectacularAPIView.as_view(), name='schema'),
     path('swagger/', SpectacularSwaggerView.as_view(url_name='api:schema')),
     path('redoc/', SpectacularRedocView.as_view(url_name='api:schema')),
@@ -1,19 +1,342 @@
+import csv
+import hashlib
+import json
+import operator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from functools import reduce
+
+import requests
+from asgiref.sync import sync_to_async
+from rest_framework import status
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
-from rest_framework.authentication import BasicAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Count
-from app.models import SearchHistory
+from django.conf import settings
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date
+from app import forecasts
+from app.cruds import (
+    SEARCH_HISTORY_EXPORT_FIELDS, convert_weather_data, create_city, get_city_from_web, get_search_history_from_db,
+    iter_search_history_export, search_cities_in_web,
+)
+from app.models import City
+from app.open_meteo import get_client
+from app.pagination import InvalidCursor, get_page_size
+
+from .schema import (
+    forecast_api_docs, forecast_batch_api_docs, forecast_cache_stats_docs, search_history_docs,
+    search_history_export_docs,
+)
+
+STALE_MAX_AGE = 60
+
+EXPORT_CHUNK_SIZE = 2000
+# Rows per chunk written to the client; one write per row would cost a syscall each.
+EXPORT_LINES_PER_WRITE = 500
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
 
-from .schema import search_history_docs
 
 @search_history_docs
 @api_view(['GET'])
 @authentication_classes([BasicAuthentication])
 @permission_classes([IsAuthenticated])
 def search_history_api(request):
-    city_stats = SearchHistory.objects.filter(user=request.user) \
-        .values('city__name') \
-        .annotate(count=Count('id')) \
-        .order_by('-count')
-    return Response({'stats': list(city_stats)})
+    try:
+        searches, city_stats = get_search_history_from_db(
+            user=request.user,
+            cursor=request.query_params.get('cursor'),
+            page_size=get_page_size(request.query_params.get('page_size')),
+        )
+    except InvalidCursor:
+        raise ValidationError({'cursor': 'Некорректный курсор страницы'})
+
+    return Response({
+        'stats': list(city_stats),
+        'searches': [
+            {'id': search.id, 'city': search.city.name, 'search_date': search.search_date}
+            for search in searches
+        ],
+        'next': searches.next_cursor,
+    })
+
+
+def _parse_export_date(value, name, end=False):
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else None
+    except ValueError:
+        day = moment = None
+    if day is not None:
+        # A bare end date includes the whole day.
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    if moment is None:
+        raise ValidationError({name: 'Ожидается дата (ГГГГ-ММ-ДД) или дата и время в формате ISO 8601'})
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def _export_row(row) -> list:
+    return [value.isoformat() if isinstance(value, datetime) else value for value in row]
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _chunked(lines):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= EXPORT_LINES_PER_WRITE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(SEARCH_HISTORY_EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(_export_row(row))
+
+
+def _iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(SEARCH_HISTORY_EXPORT_FIELDS, _export_row(row))), ensure_ascii=False) + '\n'
+
+
+async def _aiter_sync(iterator):
+    # Every step runs in the thread-sensitive sync thread, which owns the request's DB connection.
+    next_chunk = sync_to_async(next)
+    while True:
+        chunk = await next_chunk(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def _streaming_content(request, iterator):
+    """
+    Under ASGI Django buffers a sync iterator whole before sending it, so
+    there it is stepped from an async generator instead.
+    """
+    if isinstance(request._request, ASGIRequest):
+        return _aiter_sync(iterator)
+    return iterator
+
+
+@search_history_export_docs
+@api_view(['GET'])
+@authentication_classes([BasicAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def search_history_export_api(request):
+    # Not "format": DRF reserves that query parameter for renderer negotiation.
+    export_format = request.query_params.get('export_format', 'csv')
+    if export_format not in EXPORT_CONTENT_TYPES:
+        raise ValidationError({'export_format': f'Допустимые значения: {", ".join(EXPORT_CONTENT_TYPES)}'})
+    date_from = _parse_export_date(request.query_params.get('date_from'), 'date_from')
+    date_to = _parse_export_date(request.query_params.get('date_to'), 'date_to', end=True)
+
+    user = request.user
+    if request.query_params.get('all_users') == '1':
+        if not request.user.is_staff:
+            raise PermissionDenied('Выгрузка истории всех пользователей доступна только администраторам')
+        user = None
+
+    rows = iter_search_history_export(user, date_from, date_to, chunk_size=EXPORT_CHUNK_SIZE)
+    lines = _iter_csv(rows) if export_format == 'csv' else _iter_ndjson(rows)
+    response = StreamingHttpResponse(
+        _streaming_content(request, _chunked(lines)), content_type=EXPORT_CONTENT_TYPES[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="search_history.{export_format}"'
+    return response
+
+
+@forecast_cache_stats_docs
+@api_view(['GET'])
+@authentication_classes([BasicAuthentication])
+@permission_classes([IsAdminUser])
+def forecast_cache_stats_api(request):
+    return Response({
+        **forecasts.stats.as_dict(),
+        'tiers': {alias: caches[alias].get_stats() for alias in ('default', 'forecasts')},
+        'circuit_breakers': {breaker.name: breaker.as_dict() for breaker in get_client().breakers.values()},
+    })
+
+
+def _parse_coordinate(value, name, limit) -> float:
+    try:
+        coordinate = float(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: 'Ожидается число'})
+    if not -limit <= coordinate <= limit:
+        raise ValidationError({name: f'Значение должно быть от -{limit} до {limit}'})
+    return coordinate
+
+
+def _resolve_city(query_params) -> City:
+    name = query_params.get('city', '').strip()
+    if name:
+        city = City.objects.filter(name__iexact=name).first() or get_city_from_web(name)
+        if city is None:
+            raise NotFound('Город не найден')
+        return city
+    if 'lat' in query_params or 'lon' in query_params:
+        return City(
+            latitude=_parse_coordinate(query_params.get('lat'), 'lat', 90),
+            longitude=_parse_coordinate(query_params.get('lon'), 'lon', 180),
+        )
+    raise ValidationError({'city': 'Укажите город (city) или координаты (lat и lon)'})
+
+
+def _serialize_forecast(city, weather_data) -> dict:
+    current, daily, hourly = convert_weather_data(weather_data)
+    return {
+        'city': {'name': city.name, 'latitude': city.latitude, 'longitude': city.longitude},
+        'current': current,
+        'hourly': hourly.as_records(),
+        'daily': daily.as_records(),
+        'stale': weather_data.get('stale', False),
+    }
+
+
+@forecast_api_docs
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def forecast_api(request):
+    try:
+        city = _resolve_city(request.query_params)
+        weather_data = forecasts.get_forecast(city)
+    except requests.RequestException:
+        return Response({'detail': 'Не удалось подключиться к сервису погоды'},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    data = _serialize_forecast(city, weather_data)
+
+    # The forecast only changes when the upstream model is updated at the top of the hour.
+    # A stale one is from an earlier run, so it is validated by its ETag alone: the fresh body differs.
+    last_modified = None if data['stale'] else int(forecasts.get_model_run().timestamp())
+    etag = '"{}"'.format(hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = Response(data)
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # A stale forecast is being revalidated, so clients should come back soon.
+    max_age = STALE_MAX_AGE if data['stale'] else forecasts.get_seconds_until_model_update()
+    patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+
+def _resolve_cities(items) -> tuple[list, list]:
+    by_id = City.objects.in_bulk({item for item in items if isinstance(item, int)})
+    by_name = {}
+    names = {item for item in items if isinstance(item, str)}
+    if names:
+        matches = reduce(operator.or_, (Q(name__iexact=name) for name in names))
+        for city in City.objects.filter(matches).order_by('id'):
+            by_name.setdefault(city.name.casefold(), city)
+
+    found, missing = [], []
+    for item in items:
+        city = by_id.get(item) if isinstance(item, int) else by_name.get(item.casefold())
+        if city is None:
+            missing.append(item)
+        else:
+            found.append((item, city))
+    return found, missing
+
+
+def _batch_line(item, data) -> str:
+    return json.dumps({'query': item, **data}, ensure_ascii=False) + '\n'
+
+
+def _geocode(name) -> dict | None:
+    results = search_cities_in_web(name, count=1)
+    return results[0] if results else None
+
+
+def _iter_batch_lines(found, missing):
+    """
+    Streams the cities found in the DB first. Unknown names are geocoded like
+    in /api/forecast/, MAX_PARALLEL_REQUESTS at a time, meanwhile, and their
+    forecasts follow as one more batch; unknown ids are not found.
+    """
+    names = list(dict.fromkeys(item for item in missing if isinstance(item, str)))
+    executor = ThreadPoolExecutor(max_workers=settings.FORECAST_BATCH['MAX_PARALLEL_REQUESTS'])
+    try:
+        lookups = {name: executor.submit(_geocode, name) for name in names}
+        yield from _iter_forecast_lines(found)
+
+        geocoded = []
+        for item in missing:
+            error = 'Город не найден'
+            if isinstance(item, str):
+                try:
+                    result = lookups[item].result()
+                except requests.RequestException:
+                    result, error = None, 'Не удалось подключиться к сервису погоды'
+                if result is not None:
+                    # Saved here rather than in _geocode: the request thread owns the DB connection.
+                    city = create_city(name=result['name'], latitude=result['latitude'],
+                                       longitude=result['longitude'])
+                    geocoded.append((item, city))
+                    continue
+            yield _batch_line(item, {'error': error})
+    finally:
+        # A client that went away does not wait for the remaining lookups.
+        executor.shutdown(wait=False, cancel_futures=True)
+    yield from _iter_forecast_lines(geocoded)
+
+
+def _iter_forecast_lines(found):
+    queries = {}
+    for item, city in found:
+        queries.setdefault(id(city), []).append(item)
+    cities = list({id(city): city for _, city in found}.values())
+
+    for city, weather_data, error in forecasts.iter_forecasts(cities):
+        if weather_data is None:
+            line = {'error': 'Не удалось подключиться к сервису погоды'}
+        else:
+            line = _serialize_forecast(city, weather_data)
+        for item in queries[id(city)]:
+            yield _batch_line(item, line)
+
+
+@forecast_batch_api_docs
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def forecast_batch_api(request):
+    items = request.data.get('cities') if isinstance(request.data, dict) else None
+    max_cities = settings.FORECAST_BATCH['MAX_CITIES']
+    if not isinstance(items, list) or not items:
+        raise ValidationError({'cities': 'Ожидается непустой список названий или идентификаторов городов'})
+    if len(items) > max_cities:
+        raise ValidationError({'cities': f'Не более {max_cities} городов за запрос'})
+    if not all(isinstance(item, (int, str)) and not isinstance(item, bool) for item in items):
+        raise ValidationError({'cities': 'Элементы списка должны быть строками или числами'})
+
+    found, missing = _resolve_cities(items)
+    # Each line is a complete JSON object, written as soon as its forecast is available.
+    return StreamingHttpResponse(
+        _streaming_content(request, _iter_batch_lines(found, missing)), content_type='application/x-ndjson',
+    )
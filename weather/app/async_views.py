@@ -0,0 +1,75 @@
+import asyncio
+
+import requests
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import render, redirect
+
+from .cruds import (
+    aadd_search_history_into_db,
+    acreate_city,
+    ageocode_city,
+    arender_forecast_block,
+    arequest_cities,
+)
+from .models import City
+
+# Templates resolve request.user lazily through the sync ORM, so rendering runs in a thread.
+arender = sync_to_async(render)
+
+
+async def get_weather(request):
+    if request.method == 'POST':
+        city_name = request.POST.get('city')
+        city = await City.objects.filter(name__iexact=city_name).afirst()
+        city_task = None
+
+        if not city:
+            try:
+                result = await ageocode_city(city_name)
+            except requests.RequestException:
+                return await arender(request, 'app/index.html', {
+                    'error': 'Не удалось подключиться к сервису геокодинга. Пожалуйста, попробуйте позже.'
+                })
+
+            if not result:
+                return await arender(request, 'app/index.html', {
+                    'error': 'Город не найден. Пожалуйста, попробуйте другое название.'
+                })
+
+            # The forecast only needs coordinates, so it runs while the city row is written.
+            city_task = asyncio.ensure_future(
+                acreate_city(name=result['name'], latitude=result['latitude'], longitude=result['longitude'])
+            )
+            city = City(name=result['name'], latitude=result['latitude'], longitude=result['longitude'])
+
+        try:
+            forecast_block = await arender_forecast_block(city)
+        except requests.RequestException:
+            forecast_block = None
+        if city_task is not None:
+            city = await city_task
+
+        if forecast_block is None:
+            return await arender(request, 'app/index.html', {
+                'error': 'Не удалось подключиться к сервису погоды. Пожалуйста, попробуйте позже.'
+            })
+
+        # Like the sync view, only searches that got a forecast go to the history.
+        await aadd_search_history_into_db(request, city)
+
+        return await arender(request, 'app/index.html', {
+            'city': city,
+            'forecast_block': forecast_block,
+        })
+
+    return redirect('app:index')
+
+
+async def city_autocomplete(request):
+    query = request.GET.get('query', '')
+    if len(query) >= 2:
+        cities = await arequest_cities(city_name=query)
+
+        return JsonResponse({'cities': [city['name'] for city in cities]})
+    return JsonResponse({'cities': []})
@@ -0,0 +1,273 @@
+import base64
+import json
+import random
+import statistics
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import close_old_connections, connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+BENCHMARK_USERNAME = 'benchmark'
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+
+def _coordinates(name) -> tuple[float, float]:
+    checksum = zlib.crc32(name.encode())
+    return round(checksum % 17000 / 100 - 85, 4), round(checksum // 17000 % 36000 / 100 - 180, 4)
+
+
+class OpenMeteoStub:
+    """
+    Local HTTP stand-in for the Open-Meteo geocoding and forecast APIs.
+
+    Every response is delayed by ``latency`` seconds, ``error_rate`` of them
+    fail with 503, and forecasts carry ``forecast_days`` days of hourly data.
+    ``calls`` counts the requests that reached the stub.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, forecast_days=7, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.forecast_days = forecast_days
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _count_call(self) -> bool:
+        with self._lock:
+            self.calls += 1
+            return self._random.random() < self.error_rate
+
+    def search(self, name, count) -> dict:
+        names = [name if index == 0 else f'{name} {index}' for index in range(count)]
+        return {'results': [
+            dict(zip(('latitude', 'longitude'), _coordinates(result)), name=result) for result in names
+        ]}
+
+    def forecast_one(self, latitude, longitude) -> dict:
+        start = datetime(2025, 1, 1)
+        hours = [start + timedelta(hours=hour) for hour in range(self.forecast_days * 24)]
+        days = [start + timedelta(days=day) for day in range(self.forecast_days)]
+        return {
+            'latitude': latitude,
+            'longitude': longitude,
+            'current_weather': {'temperature': 15.0, 'windspeed': 10.0, 'winddirection': 180,
+                                'weathercode': 3, 'time': hours[0].isoformat(timespec='minutes')},
+            'hourly': {
+                'time': [hour.isoformat(timespec='minutes') for hour in hours],
+                'temperature_2m': [round(10 + hour.hour / 2, 1) for hour in hours],
+                'relativehumidity_2m': [60 + hour.hour for hour in hours],
+                'weathercode': [hour.hour % 4 for hour in hours],
+            },
+            'daily': {
+                'time': [day.date().isoformat() for day in days],
+                'temperature_2m_max': [21.5] * len(days),
+                'temperature_2m_min': [10.0] * len(days),
+                'weathercode': [3] * len(days),
+            },
+        }
+
+    def forecast(self, latitude, longitude):
+        pairs = list(zip(latitude.split(','), longitude.split(',')))
+        forecasts = [self.forecast_one(float(lat), float(lon)) for lat, lon in pairs]
+        return forecasts if len(forecasts) > 1 else forecasts[0]
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fail = stub._count_call()
+                time.sleep(stub.latency)
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if fail:
+                    return self._send(503, {'error': True, 'reason': 'stub error'})
+                if url.path == '/search':
+                    return self._send(200, stub.search(params.get('name', ''), int(params.get('count', 10))))
+                if url.path == '/forecast':
+                    return self._send(200, stub.forecast(params['latitude'], params['longitude']))
+                return self._send(404, {'error': True})
+
+            def _send(self, status, data):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> None:
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def percentile(values, percent) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _get_host() -> str:
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+    return hosts[0] if hosts else 'localhost'
+
+
+def _get_weather(client, index, city_count):
+    return client.post(reverse('app:get_weather'), {'city': f'Benchmark {index % city_count}'})
+
+
+def _city_autocomplete(client, index, city_count):
+    name = f'Benchmark {index % city_count}'
+    return client.get(reverse('app:city_autocomplete'), {'query': name[:2 + index % len(name)]})
+
+
+def _search_history(client, index, city_count):
+    return client.get(reverse('app:search_history'))
+
+
+def _search_history_api(client, index, city_count):
+    credentials = base64.b64encode(f'{BENCHMARK_USERNAME}:{BENCHMARK_PASSWORD}'.encode()).decode()
+    return client.get(reverse('api:search_history_api'), HTTP_AUTHORIZATION=f'Basic {credentials}')
+
+
+SCENARIOS = {
+    'get_weather': _get_weather,
+    'city_autocomplete': _city_autocomplete,
+    'search_history': _search_history,
+    'search_history_api': _search_history_api,
+}
+
+
+def get_benchmark_user() -> User:
+    user, created = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+    if created or not user.check_password(BENCHMARK_PASSWORD):
+        user.set_password(BENCHMARK_PASSWORD)
+        user.save()
+    return user
+
+
+def run_scenario(name, stub, user, requests=100, concurrency=10, city_count=50) -> dict:
+    scenario = SCENARIOS[name]
+    local = threading.local()
+    samples = []
+    samples_lock = threading.Lock()
+
+    def send(index):
+        if not hasattr(local, 'client'):
+            local.client = Client(SERVER_NAME=_get_host())
+            local.client.force_login(user)
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = scenario(local.client, index, city_count)
+        elapsed = time.perf_counter() - started
+        with samples_lock:
+            samples.append((elapsed, response.status_code, queries))
+
+    def worker(indexes):
+        try:
+            for index in indexes:
+                send(index)
+        finally:
+            close_old_connections()
+
+    calls_before = stub.calls
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, [range(start, requests, concurrency) for start in range(concurrency)]))
+    duration = time.perf_counter() - started
+
+    latencies = [elapsed * 1000 for elapsed, _, _ in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, status, _ in samples if status >= 400),
+        'duration_s': round(duration, 3),
+        'requests_per_second': round(len(samples) / duration, 2) if duration else 0.0,
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(max(latencies, default=0.0), 2),
+        },
+        'db_queries_per_request': round(sum(queries for _, _, queries in samples) / len(samples), 2)
+        if samples else 0.0,
+        'upstream_calls_per_request': round((stub.calls - calls_before) / len(samples), 2) if samples else 0.0,
+    }
+
+
+def run_benchmark(scenarios=None, requests=100, concurrency=10, city_count=50, latency=0.05,
+                  error_rate=0.0, forecast_days=7, clear_cache=False, seed=None) -> dict:
+    scenarios = scenarios or list(SCENARIOS)
+    started_at = datetime.now().isoformat(timespec='seconds')
+    config = {
+        'scenarios': scenarios,
+        'requests': requests,
+        'concurrency': concurrency,
+        'city_count': city_count,
+        'latency_s': latency,
+        'error_rate': error_rate,
+        'forecast_days': forecast_days,
+        'clear_cache': clear_cache,
+        'async_views': settings.ASYNC_VIEWS,
+    }
+    user = get_benchmark_user()
+    results = {}
+    with OpenMeteoStub(latency, error_rate, forecast_days, seed) as stub:
+        open_meteo = {**settings.OPEN_METEO, 'GEOCODING_URL': f'{stub.url}/search',
+                      'FORECAST_URL': f'{stub.url}/forecast'}
+        with override_settings(OPEN_METEO=open_meteo):
+            for name in scenarios:
+                if clear_cache:
+                    for alias in settings.CACHES:
+                        caches[alias].clear()
+                results[name] = run_scenario(name, stub, user, requests, concurrency, city_count)
+    return {
+        'started_at': started_at,
+        'config': config,
+        'results': results,
+    }
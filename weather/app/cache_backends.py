@@ -0,0 +1,250 @@
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from . import metrics
+
+CLEAR_BATCH_SIZE = 1000
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class _LocalStore:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = None
+        self.checked_at = 0.0
+        self.stats = {'l1_hits': 0, 'l1_misses': 0, 'l2_hits': 0, 'l2_misses': 0}
+
+
+class TwoTierCache(BaseCache):
+    """
+    A small per-process LRU (L1) in front of a shared cache alias (L2).
+
+    Reads are served from L1 for at most L1_TIMEOUT seconds; writes go
+    through to L2 and replace the local copy. Atomic operations (add, incr,
+    decr) always run on L2. In L2 the keys are namespaced by KEY_PREFIX. ``invalidate_local()`` bumps a generation
+    counter in L2 that makes every worker drop its L1 within
+    GENERATION_CHECK_INTERVAL seconds.
+
+    OPTIONS: SHARED_ALIAS, L1_TIMEOUT, L1_MAX_ENTRIES, GENERATION_CHECK_INTERVAL.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED_ALIAS', 'shared')
+        self._l1_timeout = options.get('L1_TIMEOUT', 5)
+        self._check_interval = options.get('GENERATION_CHECK_INTERVAL', 1)
+        self._generation_key = f'two_tier_generation:{location}'
+        self._location = location
+        with _stores_lock:
+            self._store = _stores.setdefault(location, _LocalStore(options.get('L1_MAX_ENTRIES', 1000)))
+
+    @property
+    def shared(self) -> BaseCache:
+        return caches[self._shared_alias]
+
+    def _count(self, name) -> None:
+        with self._store.lock:
+            self._store.stats[name] += 1
+        if name != 'l1_misses':
+            metrics.record_cache(self._location, name != 'l2_misses')
+
+    def _sync_generation(self) -> None:
+        store = self._store
+        now = time.monotonic()
+        if now - store.checked_at < self._check_interval:
+            return
+        store.checked_at = now
+        generation = self.shared.get(self._generation_key, 0)
+        if generation != store.generation:
+            with store.lock:
+                store.data.clear()
+                store.generation = generation
+
+    def _local_get(self, key):
+        self._sync_generation()
+        store = self._store
+        with store.lock:
+            entry = store.data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                store.data.pop(key, None)
+                return False, None
+            store.data.move_to_end(key)
+            pickled = entry[1]
+        return True, pickle.loads(pickled)
+
+    def _local_set(self, key, value, timeout=DEFAULT_TIMEOUT) -> None:
+        timeout = self._shared_timeout(timeout)
+        l1_timeout = self._l1_timeout if timeout is None else min(self._l1_timeout, timeout)
+        # Values are pickled like in LocMemCache, so callers can't mutate the cached copy.
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        store = self._store
+        with store.lock:
+            if l1_timeout <= 0:
+                store.data.pop(key, None)
+                return
+            store.data[key] = (time.monotonic() + l1_timeout, pickled)
+            store.data.move_to_end(key)
+            while len(store.data) > store.max_entries:
+                store.data.popitem(last=False)
+
+    def _local_delete(self, key) -> None:
+        with self._store.lock:
+            self._store.data.pop(key, None)
+
+    def _shared_key(self, key) -> str:
+        # The shared backend adds its own prefix and version; only this alias' namespace goes in front.
+        return f'{self.key_prefix}:{key}' if self.key_prefix else key
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        found, value = self._local_get(local_key)
+        if found:
+            self._count('l1_hits')
+            return value
+        self._count('l1_misses')
+
+        value = self.shared.get(self._shared_key(key), self._missing_key, version=version)
+        if value is self._missing_key:
+            self._count('l2_misses')
+            return default
+        self._count('l2_hits')
+        self._local_set(local_key, value)
+        return value
+
+    def get_fresh(self, key, default=None, version=None):
+        """Reads L2 past any L1 copy, for read-modify-write under a lock."""
+        local_key = self.make_and_validate_key(key, version=version)
+        value = self.shared.get(self._shared_key(key), self._missing_key, version=version)
+        if value is self._missing_key:
+            return default
+        self._local_set(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remote_keys = {}
+        for original_key in keys:
+            local_key = self.make_and_validate_key(original_key, version=version)
+            hit, value = self._local_get(local_key)
+            if hit:
+                self._count('l1_hits')
+                found[original_key] = value
+            else:
+                self._count('l1_misses')
+                remote_keys[self._shared_key(original_key)] = (original_key, local_key)
+
+        if remote_keys:
+            remote = self.shared.get_many(list(remote_keys), version=version)
+            for shared_key, (original_key, local_key) in remote_keys.items():
+                if shared_key in remote:
+                    self._count('l2_hits')
+                    self._local_set(local_key, remote[shared_key])
+                    found[original_key] = remote[shared_key]
+                else:
+                    self._count('l2_misses')
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self.shared.set(self._shared_key(key), value, self._shared_timeout(timeout), version=version)
+        self._local_set(local_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        keys = {self._shared_key(key): key for key in data}
+        failed = self.shared.set_many(
+            {shared_key: data[key] for shared_key, key in keys.items()}, self._shared_timeout(timeout), version=version,
+        )
+        failed = [keys[shared_key] for shared_key in failed]
+        for key, value in data.items():
+            if key not in failed:
+                self._local_set(self.make_and_validate_key(key, version=version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        added = self.shared.add(self._shared_key(key), value, self._shared_timeout(timeout), version=version)
+        if added:
+            self._local_set(local_key, value, timeout)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.incr(self._shared_key(key), delta, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.make_and_validate_key(key, version=version)
+        return self.shared.touch(self._shared_key(key), self._shared_timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.delete(self._shared_key(key), version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, self._missing_key, version=version) is not self._missing_key
+
+    def clear(self):
+        """
+        Empties L1 and deletes this alias' keys (by KEY_PREFIX) from L2; other
+        aliases on the same shared store keep their entries. Without a
+        KEY_PREFIX only L1 is cleared.
+        """
+        with self._store.lock:
+            self._store.data.clear()
+        if self.key_prefix:
+            self._delete_shared_namespace()
+
+    def _delete_shared_namespace(self) -> None:
+        shared = self.shared
+        prefix = shared.make_key(f'{self.key_prefix}:')
+        if isinstance(shared, RedisCache):
+            client = shared._cache.get_client(write=True)
+            pattern = re.sub(r'([*?\[\]\\])', r'\\\1', prefix) + '*'
+            batch = []
+            for key in client.scan_iter(match=pattern, count=CLEAR_BATCH_SIZE):
+                batch.append(key)
+                if len(batch) >= CLEAR_BATCH_SIZE:
+                    client.delete(*batch)
+                    batch = []
+            if batch:
+                client.delete(*batch)
+        elif isinstance(shared, LocMemCache):
+            with shared._lock:
+                for key in [key for key in shared._cache if key.startswith(prefix)]:
+                    del shared._cache[key]
+                    shared._expire_info.pop(key, None)
+
+    def _shared_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            return self.default_timeout
+        return timeout
+
+    def invalidate_local(self) -> None:
+        self.shared.add(self._generation_key, 0, None)
+        self.shared.incr(self._generation_key)
+        with self._store.lock:
+            self._store.data.clear()
+        self._store.checked_at = 0.0
+
+    def get_stats(self) -> dict:
+        with self._store.lock:
+            stats = dict(self._store.stats)
+            stats['l1_entries'] = len(self._store.data)
+        return stats
+
+    def reset_stats(self) -> None:
+        with self._store.lock:
+            for name in self._store.stats:
+                self._store.stats[name] = 0
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import requests
+
+
+class CircuitOpenError(requests.ConnectionError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Fails fast after ``failure_threshold`` consecutive upstream failures.
+
+    While open, calls are rejected without touching the network. After
+    ``recovery_timeout`` seconds one trial call is let through: success
+    closes the circuit, failure keeps it open for another period. A trial
+    that never reports back lets the next one through after the same period.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at >= self.recovery_timeout:
+                # While half-open, opened_at is when the trial started.
+                self.state, self.opened_at = self.HALF_OPEN, now
+                return True
+            return False
+
+    def check(self) -> None:
+        if not self.allow():
+            raise CircuitOpenError(f'{self.name} временно недоступен')
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Ends a call without an outcome (e.g. cancelled), freeing the trial slot for the next caller."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self.opened_at -= self.recovery_timeout
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures}
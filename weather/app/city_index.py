@@ -0,0 +1,131 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import List
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+
+from .models import City
+
+VERSION_CACHE_KEY = 'city_index_version'
+# Names added under each version are kept this long, so other workers can catch up without a rebuild.
+ADDED_NAME_TIMEOUT = 60 * 60
+CATCH_UP_LIMIT = 100
+
+
+def _get_cache():
+    # The version is compared across workers, so it is never read from an L1 copy.
+    return caches['shared']
+
+
+def get_added_key(version) -> str:
+    return f'city_index_added:{version}'
+
+
+class CityPrefixIndex:
+    """
+    Per-process sorted array of case-folded city names for prefix lookups.
+
+    Workers share a version counter in the cache: a worker that adds a city
+    bumps it and stores the name under the new version. The others insert
+    the names they missed when they notice the change (checked at most once
+    per ``check_interval`` seconds), and rebuild from the database only when
+    some of them are gone or the index was invalidated.
+    """
+
+    def __init__(self, check_interval=1.0):
+        self.check_interval = check_interval
+        self._entries = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _needs_check(self) -> bool:
+        return self._entries is None or time.monotonic() - self._checked_at >= self.check_interval
+
+    def _is_stale(self, version) -> bool:
+        self._checked_at = time.monotonic()
+        return self._entries is None or version != self._version
+
+    def refresh(self, version=None) -> None:
+        if version is None:
+            version = _get_cache().get_or_set(VERSION_CACHE_KEY, 1, None)
+        entries = sorted((name.casefold(), name) for name in City.objects.values_list('name', flat=True).iterator())
+        with self._lock:
+            self._entries = entries
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    def search(self, prefix, limit=10) -> List[str]:
+        entries = self._entries or []
+        folded = prefix.casefold()
+        start = bisect_left(entries, (folded,))
+        names = []
+        # Slicing only ``limit`` entries keeps a short prefix as cheap as a long one.
+        for key, name in entries[start:start + limit]:
+            if not key.startswith(folded):
+                break
+            names.append(name)
+        return names
+
+    def _missed_keys(self, version) -> List[str]:
+        if self._entries is None or self._version is None or not 0 < version - self._version <= CATCH_UP_LIMIT:
+            return []
+        return [get_added_key(number) for number in range(self._version + 1, version + 1)]
+
+    def _catch_up(self, keys, added, version) -> bool:
+        if not keys or len(added) < len(keys):
+            return False
+        with self._lock:
+            for key in keys:
+                self._insert_entry(added[key])
+            self._version = max(self._version, version)
+        return True
+
+    def lookup(self, prefix, limit=10) -> List[str]:
+        if self._needs_check():
+            version = _get_cache().get(VERSION_CACHE_KEY)
+            if version is None or self._is_stale(version):
+                keys = self._missed_keys(version) if version is not None else []
+                if not self._catch_up(keys, _get_cache().get_many(keys) if keys else {}, version):
+                    self.refresh(version)
+        return self.search(prefix, limit)
+
+    async def alookup(self, prefix, limit=10) -> List[str]:
+        if self._needs_check():
+            version = await _get_cache().aget(VERSION_CACHE_KEY)
+            if version is None or self._is_stale(version):
+                keys = self._missed_keys(version) if version is not None else []
+                if not self._catch_up(keys, await _get_cache().aget_many(keys) if keys else {}, version):
+                    await sync_to_async(self.refresh)(version)
+        return self.search(prefix, limit)
+
+    def _insert_entry(self, name) -> None:
+        entry = (name.casefold(), name)
+        position = bisect_left(self._entries, entry)
+        if position == len(self._entries) or self._entries[position] != entry:
+            self._entries.insert(position, entry)
+
+    def _insert(self, name, version) -> None:
+        with self._lock:
+            if self._entries is None:
+                return
+            self._insert_entry(name)
+            # Only skip the next rebuild if no other worker changed the index in between.
+            if self._version == version - 1:
+                self._version = version
+
+    def add(self, name) -> None:
+        cache = _get_cache()
+        cache.add(VERSION_CACHE_KEY, 1, None)
+        version = cache.incr(VERSION_CACHE_KEY)
+        cache.set(get_added_key(version), name, ADDED_NAME_TIMEOUT)
+        self._insert(name, version)
+
+    def invalidate(self) -> None:
+        _get_cache().add(VERSION_CACHE_KEY, 1, None)
+        _get_cache().incr(VERSION_CACHE_KEY)
+
+
+city_index = CityPrefixIndex()
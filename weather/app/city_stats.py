@@ -0,0 +1,63 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max
+from django.db.models.functions import Greatest
+
+from .models import CitySearchStats, SearchHistory
+
+
+def record_searches(entries) -> None:
+    totals = {}
+    for entry in entries:
+        if entry.user_id is None:
+            continue
+        count, last_searched = totals.get((entry.user_id, entry.city_id), (0, entry.search_date))
+        totals[(entry.user_id, entry.city_id)] = (count + 1, max(last_searched, entry.search_date))
+
+    for (user_id, city_id), (count, last_searched) in totals.items():
+        stats = CitySearchStats.objects.filter(user_id=user_id, city_id=city_id)
+        update = {'count': F('count') + count, 'last_searched': Greatest(F('last_searched'), last_searched)}
+        if stats.update(**update):
+            continue
+        try:
+            with transaction.atomic():
+                CitySearchStats.objects.create(user_id=user_id, city_id=city_id,
+                                               count=count, last_searched=last_searched)
+        except IntegrityError:
+            # Another request created the row between the UPDATE and the INSERT.
+            stats.update(**update)
+
+
+def count_searches(searches) -> dict:
+    """Returns ``{(user_id, city_id): count}`` for the authenticated rows of ``searches``."""
+    rows = searches.filter(user__isnull=False).values_list('user_id', 'city_id').annotate(Count('id')).order_by()
+    return {(user_id, city_id): count for user_id, city_id, count in rows}
+
+
+def forget_searches(counts) -> None:
+    """Takes deleted history rows out of the stats; a city with no searches left is removed."""
+    for (user_id, city_id), count in counts.items():
+        stats = CitySearchStats.objects.filter(user_id=user_id, city_id=city_id)
+        if not stats.filter(count__lte=count).delete()[0]:
+            # last_searched stays: expired rows are always older than the ones kept.
+            stats.update(count=F('count') - count)
+
+
+def rebuild_city_stats(batch_size=1000) -> int:
+    aggregates = SearchHistory.objects.filter(user__isnull=False) \
+        .values('user_id', 'city_id') \
+        .annotate(count=Count('id'), last_searched=Max('search_date')) \
+        .order_by()
+
+    rows = 0
+    with transaction.atomic():
+        CitySearchStats.objects.all().delete()
+        batch = []
+        for aggregate in aggregates.iterator(chunk_size=batch_size):
+            batch.append(CitySearchStats(**aggregate))
+            if len(batch) >= batch_size:
+                CitySearchStats.objects.bulk_create(batch)
+                rows += len(batch)
+                batch = []
+        CitySearchStats.objects.bulk_create(batch)
+        rows += len(batch)
+    return rows
@@ -1,9 +1,26 @@
+import hashlib
+
 import requests
-from django.core.cache import cache
-from django.db import models
+from asgiref.sync import sync_to_async
+from django.template.loader import render_to_string
+from django.utils import translation
+from django.utils.safestring import mark_safe
 from typing import List
 
-from .models import City, SearchHistory
+from . import geocoding, metrics, recent_cities
+from .forecasts import (
+    aget_forecast, get_forecast, get_forecast_cache, get_forecast_cache_key, get_model_run,
+    get_seconds_until_model_update,
+)
+from .city_index import city_index
+from .history_writer import history_writer
+from .models import City, CitySearchStats, SearchHistory
+from .open_meteo import get_client
+from .pagination import KeysetPage, paginate_by_keyset
+from .singleflight import SingleFlight
+from .weather_table import ForecastTable, build_daily_table, build_hourly_table, describe_weather
+
+geocoding_flight = SingleFlight('geocoding')
 
 
 def get_client_ip(request) -> int:
@@ -15,16 +32,8 @@ def get_client_ip(request) -> int:
     return ip
 
 
-def get_recent_cities_from_db(request) -> list:
-    if request.user.is_authenticated:
-        recent_searches = SearchHistory.objects.filter(user=request.user).order_by('-search_date')[:5]
-        recent_cities = [search.city for search in recent_searches]
-    else:
-        ip = get_client_ip(request)
-        cache_key = f'recent_cities_{ip}'
-        recent_cities_data = cache.get(cache_key, [])
-        recent_cities = City.objects.filter(id__in=recent_cities_data)
-    return recent_cities
+def get_recent_cities(request) -> list:
+    return recent_cities.get_recent_cities(recent_cities.get_identity(request.user, get_client_ip(request)))
 
 
 def create_city(name, latitude, longitude) -> City:
@@ -38,114 +47,140 @@ def create_city(name, latitude, longitude) -> City:
     return city
 
 
-def convert_weather_data(weather_data) -> tuple[dict, List[dict], List[dict]]:
+async def acreate_city(name, latitude, longitude) -> City:
+    city, created = await City.objects.aget_or_create(
+        name=name,
+        defaults={
+            'latitude': latitude,
+            'longitude': longitude,
+        }
+    )
+    return city
+
+
+@metrics.timed('convert')
+def convert_weather_data(weather_data) -> tuple[dict, ForecastTable, ForecastTable]:
     current = weather_data.get('current_weather', {})
-    daily = weather_data.get('daily', {})
-    hourly = weather_data.get('hourly', {})
-
-    weather_codes = {
-        0: 'Ясно',
-        1: 'Преимущественно ясно',
-        2: 'Переменная облачность',
-        3: 'Пасмурно',
-        45: 'Туман',
-        48: 'Туман с инеем',
-        51: 'Легкая морось',
-        53: 'Умеренная морось',
-        55: 'Сильная морось',
-        56: 'Легкая ледяная морось',
-        57: 'Сильная ледяная морось',
-        61: 'Небольшой дождь',
-        63: 'Умеренный дождь',
-        65: 'Сильный дождь',
-        66: 'Легкий ледяной дождь',
-        67: 'Сильный ледяной дождь',
-        71: 'Небольшой снег',
-        73: 'Умеренный снег',
-        75: 'Сильный снег',
-        77: 'Снежные зерна',
-        80: 'Небольшие ливни',
-        81: 'Умеренные ливни',
-        82: 'Сильные ливни',
-        85: 'Небольшие снегопады',
-        86: 'Сильные снегопады',
-        95: 'Гроза',
-        96: 'Гроза с небольшим градом',
-        99: 'Гроза с сильным градом'
-    }
 
     current_weather = {
         'temperature': current.get('temperature'),
         'windspeed': current.get('windspeed'),
         'winddirection': current.get('winddirection'),
-        'weathercode': weather_codes.get(current.get('weathercode'), 'Unknown'),
+        'weathercode': describe_weather(current.get('weathercode')),
         'time': current.get('time')
     }
 
-    daily_forecast = []
-    if daily and 'time' in daily and 'temperature_2m_max' in daily:
-        for i in range(len(daily['time'])):
-            daily_forecast.append({
-                'date': daily['time'][i],
-                'max_temp': daily['temperature_2m_max'][i],
-                'min_temp': daily['temperature_2m_min'][i],
-                'weather': weather_codes.get(daily['weathercode'][i], 'Unknown')
-            })
-
-    hourly_forecast = []
-    if hourly and 'time' in hourly and 'temperature_2m' in hourly:
-        for i in range(0, min(24, len(hourly['time']))):
-            hourly_forecast.append({
-                'time': hourly['time'][i],
-                'temperature': hourly['temperature_2m'][i],
-                'humidity': hourly['relativehumidity_2m'][i],
-                'weather': weather_codes.get(hourly['weathercode'][i], 'Unknown')
-            })
+    hourly_forecast = build_hourly_table(weather_data.get('hourly', {}))
+    daily_forecast = build_daily_table(weather_data.get('daily', {}), hourly_forecast)
     return current_weather, daily_forecast, hourly_forecast
 
 
+def get_forecast_fragment_key(city) -> str:
+    name = hashlib.md5(city.name.encode()).hexdigest()
+    return 'forecast_fragment:{language}:{model_run:%Y%m%d%H}:{name}:{forecast}'.format(
+        language=translation.get_language(),
+        model_run=get_model_run(),
+        name=name,
+        forecast=get_forecast_cache_key(city.latitude, city.longitude),
+    )
+
+
+def _render_forecast_block(city, weather_data) -> str:
+    current_weather, daily_forecast, hourly_forecast = convert_weather_data(weather_data=weather_data)
+    return render_to_string('app/forecast_block.html', {
+        'city': city,
+        'current': current_weather,
+        'daily_forecast': daily_forecast,
+        'hourly_forecast': hourly_forecast,
+        'stale': weather_data.get('stale', False),
+    })
+
+
+def _is_cacheable(weather_data) -> bool:
+    # Stale data belongs to an earlier model run than the one in the fragment key.
+    return not weather_data.get('stale', False)
+
+
+def render_forecast_block(city) -> str:
+    fragment_cache = get_forecast_cache()
+    cache_key = get_forecast_fragment_key(city)
+    html = fragment_cache.get(cache_key)
+    if html is None:
+        weather_data = get_forecast(city)
+        html = _render_forecast_block(city, weather_data)
+        if _is_cacheable(weather_data):
+            fragment_cache.set(cache_key, html, get_seconds_until_model_update())
+    return mark_safe(html)
+
+
+async def arender_forecast_block(city) -> str:
+    fragment_cache = get_forecast_cache()
+    cache_key = get_forecast_fragment_key(city)
+    html = await fragment_cache.aget(cache_key)
+    if html is None:
+        weather_data = await aget_forecast(city)
+        html = await sync_to_async(_render_forecast_block)(city, weather_data)
+        if _is_cacheable(weather_data):
+            await fragment_cache.aset(cache_key, html, get_seconds_until_model_update())
+    return mark_safe(html)
+
+
+def search_cities_in_web(city_name, count) -> List[dict]:
+    results = geocoding.get_cached_results(city_name, count)
+    if results is None:
+        results = geocoding_flight.do(
+            geocoding.get_cache_key(geocoding.normalize_query(city_name), count),
+            lambda: get_client().search(city_name, count),
+        )
+        geocoding.store_results(city_name, count, results)
+    return results
+
+
+async def asearch_cities_in_web(city_name, count) -> List[dict]:
+    results = await geocoding.aget_cached_results(city_name, count)
+    if results is None:
+        results = await geocoding_flight.ado(
+            geocoding.get_cache_key(geocoding.normalize_query(city_name), count),
+            lambda: get_client().asearch(city_name, count),
+        )
+        await geocoding.astore_results(city_name, count, results)
+    return results
+
+
 def request_cities(city_name) -> List[dict]:
-    cities = City.objects.filter(name__istartswith=city_name).values('name')[:10]
+    cities = [{'name': name} for name in city_index.lookup(city_name, limit=10)]
 
     if len(cities) < 10:
-        geo_url = "https://geocoding-api.open-meteo.com/v1/search"
-        params = {
-            'name': city_name,
-            'count': 10 - len(cities),
-            'language': 'en',
-            'format': 'json'
-        }
-
         try:
-            response = requests.get(geo_url, params=params)
-            response.raise_for_status()
-            data = response.json()
+            results = search_cities_in_web(city_name, count=10 - len(cities))
 
-            if data.get('results'):
-                api_cities = [{'name': result['name']} for result in data['results']]
-                cities = list(cities) + api_cities
+            if results:
+                api_cities = [{'name': result['name']} for result in results]
+                cities = cities + api_cities
         except requests.RequestException:
             pass
     return cities
 
 
-def get_city_from_web(city_name) -> City | None:
-    geo_url = "https://geocoding-api.open-meteo.com/v1/search"
-    params = {
-        'name': city_name,
-        'count': 1,
-        'language': 'en',
-        'format': 'json'
-    }
+async def arequest_cities(city_name) -> List[dict]:
+    cities = [{'name': name} for name in await city_index.alookup(city_name, limit=10)]
 
+    if len(cities) < 10:
+        try:
+            results = await asearch_cities_in_web(city_name, count=10 - len(cities))
+            cities += [{'name': result['name']} for result in results]
+        except requests.RequestException:
+            pass
+    return cities
+
+
+def get_city_from_web(city_name) -> City | None:
     try:
-        response = requests.get(geo_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        if data.get('results'):
-            city = create_city(name=data['results'][0]['name'],
-                               latitude=data['results'][0]['latitude'],
-                               longitude=data['results'][0]['longitude'],
+        results = search_cities_in_web(city_name, count=1)
+        if results:
+            city = create_city(name=results[0]['name'],
+                               latitude=results[0]['latitude'],
+                               longitude=results[0]['longitude'],
                                )
             return city
         else:
@@ -154,26 +189,75 @@ def get_city_from_web(city_name) -> City | None:
         raise requests.RequestException
 
 
+async def ageocode_city(city_name) -> dict | None:
+    results = await asearch_cities_in_web(city_name, count=1)
+    return results[0] if results else None
+
+
+async def aget_city_from_web(city_name) -> City | None:
+    result = await ageocode_city(city_name)
+    if result:
+        return await acreate_city(name=result['name'],
+                                  latitude=result['latitude'],
+                                  longitude=result['longitude'],
+                                  )
+    return None
+
+
 def add_search_history_into_db(request, city) -> None:
     ip = get_client_ip(request)
+    # Before the write: a cold list is warmed from the history that does not include this search yet.
+    recent_cities.remember_city(recent_cities.get_identity(request.user, ip), city)
     if request.user.is_authenticated:
-        SearchHistory.objects.create(user=request.user, city=city, ip_address=ip)
+        history_writer.write(SearchHistory(user=request.user, city=city, ip_address=ip))
     else:
-        SearchHistory.objects.create(city=city, ip_address=ip)
-        cache_key = f'recent_cities_{ip}'
-        recent_cities = cache.get(cache_key, [])
-        if city.id not in recent_cities:
-            recent_cities.insert(0, city.id)
-            recent_cities = recent_cities[:5]
-            cache.set(cache_key, recent_cities, 60 * 60 * 24 * 7)
-
-
-def get_search_history_from_db(user) -> tuple[List[str], List[str]]:
-    searches = SearchHistory.objects.filter(user=user).select_related('city').order_by('-search_date')
-
-    city_stats = SearchHistory.objects.filter(user=user) \
-        .values('city__name') \
-        .annotate(count=models.Count('id')) \
-        .order_by('-count')
+        history_writer.write(SearchHistory(city=city, ip_address=ip))
+
+
+async def aadd_search_history_into_db(request, city) -> None:
+    ip = get_client_ip(request)
+    user = await request.auser()
+    await recent_cities.aremember_city(recent_cities.get_identity(user, ip), city)
+    if user.is_authenticated:
+        await history_writer.awrite(SearchHistory(user=user, city=city, ip_address=ip))
+    else:
+        await history_writer.awrite(SearchHistory(city=city, ip_address=ip))
+
+
+def get_city_stats_from_db(user) -> List[dict]:
+    return CitySearchStats.objects.filter(user=user) \
+        .values('city__name', 'count') \
+        .order_by('-count', 'city__name')
+
+
+SEARCH_HISTORY_EXPORT_FIELDS = ('id', 'user_id', 'city', 'latitude', 'longitude', 'search_date')
+
+
+def iter_search_history_export(user=None, date_from=None, date_to=None, chunk_size=2000):
+    """
+    Yields history rows as tuples of ``SEARCH_HISTORY_EXPORT_FIELDS``, newest
+    first, ``chunk_size`` rows per fetch (a server-side cursor on PostgreSQL).
+    ``user=None`` exports every user.
+    """
+    searches = SearchHistory.objects.all()
+    if user is not None:
+        searches = searches.filter(user=user)
+    if date_from is not None:
+        searches = searches.filter(search_date__gte=date_from)
+    if date_to is not None:
+        searches = searches.filter(search_date__lt=date_to)
+    # One JOIN with the city, like select_related('city'), but without building model instances per row.
+    return searches.order_by('-search_date', '-id').values_list(
+        'id', 'user_id', 'city__name', 'city__latitude', 'city__longitude', 'search_date',
+    ).iterator(chunk_size=chunk_size)
+
+
+def get_search_history_from_db(user, cursor=None, page_size=None) -> tuple[KeysetPage, List[dict]]:
+    searches = paginate_by_keyset(
+        SearchHistory.objects.filter(user=user).select_related('city'),
+        cursor=cursor,
+        page_size=page_size,
+    )
+    city_stats = get_city_stats_from_db(user)
 
     return searches, city_stats
@@ -0,0 +1,101 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import List
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from . import forecast_snapshots
+from .forecasts import (
+    fetch_forecast, forecast_flight, get_forecast_cache_key, get_model_run, get_next_model_update, store_forecasts,
+)
+from .models import City, SearchHistory
+
+logger = logging.getLogger(__name__)
+
+
+def get_popular_cities(limit, window_hours, now=None) -> List[City]:
+    now = now or timezone.now()
+    ranking = (
+        SearchHistory.objects
+        .filter(search_date__gte=now - timedelta(hours=window_hours))
+        .values('city')
+        .annotate(searches=Count('id'))
+        .order_by('-searches', 'city')
+    )
+    city_ids = [row['city'] for row in ranking[:limit]]
+    cities = City.objects.in_bulk(city_ids)
+
+    # Cities that round to the same coordinates share one forecast.
+    popular, seen = [], set()
+    for city_id in city_ids:
+        city = cities[city_id]
+        cache_key = get_forecast_cache_key(city.latitude, city.longitude)
+        if cache_key not in seen:
+            seen.add(cache_key)
+            popular.append(city)
+    return popular
+
+
+def get_budget_key(slot) -> str:
+    return f'forecast_refresh_budget:{slot:%Y%m%d%H}'
+
+
+def take_budget(slot, hourly_budget) -> bool:
+    key = get_budget_key(slot)
+    cache.add(key, 0, 60 * 60 * 2)
+    return cache.incr(key) <= hourly_budget
+
+
+def refresh_forecast(city, expires_at) -> dict:
+    cache_key = get_forecast_cache_key(city.latitude, city.longitude)
+    weather_data = forecast_flight.do(cache_key, lambda: fetch_forecast(city.latitude, city.longitude))
+    store_forecasts({cache_key: weather_data}, max(1, int((expires_at - timezone.now()).total_seconds())))
+    return weather_data
+
+
+def refresh_popular_forecasts(limit=None, window_hours=None, workers=None, hourly_budget=None, now=None) -> dict:
+    options = settings.FORECAST_REFRESH
+    limit = limit or options['CITIES']
+    window_hours = window_hours or options['WINDOW_HOURS']
+    workers = workers or options['WORKERS']
+    hourly_budget = hourly_budget if hourly_budget is not None else options['HOURLY_BUDGET']
+
+    now = now or timezone.now()
+    # Entries expire at the next boundary like any other forecast; the run starts just after
+    # the boundary, and stale-while-revalidate covers the few seconds in between.
+    slot = get_model_run(now)
+    expires_at = get_next_model_update(now)
+    cities = get_popular_cities(limit, window_hours, now)
+
+    refreshed = {}
+
+    def refresh(city):
+        if not take_budget(slot, hourly_budget):
+            return 'skipped'
+        try:
+            refreshed[city] = refresh_forecast(city, expires_at)
+        except requests.RequestException as error:
+            logger.warning('Не удалось обновить прогноз для %s: %s', city.name, error)
+            return 'failed'
+        return 'refreshed'
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        outcomes = list(executor.map(refresh, cities))
+
+    if refreshed and forecast_snapshots.snapshots_enabled():
+        forecast_snapshots.save_snapshots(refreshed, get_model_run(now))
+
+    return {outcome: outcomes.count(outcome) for outcome in ('refreshed', 'failed', 'skipped')}
+
+
+def get_seconds_until_next_run(delay_seconds, now=None) -> float:
+    now = now or timezone.now()
+    next_run = get_model_run(now) + timedelta(seconds=delay_seconds)
+    if next_run <= now:
+        next_run += timedelta(hours=1)
+    return (next_run - now).total_seconds()
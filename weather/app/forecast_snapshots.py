@@ -0,0 +1,151 @@
+import struct
+import sys
+from array import array
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ForecastSnapshot
+
+FORMAT_VERSION = 1
+ABSENT = 0xFFFF
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_DATE = _EPOCH.date()
+
+# (section, field, array typecode, kind). Only what ``convert_weather_data`` reads is kept.
+COLUMNS = (
+    ('current_weather', 'temperature', 'f', 'float'),
+    ('current_weather', 'windspeed', 'f', 'float'),
+    ('current_weather', 'winddirection', 'h', 'int'),
+    ('current_weather', 'weathercode', 'b', 'int'),
+    ('current_weather', 'time', 'i', 'minutes'),
+    ('hourly', 'time', 'i', 'minutes'),
+    ('hourly', 'temperature_2m', 'f', 'float'),
+    ('hourly', 'relativehumidity_2m', 'b', 'int'),
+    ('hourly', 'weathercode', 'b', 'int'),
+    ('daily', 'time', 'i', 'days'),
+    ('daily', 'temperature_2m_max', 'f', 'float'),
+    ('daily', 'temperature_2m_min', 'f', 'float'),
+    ('daily', 'weathercode', 'b', 'int'),
+)
+
+# The smallest value of each integer type stands for a missing (null) value.
+_INT_NONE = {'b': -2 ** 7, 'h': -2 ** 15, 'i': -2 ** 31}
+
+
+def _encode_value(value, typecode, kind):
+    if value is None:
+        return float('nan') if kind == 'float' else _INT_NONE[typecode]
+    if kind == 'minutes':
+        return (datetime.fromisoformat(value) - _EPOCH) // timedelta(minutes=1)
+    if kind == 'days':
+        return (date.fromisoformat(value) - _EPOCH_DATE).days
+    return float(value) if kind == 'float' else int(round(value))
+
+
+def _decode_column(values, typecode, kind) -> list:
+    if kind == 'float':
+        # float32 keeps ~7 significant digits; Open-Meteo reports one decimal.
+        return [None if value != value else round(value, 1) for value in values]
+    none = _INT_NONE[typecode]
+    if kind == 'minutes':
+        return [None if value == none else (_EPOCH + timedelta(minutes=value)).isoformat(timespec='minutes')
+                for value in values]
+    if kind == 'days':
+        return [None if value == none else (_EPOCH_DATE + timedelta(days=value)).isoformat() for value in values]
+    return [None if value == none else value for value in values]
+
+
+def pack_forecast(weather_data) -> bytes:
+    """
+    Packs a forecast into little-endian typed arrays, one per column, each
+    prefixed with its length. Fields outside ``COLUMNS`` are dropped.
+    """
+    chunks = [struct.pack('<B', FORMAT_VERSION)]
+    for section, field, typecode, kind in COLUMNS:
+        data = weather_data.get(section)
+        if not data or field not in data:
+            chunks.append(struct.pack('<H', ABSENT))
+            continue
+        values = [data[field]] if section == 'current_weather' else data[field]
+        packed = array(typecode, [_encode_value(value, typecode, kind) for value in values])
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        chunks.append(struct.pack('<H', len(packed)))
+        chunks.append(packed.tobytes())
+    return b''.join(chunks)
+
+
+def unpack_forecast(blob) -> dict:
+    """Restores the Open-Meteo response shape that ``convert_weather_data`` expects."""
+    blob = memoryview(blob)
+    version, = struct.unpack_from('<B', blob)
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Неизвестная версия снимка прогноза: {version}')
+    offset = 1
+    weather_data = {}
+    for section, field, typecode, kind in COLUMNS:
+        length, = struct.unpack_from('<H', blob, offset)
+        offset += 2
+        if length == ABSENT:
+            continue
+        values = array(typecode)
+        size = length * values.itemsize
+        values.frombytes(blob[offset:offset + size])
+        offset += size
+        if sys.byteorder == 'big':
+            values.byteswap()
+        column = _decode_column(values, typecode, kind)
+        weather_data.setdefault(section, {})[field] = column[0] if section == 'current_weather' else column
+    return weather_data
+
+
+def snapshots_enabled() -> bool:
+    return settings.FORECAST_SNAPSHOTS['ENABLED']
+
+
+def save_snapshots(forecasts, model_run) -> None:
+    """Stores ``{city: weather_data}`` for ``model_run``, replacing earlier snapshots of the same run."""
+    now = timezone.now()
+    ForecastSnapshot.objects.bulk_create(
+        [ForecastSnapshot(city=city, model_run=model_run, fetched_at=now, data=pack_forecast(weather_data))
+         for city, weather_data in forecasts.items()],
+        update_conflicts=True,
+        unique_fields=['city', 'model_run'],
+        update_fields=['fetched_at', 'data'],
+    )
+
+
+async def asave_snapshots(forecasts, model_run) -> None:
+    now = timezone.now()
+    await ForecastSnapshot.objects.abulk_create(
+        [ForecastSnapshot(city=city, model_run=model_run, fetched_at=now, data=pack_forecast(weather_data))
+         for city, weather_data in forecasts.items()],
+        update_conflicts=True,
+        unique_fields=['city', 'model_run'],
+        update_fields=['fetched_at', 'data'],
+    )
+
+
+def _latest_snapshots(city):
+    return ForecastSnapshot.objects.filter(city=city).order_by('-model_run').only('model_run', 'data')
+
+
+def get_latest_snapshot(city):
+    """Returns ``(model_run, weather_data)`` of the newest snapshot, or None."""
+    snapshot = _latest_snapshots(city).first()
+    return None if snapshot is None else (snapshot.model_run, unpack_forecast(snapshot.data))
+
+
+async def aget_latest_snapshot(city):
+    snapshot = await _latest_snapshots(city).afirst()
+    return None if snapshot is None else (snapshot.model_run, unpack_forecast(snapshot.data))
+
+
+def purge_snapshots(retention_days=None, now=None) -> int:
+    retention_days = retention_days or settings.FORECAST_SNAPSHOTS['RETENTION_DAYS']
+    now = now or timezone.now()
+    deleted, _ = ForecastSnapshot.objects.filter(model_run__lt=now - timedelta(days=retention_days)).delete()
+    return deleted
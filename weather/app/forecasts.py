@@ -0,0 +1,329 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Iterator, List
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from . import forecast_snapshots
+from .open_meteo import get_client
+from .singleflight import SingleFlight
+
+FORECAST_VARIABLES = {
+    'current_weather': 'true',
+    'hourly': 'temperature_2m,relativehumidity_2m,weathercode',
+    'daily': 'weathercode,temperature_2m_max,temperature_2m_min',
+}
+
+# Two decimals is ~1 km, well below the resolution of the Open-Meteo models.
+COORDINATE_PRECISION = 2
+
+# A failed revalidation keeps its lock, so a dead upstream is retried at most this often per forecast.
+REVALIDATION_LOCK_TIMEOUT = 30
+
+logger = logging.getLogger(__name__)
+
+
+class ForecastCacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self) -> None:
+        with self._lock:
+            self.hits += 1
+
+    def miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+        }
+
+
+stats = ForecastCacheStats()
+forecast_flight = SingleFlight('forecast')
+
+
+def get_forecast_cache():
+    return caches['forecasts']
+
+
+def get_forecast_cache_key(latitude, longitude, variables=None) -> str:
+    variables = variables or FORECAST_VARIABLES
+    variable_set = '|'.join(f'{name}={value}' for name, value in sorted(variables.items()))
+    return 'forecast:{lat:.{p}f}:{lon:.{p}f}:{variables}'.format(
+        lat=round(latitude, COORDINATE_PRECISION),
+        lon=round(longitude, COORDINATE_PRECISION),
+        p=COORDINATE_PRECISION,
+        variables=variable_set,
+    )
+
+
+def get_stale_cache_key(cache_key) -> str:
+    return f'stale:{cache_key}'
+
+
+def _stale(weather_data) -> dict:
+    return {**weather_data, 'stale': True}
+
+
+def store_forecasts(forecasts, timeout=None) -> None:
+    forecast_cache = get_forecast_cache()
+    forecast_cache.set_many(forecasts, timeout or get_seconds_until_model_update())
+    forecast_cache.set_many(
+        {get_stale_cache_key(key): data for key, data in forecasts.items()}, settings.FORECAST_STALE_TIMEOUT,
+    )
+
+
+async def astore_forecasts(forecasts, timeout=None) -> None:
+    forecast_cache = get_forecast_cache()
+    await forecast_cache.aset_many(forecasts, timeout or get_seconds_until_model_update())
+    await forecast_cache.aset_many(
+        {get_stale_cache_key(key): data for key, data in forecasts.items()}, settings.FORECAST_STALE_TIMEOUT,
+    )
+
+
+def get_model_run(now=None) -> datetime:
+    now = now or timezone.now()
+    return now.replace(minute=0, second=0, microsecond=0)
+
+
+def get_next_model_update(now=None) -> datetime:
+    return get_model_run(now) + timedelta(hours=1)
+
+
+def get_seconds_until_model_update(now=None) -> int:
+    now = now or timezone.now()
+    return max(1, int((get_next_model_update(now) - now).total_seconds()))
+
+
+def fetch_forecast(latitude, longitude, variables=None) -> dict:
+    return get_client().forecast(latitude, longitude, variables or FORECAST_VARIABLES)
+
+
+def fetch_forecasts(coordinates, variables=None) -> List[dict]:
+    return get_client().forecast_many(coordinates, variables or FORECAST_VARIABLES)
+
+
+async def afetch_forecast(latitude, longitude, variables=None) -> dict:
+    return await get_client().aforecast(latitude, longitude, variables or FORECAST_VARIABLES)
+
+
+_revalidation_executor = None
+_revalidation_pid = None
+_revalidation_lock = threading.Lock()
+
+
+def _get_revalidation_executor() -> ThreadPoolExecutor:
+    global _revalidation_executor, _revalidation_pid
+    with _revalidation_lock:
+        if _revalidation_executor is None or _revalidation_pid != os.getpid():
+            _revalidation_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='forecast-revalidation')
+            _revalidation_pid = os.getpid()
+    return _revalidation_executor
+
+
+def drain_revalidation() -> None:
+    """Waits for the running background revalidations; the next one starts a new executor."""
+    global _revalidation_executor
+    with _revalidation_lock:
+        executor, _revalidation_executor = _revalidation_executor, None
+    if executor is not None and _revalidation_pid == os.getpid():
+        executor.shutdown(wait=True)
+
+
+def _revalidate(latitude, longitude, variables, cache_key, lock_key) -> None:
+    try:
+        weather_data = forecast_flight.do(cache_key, lambda: fetch_forecast(latitude, longitude, variables))
+    except requests.RequestException as error:
+        logger.warning('Не удалось обновить прогноз %s: %s', cache_key, error)
+        return
+    store_forecasts({cache_key: weather_data})
+    caches['shared'].delete(lock_key)
+
+
+def _revalidation_lock_key(cache_key) -> str:
+    return f'revalidate:{cache_key}'
+
+
+def revalidate_in_background(city, cache_key, variables=None) -> None:
+    lock_key = _revalidation_lock_key(cache_key)
+    # Only one worker revalidates a forecast; the others keep serving the stale copy.
+    if caches['shared'].add(lock_key, 1, REVALIDATION_LOCK_TIMEOUT):
+        _get_revalidation_executor().submit(
+            _revalidate, city.latitude, city.longitude, variables, cache_key, lock_key,
+        )
+
+
+async def arevalidate_in_background(city, cache_key, variables=None) -> None:
+    lock_key = _revalidation_lock_key(cache_key)
+    if await caches['shared'].aadd(lock_key, 1, REVALIDATION_LOCK_TIMEOUT):
+        _get_revalidation_executor().submit(
+            _revalidate, city.latitude, city.longitude, variables, cache_key, lock_key,
+        )
+
+
+def get_forecast(city, variables=None) -> dict:
+    """
+    Returns the cached forecast, or the last good one marked ``stale`` while
+    it is revalidated in the background, or fetches it when neither exists.
+    Fetches go through the snapshot store, see ``app.forecast_snapshots``.
+    """
+    forecast_cache = get_forecast_cache()
+    cache_key = get_forecast_cache_key(city.latitude, city.longitude, variables)
+    stale_key = get_stale_cache_key(cache_key)
+
+    cached = forecast_cache.get_many([cache_key, stale_key])
+    if cache_key in cached:
+        stats.hit()
+        return cached[cache_key]
+
+    stats.miss()
+    if stale_key in cached:
+        revalidate_in_background(city, cache_key, variables)
+        return _stale(cached[stale_key])
+
+    # Ad-hoc coordinates (an unsaved City) have nothing to attach a snapshot to.
+    use_snapshots = variables is None and city.pk is not None and forecast_snapshots.snapshots_enabled()
+
+    def fetch_once():
+        # A flight that finished just before this one started has already filled the cache.
+        cached = forecast_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        # After a restart the current model run is usually already in the snapshot store.
+        snapshot = forecast_snapshots.get_latest_snapshot(city) if use_snapshots else None
+        if snapshot is not None and snapshot[0] == get_model_run():
+            return snapshot[1]
+        weather_data = fetch_forecast(city.latitude, city.longitude, variables)
+        if use_snapshots:
+            forecast_snapshots.save_snapshots({city: weather_data}, get_model_run())
+        return weather_data
+
+    try:
+        weather_data = forecast_flight.do(cache_key, fetch_once)
+    except requests.RequestException:
+        # Outside the flight: refresh_forecast() and _revalidate() share it and store what it returns as fresh.
+        snapshot = forecast_snapshots.get_latest_snapshot(city) if use_snapshots else None
+        if snapshot is None:
+            raise
+        return _stale(snapshot[1])
+    store_forecasts({cache_key: weather_data})
+    return weather_data
+
+
+async def aget_forecast(city, variables=None) -> dict:
+    forecast_cache = get_forecast_cache()
+    cache_key = get_forecast_cache_key(city.latitude, city.longitude, variables)
+    stale_key = get_stale_cache_key(cache_key)
+
+    cached = await forecast_cache.aget_many([cache_key, stale_key])
+    if cache_key in cached:
+        stats.hit()
+        return cached[cache_key]
+
+    stats.miss()
+    if stale_key in cached:
+        await arevalidate_in_background(city, cache_key, variables)
+        return _stale(cached[stale_key])
+
+    use_snapshots = variables is None and city.pk is not None and forecast_snapshots.snapshots_enabled()
+
+    async def fetch_once():
+        cached = await forecast_cache.aget(cache_key)
+        if cached is not None:
+            return cached
+        snapshot = await forecast_snapshots.aget_latest_snapshot(city) if use_snapshots else None
+        if snapshot is not None and snapshot[0] == get_model_run():
+            return snapshot[1]
+        weather_data = await afetch_forecast(city.latitude, city.longitude, variables)
+        if use_snapshots:
+            await forecast_snapshots.asave_snapshots({city: weather_data}, get_model_run())
+        return weather_data
+
+    try:
+        weather_data = await forecast_flight.ado(cache_key, fetch_once)
+    except requests.RequestException:
+        snapshot = await forecast_snapshots.aget_latest_snapshot(city) if use_snapshots else None
+        if snapshot is None:
+            raise
+        return _stale(snapshot[1])
+    await astore_forecasts({cache_key: weather_data})
+    return weather_data
+
+
+def _round_coordinates(city) -> tuple[float, float]:
+    return round(city.latitude, COORDINATE_PRECISION), round(city.longitude, COORDINATE_PRECISION)
+
+
+def iter_forecasts(cities, variables=None) -> Iterator[tuple]:
+    """
+    Yields ``(city, weather_data, error)`` for every city, cached ones first.
+
+    Misses are deduplicated by cache key and fetched in multi-location
+    upstream requests of BATCH_SIZE coordinates, at most MAX_PARALLEL_REQUESTS
+    at a time; each batch is yielded as soon as it arrives. When a batch
+    fails, the last good forecasts are yielded marked ``stale``.
+    """
+    options = settings.FORECAST_BATCH
+    forecast_cache = get_forecast_cache()
+    keys = [get_forecast_cache_key(city.latitude, city.longitude, variables) for city in cities]
+    cached = forecast_cache.get_many(set(keys))
+
+    missing = {}
+    for city, key in zip(cities, keys):
+        if key in cached:
+            stats.hit()
+            yield city, cached[key], None
+        else:
+            stats.miss()
+            missing.setdefault(key, []).append(city)
+    if not missing:
+        return
+
+    def fetch_batch(batch_keys):
+        coordinates = [_round_coordinates(missing[key][0]) for key in batch_keys]
+        results = dict(zip(batch_keys, fetch_forecasts(coordinates, variables)))
+        store_forecasts(results)
+        return results
+
+    missing_keys = list(missing)
+    batches = [missing_keys[i:i + options['BATCH_SIZE']] for i in range(0, len(missing_keys), options['BATCH_SIZE'])]
+    with ThreadPoolExecutor(max_workers=options['MAX_PARALLEL_REQUESTS']) as executor:
+        futures = {executor.submit(fetch_batch, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            try:
+                results, error = future.result(), None
+                if forecast_snapshots.snapshots_enabled() and variables is None:
+                    # Saved here rather than in fetch_batch: the request thread owns the DB connection.
+                    forecast_snapshots.save_snapshots(
+                        {city: results[key] for key in futures[future] for city in missing[key] if city.pk},
+                        get_model_run(),
+                    )
+            except requests.RequestException as exception:
+                stale = forecast_cache.get_many([get_stale_cache_key(key) for key in futures[future]])
+                results = {key: _stale(stale[get_stale_cache_key(key)])
+                           for key in futures[future] if get_stale_cache_key(key) in stale}
+                error = exception
+            for key in futures[future]:
+                for city in missing[key]:
+                    yield city, results.get(key), error
@@ -0,0 +1,95 @@
+from typing import List
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Open-Meteo only matches 2-character queries exactly, so their answers say nothing about longer queries.
+MIN_PREFIX_LENGTH = 3
+
+
+def normalize_query(query) -> str:
+    return ' '.join(query.split()).casefold()
+
+
+def get_cache_key(query, count) -> str:
+    # Quoted: spaces and control characters are not valid in memcached keys.
+    return f'geocoding:{quote(query)}:{count}'
+
+
+def get_complete_cache_key(query) -> str:
+    return f'geocoding:{quote(query)}:complete'
+
+
+def _can_reuse_prefix(query, count) -> bool:
+    # Answers carry the English name, while Open-Meteo also matches localized and alternate names:
+    # «Москва» is not a prefix match of "Moscow". Only Latin queries can be filtered by name, and
+    # a single-city lookup (get_city_from_web) always asks the upstream.
+    return count > 1 and query.isascii() and len(query) > MIN_PREFIX_LENGTH
+
+
+def _filter_by_prefix(results, query, count) -> List[dict] | None:
+    matches = [result for result in results if result['name'].casefold().startswith(query)][:count]
+    # No match by English name does not prove the upstream has none (alternate names).
+    return matches or None
+
+
+def _get_timeouts() -> tuple[int, int]:
+    options = settings.GEOCODING_CACHE
+    return options['TIMEOUT'], options['NEGATIVE_TIMEOUT']
+
+
+def _prefix_lengths(query, count) -> range:
+    if not _can_reuse_prefix(query, count):
+        return range(0)
+    return range(len(query) - 1, MIN_PREFIX_LENGTH - 1, -1)
+
+
+def _candidate_keys(query, count) -> List[str]:
+    keys = [get_cache_key(query, count), get_complete_cache_key(query)]
+    keys += [get_complete_cache_key(query[:length]) for length in _prefix_lengths(query, count)]
+    return keys
+
+
+def _pick_cached(cached, query, count) -> List[dict] | None:
+    exact = cached.get(get_cache_key(query, count))
+    if exact is not None:
+        return exact
+    complete = cached.get(get_complete_cache_key(query))
+    if complete is not None:
+        return complete[:count]
+    # A complete answer for a shorter prefix already contains every match for this query.
+    for length in _prefix_lengths(query, count):
+        complete = cached.get(get_complete_cache_key(query[:length]))
+        if complete is not None:
+            return _filter_by_prefix(complete, query, count)
+    return None
+
+
+def _entries_to_store(query, count, results) -> tuple[dict, int]:
+    timeout, negative_timeout = _get_timeouts()
+    entries = {get_cache_key(query, count): results}
+    # Fewer results than requested means the upstream has nothing more for this query.
+    if len(results) < count:
+        entries[get_complete_cache_key(query)] = results
+    return entries, timeout if results else negative_timeout
+
+
+def get_cached_results(query, count) -> List[dict] | None:
+    query = normalize_query(query)
+    return _pick_cached(cache.get_many(_candidate_keys(query, count)), query, count)
+
+
+async def aget_cached_results(query, count) -> List[dict] | None:
+    query = normalize_query(query)
+    return _pick_cached(await cache.aget_many(_candidate_keys(query, count)), query, count)
+
+
+def store_results(query, count, results) -> None:
+    entries, timeout = _entries_to_store(normalize_query(query), count, results)
+    cache.set_many(entries, timeout)
+
+
+async def astore_results(query, count, results) -> None:
+    entries, timeout = _entries_to_store(normalize_query(query), count, results)
+    await cache.aset_many(entries, timeout)
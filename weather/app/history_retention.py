@@ -0,0 +1,77 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import city_stats, search_history_partitions
+from .models import SearchHistory
+
+
+def get_cutoffs(anonymous_days=None, authenticated_days=None, now=None) -> dict:
+    """
+    Returns ``{'anonymous': datetime, 'authenticated': datetime or None}``;
+    rows searched before the cutoff are expired, None keeps them forever.
+    """
+    options = settings.SEARCH_HISTORY_RETENTION
+    anonymous_days = anonymous_days if anonymous_days is not None else options['ANONYMOUS_DAYS']
+    authenticated_days = authenticated_days if authenticated_days is not None else options['AUTHENTICATED_DAYS']
+    now = now or timezone.now()
+    return {
+        'anonymous': now - timedelta(days=anonymous_days) if anonymous_days else None,
+        'authenticated': now - timedelta(days=authenticated_days) if authenticated_days else None,
+    }
+
+
+def delete_in_batches(queryset, batch_size, pause=0.0, update_stats=False) -> int:
+    """
+    Deletes ``queryset`` a batch of primary keys at a time, each batch in its
+    own short transaction, so concurrent writes never wait long for locks.
+    With ``update_stats`` the deleted searches are taken out of CitySearchStats.
+    """
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        batch = SearchHistory.objects.filter(pk__in=ids)
+        if update_stats:
+            with transaction.atomic():
+                counts = city_stats.count_searches(batch)
+                count, _ = batch.delete()
+                city_stats.forget_searches(counts)
+        else:
+            count, _ = batch.delete()
+        deleted += count
+        if len(ids) < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+def purge_search_history(anonymous_days=None, authenticated_days=None, batch_size=None, pause=0.0,
+                         detach=False, now=None) -> dict:
+    cutoffs = get_cutoffs(anonymous_days, authenticated_days, now)
+    batch_size = batch_size or settings.SEARCH_HISTORY_RETENTION['BATCH_SIZE']
+
+    removed_partitions = []
+    if search_history_partitions.is_partitioned():
+        # A partition mixes both kinds of rows, so it goes only once the longer retention has passed.
+        if cutoffs['anonymous'] and cutoffs['authenticated']:
+            removed_partitions = search_history_partitions.remove_expired_partitions(
+                min(cutoffs.values()), detach=detach,
+            )
+        search_history_partitions.ensure_month_partitions(now=now)
+
+    deleted = {'anonymous': 0, 'authenticated': 0}
+    if cutoffs['anonymous']:
+        deleted['anonymous'] = delete_in_batches(
+            SearchHistory.objects.filter(user__isnull=True, search_date__lt=cutoffs['anonymous']), batch_size, pause,
+        )
+    if cutoffs['authenticated']:
+        deleted['authenticated'] = delete_in_batches(
+            SearchHistory.objects.filter(user__isnull=False, search_date__lt=cutoffs['authenticated']),
+            batch_size, pause, update_stats=True,
+        )
+    return {'deleted': deleted, 'removed_partitions': removed_partitions}
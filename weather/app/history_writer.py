@@ -0,0 +1,104 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .city_stats import record_searches
+from .models import SearchHistory
+
+logger = logging.getLogger(__name__)
+
+
+class SearchHistoryWriter:
+    """
+    Writes SearchHistory rows either inside the request (``sync`` mode) or
+    through an in-process buffer (``buffered`` mode).
+
+    Buffered rows are flushed with one bulk_create by a background thread
+    once MAX_SIZE rows are queued or MAX_DELAY seconds have passed, and on
+    interpreter shutdown. A crashed worker loses at most that window.
+    """
+
+    def __init__(self):
+        self._queue = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def options(self) -> dict:
+        return settings.SEARCH_HISTORY_BUFFER
+
+    @property
+    def buffered(self) -> bool:
+        return self.options['MODE'] == 'buffered'
+
+    def write(self, entry) -> None:
+        if self.buffered:
+            self._enqueue(entry)
+        else:
+            entry.save()
+
+    async def awrite(self, entry) -> None:
+        if self.buffered:
+            self._enqueue(entry)
+        else:
+            await entry.asave()
+
+    def _enqueue(self, entry) -> None:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Rows queued before a fork belong to the parent process.
+                self._queue = []
+                self._pid = os.getpid()
+                self._thread = None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='search-history-writer', daemon=True)
+                self._thread.start()
+            self._queue.append(entry)
+            full = len(self._queue) >= self.options['MAX_SIZE']
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        with self._lock:
+            entries, self._queue = self._queue, []
+        if not entries:
+            return 0
+        try:
+            with transaction.atomic():
+                # bulk_create skips post_save, so the per-user stats are updated here.
+                SearchHistory.objects.bulk_create(entries, batch_size=self.options['MAX_SIZE'])
+                record_searches(entries)
+        except Exception:
+            with self._lock:
+                # Keep the rows for the next attempt, but never hold more than a few batches.
+                self._queue = (entries + self._queue)[-self.options['MAX_SIZE'] * 10:]
+            raise
+        return len(entries)
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(timeout=self.options['MAX_DELAY'])
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush search history')
+            finally:
+                close_old_connections()
+
+
+history_writer = SearchHistoryWriter()
+
+
+@atexit.register
+def flush_on_exit():
+    try:
+        history_writer.flush()
+    except Exception:
+        logger.exception('Failed to flush search history on shutdown')
@@ -0,0 +1,56 @@
+import json
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.benchmark import SCENARIOS, run_benchmark
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест страниц прогноза, автодополнения и истории с локальной заглушкой Open-Meteo. '
+            'Записывает задержки (p50/p95/p99), запросы в секунду, число SQL-запросов и обращений к Open-Meteo '
+            'на один запрос в JSON-файл')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help=f'Сценарии через запятую: {", ".join(SCENARIOS)}')
+        parser.add_argument('--requests', type=int, default=200, help='Число запросов в каждом сценарии')
+        parser.add_argument('--concurrency', type=int, default=10, help='Число параллельных клиентов')
+        parser.add_argument('--cities', type=int, default=50, help='Число разных городов в запросах')
+        parser.add_argument('--latency-ms', type=float, default=50, help='Задержка ответа заглушки, мс')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов заглушки с ошибкой 503')
+        parser.add_argument('--forecast-days', type=int, default=7, help='Число дней в прогнозе заглушки')
+        parser.add_argument('--clear-cache', action='store_true', help='Очищать кэши перед каждым сценарием')
+        parser.add_argument('--seed', type=int, help='Начальное значение генератора ошибок заглушки')
+        parser.add_argument('--output', help='Файл для результатов (по умолчанию benchmark-<дата>.json)')
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+
+        report = run_benchmark(
+            scenarios=scenarios,
+            requests=options['requests'],
+            concurrency=options['concurrency'],
+            city_count=options['cities'],
+            latency=options['latency_ms'] / 1000,
+            error_rate=options['error_rate'],
+            forecast_days=options['forecast_days'],
+            clear_cache=options['clear_cache'],
+            seed=options['seed'],
+        )
+
+        output = options['output'] or f'benchmark-{datetime.now():%Y%m%d-%H%M%S}.json'
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+        for name, result in report['results'].items():
+            latency = result['latency_ms']
+            self.stdout.write(
+                f'{name}: {result["requests_per_second"]} запр/с, p50 {latency["p50"]} мс, p95 {latency["p95"]} мс, '
+                f'p99 {latency["p99"]} мс, ошибок {result["errors"]}, SQL {result["db_queries_per_request"]}, '
+                f'Open-Meteo {result["upstream_calls_per_request"]} на запрос'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Результаты сохранены в {output}'))
@@ -0,0 +1,95 @@
+import csv
+import io
+import sys
+import time
+import zipfile
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.city_index import city_index
+from app.models import City
+
+# Column positions in the GeoNames "cities" dumps (cities500.txt, cities15000.zip, ...).
+NAME, ASCII_NAME, LATITUDE, LONGITUDE, POPULATION = 1, 2, 4, 5, 14
+
+NAME_MAX_LENGTH = City._meta.get_field('name').max_length
+
+
+class Command(BaseCommand):
+    help = 'Загружает города из выгрузки GeoNames (TSV или ZIP) в таблицу City'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу TSV/ZIP или "-" для чтения из stdin')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--min-population', type=int, default=0)
+        parser.add_argument('--ascii-names', action='store_true', help='Использовать колонку asciiname')
+
+    @contextmanager
+    def open_source(self, path):
+        if path == '-':
+            yield sys.stdin
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                members = [name for name in archive.namelist() if name.endswith('.txt')]
+                if not members:
+                    raise CommandError(f'В архиве {path} нет файла .txt')
+                with archive.open(members[0]) as raw:
+                    yield io.TextIOWrapper(raw, encoding='utf-8')
+        else:
+            with open(path, encoding='utf-8') as source:
+                yield source
+
+    def parse_rows(self, source, name_column, min_population):
+        for row in csv.reader(source, delimiter='\t', quoting=csv.QUOTE_NONE):
+            try:
+                name = row[name_column].strip()
+                latitude, longitude = float(row[LATITUDE]), float(row[LONGITUDE])
+                population = int(row[POPULATION] or 0)
+            except (IndexError, ValueError):
+                continue
+            if name and len(name) <= NAME_MAX_LENGTH and population >= min_population:
+                yield name, latitude, longitude, population
+
+    def write_chunk(self, chunk):
+        City.objects.bulk_create(
+            [City(name=name, latitude=latitude, longitude=longitude)
+             for name, (latitude, longitude, population) in chunk.items()],
+            update_conflicts=True,
+            unique_fields=['name'],
+            update_fields=['latitude', 'longitude'],
+        )
+
+    def handle(self, *args, **options):
+        name_column = ASCII_NAME if options['ascii_names'] else NAME
+        chunk_size = options['chunk_size']
+        # Names repeat across countries; keep the most populated place for each name.
+        best_population = {}
+        chunk = {}
+        rows = 0
+        started = time.monotonic()
+
+        with self.open_source(options['path']) as source:
+            for name, latitude, longitude, population in self.parse_rows(source, name_column,
+                                                                          options['min_population']):
+                rows += 1
+                if best_population.get(name, -1) >= population:
+                    continue
+                best_population[name] = population
+                chunk[name] = (latitude, longitude, population)
+
+                if len(chunk) >= chunk_size:
+                    self.write_chunk(chunk)
+                    chunk = {}
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(f'{rows} строк, {rows / elapsed:.0f} строк/с')
+
+        if chunk:
+            self.write_chunk(chunk)
+        city_index.invalidate()
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {rows} строк, загружено {len(best_population)} городов '
+            f'за {elapsed:.1f} с ({rows / elapsed:.0f} строк/с)'
+        ))
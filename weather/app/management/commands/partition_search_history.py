@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.search_history_partitions import (
+    PartitioningNotSupported, get_partitioning_sql, get_preparation_sql, is_partitioned, partition_search_history,
+)
+
+
+class Command(BaseCommand):
+    help = 'Переводит SearchHistory на помесячное секционирование по дате поиска (только PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help='Сколько будущих месячных секций создать сразу')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только вывести SQL, ничего не меняя')
+
+    def handle(self, *args, **options):
+        try:
+            if is_partitioned():
+                self.stdout.write('Таблица уже секционирована')
+                return
+            if options['dry_run']:
+                self.stdout.write('-- Вне транзакции:')
+                for statement in get_preparation_sql():
+                    self.stdout.write(f'{statement};')
+                self.stdout.write('-- В одной транзакции:')
+                for statement in get_partitioning_sql(options['months_ahead']):
+                    self.stdout.write(f'{statement};')
+                return
+            statements = partition_search_history(options['months_ahead'])
+        except PartitioningNotSupported as error:
+            raise CommandError(f'{error}. Для очистки истории используйте purge_search_history.')
+        self.stdout.write(self.style.SUCCESS(f'Таблица секционирована, выполнено команд: {len(statements)}'))
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.forecast_snapshots import purge_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Удаляет снимки прогнозов старше заданного числа дней'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.FORECAST_SNAPSHOTS['RETENTION_DAYS'],
+                            help='Сколько дней хранить снимки прогнозов')
+
+    def handle(self, *args, **options):
+        deleted = purge_snapshots(retention_days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено снимков прогнозов: {deleted}'))
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.history_retention import purge_search_history
+
+
+class Command(BaseCommand):
+    help = 'Удаляет устаревшую историю поиска небольшими пакетами, а на PostgreSQL с секциями — целыми секциями'
+
+    def add_arguments(self, parser):
+        options = settings.SEARCH_HISTORY_RETENTION
+        parser.add_argument('--anonymous-days', type=int, default=options['ANONYMOUS_DAYS'],
+                            help='Сколько дней хранить поиски анонимных пользователей (0 — бессрочно)')
+        parser.add_argument('--authenticated-days', type=int, default=options['AUTHENTICATED_DAYS'],
+                            help='Сколько дней хранить поиски авторизованных пользователей (0 — бессрочно)')
+        parser.add_argument('--batch-size', type=int, default=options['BATCH_SIZE'])
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Пауза в секундах между пакетами удаления')
+        parser.add_argument('--detach', action='store_true',
+                            help='Отсоединять устаревшие секции для архивации вместо удаления')
+
+    def handle(self, *args, **options):
+        result = purge_search_history(
+            anonymous_days=options['anonymous_days'],
+            authenticated_days=options['authenticated_days'],
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            detach=options['detach'],
+        )
+        for name in result['removed_partitions']:
+            self.stdout.write(f'{"Отсоединена" if options["detach"] else "Удалена"} секция {name}')
+        self.stdout.write(self.style.SUCCESS(
+            'Удалено записей: анонимных {anonymous}, авторизованных {authenticated}'.format(**result['deleted'])
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app.city_stats import rebuild_city_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику поиска городов по пользователям из SearchHistory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = rebuild_city_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано {rows} записей статистики'))
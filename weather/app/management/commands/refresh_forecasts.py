@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.forecast_refresh import get_seconds_until_next_run, refresh_popular_forecasts
+
+
+class Command(BaseCommand):
+    help = 'Заранее обновляет в кэше прогнозы для самых популярных городов сразу после ежечасного обновления модели'
+
+    def add_arguments(self, parser):
+        options = settings.FORECAST_REFRESH
+        parser.add_argument('--cities', type=int, default=options['CITIES'],
+                            help='Сколько самых популярных городов обновлять')
+        parser.add_argument('--window-hours', type=int, default=options['WINDOW_HOURS'],
+                            help='За сколько последних часов учитывать историю поиска')
+        parser.add_argument('--workers', type=int, default=options['WORKERS'],
+                            help='Число параллельных запросов к Open-Meteo')
+        parser.add_argument('--budget', type=int, default=options['HOURLY_BUDGET'],
+                            help='Максимум запросов к Open-Meteo в час')
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать постоянно, запускаясь через --delay секунд после начала каждого часа')
+        parser.add_argument('--delay', type=int, default=options['DELAY_SECONDS'])
+
+    def handle(self, *args, **options):
+        while True:
+            if options['loop']:
+                time.sleep(get_seconds_until_next_run(options['delay']))
+            result = refresh_popular_forecasts(
+                limit=options['cities'],
+                window_hours=options['window_hours'],
+                workers=options['workers'],
+                hourly_budget=options['budget'],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                'Обновлено прогнозов: {refreshed}, ошибок: {failed}, пропущено по лимиту: {skipped}'.format(**result)
+            ))
+            if not options['loop']:
+                break
@@ -0,0 +1,133 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+registry = CollectorRegistry()
+
+request_duration = Histogram(
+    'weather_request_duration_seconds', 'Время обработки запроса', ('view',),
+    buckets=DEFAULT_BUCKETS, registry=registry,
+)
+requests_total = Counter(
+    'weather_requests', 'Число обработанных запросов', ('view', 'status'), registry=registry,
+)
+db_duration = Histogram(
+    'weather_request_db_duration_seconds', 'Время SQL-запросов за один запрос', ('view',),
+    buckets=DEFAULT_BUCKETS, registry=registry,
+)
+db_queries = Histogram(
+    'weather_request_db_queries', 'Число SQL-запросов за один запрос', ('view',),
+    buckets=QUERY_COUNT_BUCKETS, registry=registry,
+)
+render_duration = Histogram(
+    'weather_request_render_duration_seconds', 'Время рендеринга шаблонов за один запрос', ('view',),
+    buckets=DEFAULT_BUCKETS, registry=registry,
+)
+upstream_duration = Histogram(
+    'weather_upstream_duration_seconds', 'Время запросов к внешним API', ('host',),
+    buckets=DEFAULT_BUCKETS, registry=registry,
+)
+cache_requests = Counter(
+    'weather_cache_requests', 'Обращения к кэшу', ('cache', 'result'), registry=registry,
+)
+
+METRICS = (request_duration, requests_total, db_duration, db_queries, render_duration, upstream_duration,
+           cache_requests)
+
+
+def render_metrics() -> bytes:
+    """
+    With several worker processes PROMETHEUS_MULTIPROC_DIR must point to a
+    directory shared by all of them (entrypoint.sh empties it on start);
+    every worker then serves the sum over all workers.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        collector_registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collector_registry)
+        return generate_latest(collector_registry)
+    return generate_latest(registry)
+
+
+def reset_metrics() -> None:
+    for metric in METRICS:
+        metric.clear()
+
+
+class RequestTimings:
+    """Everything measured while handling one request; the middleware turns it into Server-Timing."""
+
+    __slots__ = ('db_queries', 'db_time', 'upstream', 'cache_hits', 'cache_misses', 'spans')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.upstream = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.spans = {}
+
+    def add_span(self, name, seconds) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_queries += 1
+        timings.db_time += time.perf_counter() - started
+
+
+def record_upstream(host, seconds) -> None:
+    upstream_duration.labels(host=host).observe(seconds)
+    timings = current_timings.get()
+    if timings is not None:
+        count, total = timings.upstream.get(host, (0, 0.0))
+        timings.upstream[host] = (count + 1, total + seconds)
+
+
+def record_cache(cache, hit) -> None:
+    cache_requests.labels(cache=cache, result='hit' if hit else 'miss').inc()
+    timings = current_timings.get()
+    if timings is not None:
+        if hit:
+            timings.cache_hits += 1
+        else:
+            timings.cache_misses += 1
+
+
+@contextmanager
+def span(name):
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_span(name, time.perf_counter() - started)
+
+
+def timed(name):
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
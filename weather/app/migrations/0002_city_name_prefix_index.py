@@ -0,0 +1,27 @@
+from django.db import migrations
+
+# istartswith/iexact on PostgreSQL compile to UPPER("name"::text) LIKE/= UPPER(...),
+# which neither the unique btree on name nor the default collation can serve.
+CREATE_INDEX = 'CREATE INDEX IF NOT EXISTS app_city_name_upper_like ON app_city (UPPER(name::text) text_pattern_ops)'
+DROP_INDEX = 'DROP INDEX IF EXISTS app_city_name_upper_like'
+
+
+def create_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+
+
+def drop_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_searchhistory_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_run', models.DateTimeField()),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('data', models.BinaryField()),
+                ('city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecast_snapshots', to='app.city')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model_run'], name='forecast_snapshot_run_idx')],
+                'constraints': [models.UniqueConstraint(fields=('city', 'model_run'), name='unique_forecast_snapshot')],
+            },
+        ),
+    ]
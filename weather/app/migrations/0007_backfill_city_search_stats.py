@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import Count, Max
+
+BATCH_SIZE = 1000
+
+
+def backfill_city_search_stats(apps, schema_editor):
+    """Fills CitySearchStats from the history written before the table existed."""
+    CitySearchStats = apps.get_model('app', 'CitySearchStats')
+    SearchHistory = apps.get_model('app', 'SearchHistory')
+    aggregates = SearchHistory.objects.filter(user__isnull=False) \
+        .values('user_id', 'city_id') \
+        .annotate(count=Count('id'), last_searched=Max('search_date')) \
+        .order_by()
+
+    CitySearchStats.objects.all().delete()
+    batch = []
+    for aggregate in aggregates.iterator(chunk_size=BATCH_SIZE):
+        batch.append(CitySearchStats(**aggregate))
+        if len(batch) >= BATCH_SIZE:
+            CitySearchStats.objects.bulk_create(batch)
+            batch = []
+    CitySearchStats.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_forecastsnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_city_search_stats, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -16,12 +17,55 @@ class City(models.Model):
 class SearchHistory(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     city = models.ForeignKey(City, on_delete=models.CASCADE)
-    search_date = models.DateTimeField(auto_now_add=True)
+    search_date = models.DateTimeField(default=timezone.now, editable=False)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
 
     class Meta:
         verbose_name_plural = "Search Histories"
         ordering = ['-search_date']
+        indexes = [
+            models.Index(fields=['user', '-search_date', '-id'], name='search_user_date_idx'),
+            models.Index(fields=['ip_address', '-search_date'], name='search_ip_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user or 'Anonymous'} searched {self.city} at {self.search_date}"
+
+
+class CitySearchStats(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    city = models.ForeignKey(City, on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+    last_searched = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "City Search Stats"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'city'], name='unique_city_search_stats'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-count'], name='city_stats_user_count_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} searched {self.city} {self.count} times"
+
+
+class ForecastSnapshot(models.Model):
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='forecast_snapshots')
+    model_run = models.DateTimeField()
+    fetched_at = models.DateTimeField(default=timezone.now)
+    # Packed typed arrays, see app.forecast_snapshots.pack_forecast.
+    data = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            # Also serves "latest snapshot of a city": one backward scan of (city, model_run).
+            models.UniqueConstraint(fields=['city', 'model_run'], name='unique_forecast_snapshot'),
+        ]
+        indexes = [
+            models.Index(fields=['model_run'], name='forecast_snapshot_run_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.city} forecast for {self.model_run}"
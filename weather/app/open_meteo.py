@@ -0,0 +1,250 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from typing import List
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+from .circuit_breaker import CircuitBreaker
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def is_upstream_failure(error) -> bool:
+    # Client errors (bad coordinates, unknown parameters) say nothing about upstream health.
+    response = getattr(error, 'response', None)
+    return response is None or response.status_code in RETRY_STATUSES
+
+
+class OpenMeteoClient:
+    """
+    Single entry point for the Open-Meteo geocoding and forecast APIs.
+
+    Keeps one keep-alive connection pool per process, applies connect/read
+    timeouts, retries idempotent failures with jittered exponential backoff
+    caps the number of in-flight upstream requests and stops calling an
+    endpoint for a while once it keeps failing. The ``a``-prefixed
+    methods do the same on a non-blocking httpx client, one per event loop.
+    Both paths raise ``requests.RequestException`` subclasses on failure.
+    """
+
+    def __init__(self, geocoding_url, forecast_url, connect_timeout=3.05, read_timeout=10,
+                 retries=2, backoff_factor=0.2, backoff_jitter=0.2, pool_size=10, max_concurrency=20,
+                 async_max_concurrency=200, breaker_failure_threshold=5, breaker_recovery_timeout=30):
+        self.geocoding_url = geocoding_url
+        self.forecast_url = forecast_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.backoff_jitter = backoff_jitter
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self.async_max_concurrency = async_max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+        self._async_clients = weakref.WeakKeyDictionary()
+        self.breakers = {
+            url: CircuitBreaker(urlsplit(url).netloc + urlsplit(url).path, breaker_failure_threshold,
+                                breaker_recovery_timeout)
+            for url in (geocoding_url, forecast_url)
+        }
+
+    @classmethod
+    def from_settings(cls):
+        return cls(**{key.lower(): value for key, value in settings.OPEN_METEO.items()})
+
+    @property
+    def session(self) -> requests.Session:
+        # Connection pools must not be shared with a forked child process.
+        if self._session is None or self._session_pid != os.getpid():
+            with self._session_lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    self._session = self._create_session()
+                    self._session_pid = os.getpid()
+        return self._session
+
+    def _create_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            backoff_jitter=self.backoff_jitter,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({'GET'}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get(self, url, params) -> dict:
+        breaker = self.breakers[url]
+        breaker.check()
+        try:
+            data = self._get(url, params)
+        except requests.RequestException as error:
+            if is_upstream_failure(error):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        except BaseException:
+            # A client disconnect or gevent.Timeout says nothing about the upstream.
+            breaker.release()
+            raise
+        breaker.record_success()
+        return data
+
+    def _get(self, url, params) -> dict:
+        if not self._slots.acquire(timeout=self.timeout[1]):
+            raise requests.ConnectionError('Too many concurrent requests to Open-Meteo')
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+        finally:
+            self._slots.release()
+            metrics.record_upstream(urlsplit(url).netloc, time.perf_counter() - started)
+        response.raise_for_status()
+        return response.json()
+
+    def _get_async_client(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_clients:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(
+                    max_connections=self.async_max_concurrency,
+                    max_keepalive_connections=self.pool_size,
+                ),
+            )
+            self._async_clients[loop] = (client, asyncio.Semaphore(self.async_max_concurrency))
+        return self._async_clients[loop]
+
+    def _get_backoff(self, attempt) -> float:
+        return self.backoff_factor * (2 ** attempt) + random.uniform(0, self.backoff_jitter)
+
+    async def aget(self, url, params) -> dict:
+        breaker = self.breakers[url]
+        breaker.check()
+        try:
+            data = await self._aget(url, params)
+        except requests.RequestException as error:
+            if is_upstream_failure(error):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        except BaseException:
+            # A client disconnect or gevent.Timeout says nothing about the upstream.
+            breaker.release()
+            raise
+        breaker.record_success()
+        return data
+
+    async def _aget(self, url, params) -> dict:
+        client, slots = self._get_async_client()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=self.timeout[1])
+        except asyncio.TimeoutError:
+            raise requests.ConnectionError('Too many concurrent requests to Open-Meteo')
+        started = time.perf_counter()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    response = await client.get(url, params=params)
+                except httpx.TransportError as error:
+                    if attempt == self.retries:
+                        raise requests.ConnectionError(str(error)) from error
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                        break
+                await asyncio.sleep(self._get_backoff(attempt))
+        finally:
+            slots.release()
+            metrics.record_upstream(urlsplit(url).netloc, time.perf_counter() - started)
+
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as error:
+            raise requests.HTTPError(str(error), response=response) from error
+        try:
+            return response.json()
+        except ValueError as error:
+            # An error page from a proxy; requests raises its own JSONDecodeError for it on the sync path.
+            raise requests.exceptions.InvalidJSONError(f'Некорректный JSON в ответе {url}: {error}') from error
+
+    def _search_params(self, name, count, language) -> dict:
+        return {
+            'name': name,
+            'count': count,
+            'language': language,
+            'format': 'json',
+        }
+
+    def _forecast_params(self, latitude, longitude, variables) -> dict:
+        return {
+            'latitude': latitude,
+            'longitude': longitude,
+            **variables,
+            'timezone': 'auto',
+        }
+
+    def _forecast_many_params(self, coordinates, variables) -> dict:
+        return self._forecast_params(
+            ','.join(str(latitude) for latitude, _ in coordinates),
+            ','.join(str(longitude) for _, longitude in coordinates),
+            variables,
+        )
+
+    def search(self, name, count, language='en') -> List[dict]:
+        params = self._search_params(name, count, language)
+        return self.get(self.geocoding_url, params).get('results') or []
+
+    async def asearch(self, name, count, language='en') -> List[dict]:
+        params = self._search_params(name, count, language)
+        return (await self.aget(self.geocoding_url, params)).get('results') or []
+
+    def forecast(self, latitude, longitude, variables) -> dict:
+        return self.get(self.forecast_url, self._forecast_params(latitude, longitude, variables))
+
+    async def aforecast(self, latitude, longitude, variables) -> dict:
+        return await self.aget(self.forecast_url, self._forecast_params(latitude, longitude, variables))
+
+    def forecast_many(self, coordinates, variables) -> List[dict]:
+        # Open-Meteo answers a list of coordinates with a list of forecasts in the same order.
+        data = self.get(self.forecast_url, self._forecast_many_params(coordinates, variables))
+        return data if isinstance(data, list) else [data]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OpenMeteoClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenMeteoClient.from_settings()
+    return _client
+
+
+@receiver(setting_changed)
+def reset_client(setting, **kwargs):
+    global _client
+    if setting == 'OPEN_METEO':
+        _client = None
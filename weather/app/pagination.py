@@ -0,0 +1,77 @@
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+
+def encode_cursor(search_date, pk) -> str:
+    payload = json.dumps([search_date.isoformat(), pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor) -> tuple[datetime, int]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        search_date, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(search_date), int(pk)
+    except (TypeError, ValueError):
+        raise InvalidCursor(cursor)
+
+
+def get_page_size(value=None) -> int:
+    options = settings.HISTORY_PAGINATION
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        return options['PAGE_SIZE']
+    return max(1, min(page_size, options['MAX_PAGE_SIZE']))
+
+
+def order_after_cursor(queryset, cursor=None):
+    """Orders ``queryset`` by (-search_date, -id) and keeps only the rows after ``cursor``."""
+    queryset = queryset.order_by('-search_date', '-id')
+    if not cursor:
+        return queryset
+    search_date, pk = decode_cursor(cursor)
+    # The redundant search_date__lte gives the planner an index bound; the OR alone is only a filter.
+    return queryset.filter(
+        Q(search_date__lte=search_date),
+        Q(search_date__lt=search_date) | Q(search_date=search_date, id__lt=pk),
+    )
+
+
+def paginate_by_keyset(queryset, cursor=None, page_size=None) -> KeysetPage:
+    """
+    Returns one page of ``queryset`` ordered by (-search_date, -id).
+
+    The cursor is the (search_date, id) of the last row already shown, so
+    every page is a single index range scan no matter how deep it is.
+    """
+    page_size = page_size or get_page_size()
+    queryset = order_after_cursor(queryset, cursor)
+    items = list(queryset[:page_size + 1])
+    if len(items) <= page_size:
+        return KeysetPage(items)
+    items = items[:page_size]
+    return KeysetPage(items, encode_cursor(items[-1].search_date, items[-1].pk))
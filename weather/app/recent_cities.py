@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.db.models import Max
+
+from .cache_backends import TwoTierCache
+from .models import SearchHistory
+
+RECENT_CITIES_LIMIT = 5
+RECENT_CITIES_TIMEOUT = 60 * 60 * 24 * 7
+LOCK_TIMEOUT = 5
+LOCK_ATTEMPTS = 20
+LOCK_RETRY_DELAY = 0.01
+
+logger = logging.getLogger(__name__)
+
+
+class Identity:
+    """Whose recent cities: a user, or an anonymous visitor by IP address."""
+
+    __slots__ = ('user_id', 'ip')
+
+    def __init__(self, user_id=None, ip=None):
+        self.user_id = user_id
+        self.ip = ip
+
+    @property
+    def cache_key(self) -> str | None:
+        if self.user_id is not None:
+            return f'recent_cities:user:{self.user_id}'
+        if self.ip:
+            return f'recent_cities:ip:{self.ip}'
+        return None
+
+    def history(self):
+        if self.user_id is not None:
+            return SearchHistory.objects.filter(user_id=self.user_id)
+        return SearchHistory.objects.filter(user__isnull=True, ip_address=self.ip)
+
+
+def get_identity(user, ip) -> Identity:
+    return Identity(user_id=user.pk) if user.is_authenticated else Identity(ip=ip)
+
+
+def _get_cache():
+    return caches['default']
+
+
+def _get_lock_cache():
+    # The lock must never be read from a worker's L1 copy.
+    return caches['shared']
+
+
+def _get_fresh(cache, key):
+    # An L1 copy may be up to L1_TIMEOUT old, so the locked read goes to the shared tier.
+    return cache.get_fresh(key) if isinstance(cache, TwoTierCache) else cache.get(key)
+
+
+def _entry(city) -> dict:
+    return {'id': city.id, 'name': city.name}
+
+
+def _prepend(recent, city) -> list:
+    return [_entry(city)] + [entry for entry in recent if entry['id'] != city.id][:RECENT_CITIES_LIMIT - 1]
+
+
+def _recent_from_db_query(identity):
+    return identity.history() \
+        .values('city_id', 'city__name') \
+        .annotate(last_searched=Max('search_date')) \
+        .order_by('-last_searched', '-city_id')[:RECENT_CITIES_LIMIT]
+
+
+def load_recent_cities(identity) -> list:
+    return [{'id': row['city_id'], 'name': row['city__name']} for row in _recent_from_db_query(identity)]
+
+
+async def aload_recent_cities(identity) -> list:
+    return [{'id': row['city_id'], 'name': row['city__name']} async for row in _recent_from_db_query(identity)]
+
+
+def get_recent_cities(identity) -> list:
+    """
+    Returns up to RECENT_CITIES_LIMIT ``{'id', 'name'}`` dicts, newest first,
+    without duplicates. Only a cold cache reads the database.
+    """
+    cache_key = identity.cache_key
+    if cache_key is None:
+        return []
+    cache = _get_cache()
+    recent = cache.get(cache_key)
+    if recent is None:
+        recent = load_recent_cities(identity)
+        # add, not set: a concurrent remember_city() must win over the DB snapshot.
+        cache.add(cache_key, recent, RECENT_CITIES_TIMEOUT)
+    return recent
+
+
+async def aget_recent_cities(identity) -> list:
+    cache_key = identity.cache_key
+    if cache_key is None:
+        return []
+    cache = _get_cache()
+    recent = await cache.aget(cache_key)
+    if recent is None:
+        recent = await aload_recent_cities(identity)
+        await cache.aadd(cache_key, recent, RECENT_CITIES_TIMEOUT)
+    return recent
+
+
+def remember_city(identity, city) -> None:
+    """Moves ``city`` to the front of the list under a cache lock, so concurrent searches never lose an update."""
+    cache_key = identity.cache_key
+    if cache_key is None:
+        return
+    cache, locks, lock_key = _get_cache(), _get_lock_cache(), f'{cache_key}:lock'
+    for _ in range(LOCK_ATTEMPTS):
+        if locks.add(lock_key, 1, LOCK_TIMEOUT):
+            break
+        time.sleep(LOCK_RETRY_DELAY)
+    else:
+        # Dropping the list is safe: the next read rebuilds it from SearchHistory.
+        logger.warning('Не удалось захватить блокировку %s', lock_key)
+        cache.delete(cache_key)
+        return
+    try:
+        recent = _get_fresh(cache, cache_key)
+        if recent is None:
+            recent = load_recent_cities(identity)
+        cache.set(cache_key, _prepend(recent, city), RECENT_CITIES_TIMEOUT)
+    finally:
+        locks.delete(lock_key)
+
+
+async def aremember_city(identity, city) -> None:
+    cache_key = identity.cache_key
+    if cache_key is None:
+        return
+    cache, locks, lock_key = _get_cache(), _get_lock_cache(), f'{cache_key}:lock'
+    for _ in range(LOCK_ATTEMPTS):
+        if await locks.aadd(lock_key, 1, LOCK_TIMEOUT):
+            break
+        await asyncio.sleep(LOCK_RETRY_DELAY)
+    else:
+        logger.warning('Не удалось захватить блокировку %s', lock_key)
+        await cache.adelete(cache_key)
+        return
+    try:
+        recent = await sync_to_async(_get_fresh)(cache, cache_key)
+        if recent is None:
+            recent = await aload_recent_cities(identity)
+        await cache.aset(cache_key, _prepend(recent, city), RECENT_CITIES_TIMEOUT)
+    finally:
+        await locks.adelete(lock_key)
@@ -0,0 +1,244 @@
+"""
+Monthly range partitioning of ``SearchHistory`` by ``search_date`` (PostgreSQL only).
+
+``partition_search_history`` converts the existing table in place: it becomes
+the ``_legacy`` partition covering everything up to the end of the current
+month, so no rows are copied. Partitions for the following months are named
+``<table>_pYYYYMM``; a ``_default`` partition catches rows outside them.
+
+The long parts (checking the rows against the legacy bound and building
+the unique index for the new primary key) run first, without holding an
+ACCESS EXCLUSIVE lock; the switch itself then only changes the catalog.
+Do not start it in the last minutes of a month: rows of the new month
+would not fit the legacy bound.
+"""
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, models, transaction
+
+from .city_stats import forget_searches
+from .models import SearchHistory
+
+TABLE = SearchHistory._meta.db_table
+LEGACY_PARTITION = f'{TABLE}_legacy'
+DEFAULT_PARTITION = f'{TABLE}_default'
+ID_SEQUENCE = f'{TABLE}_partitioned_id_seq'
+LEGACY_RANGE_CONSTRAINT = f'{TABLE}_legacy_range'
+LEGACY_KEY_INDEX = f'{TABLE}_legacy_id_date'
+LEGACY_PRIMARY_KEY = f'{TABLE}_pkey'
+
+_MONTH_PARTITION = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+class PartitioningNotSupported(Exception):
+    pass
+
+
+def _month_start(moment) -> datetime:
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _add_months(month, count) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _partition_name(month) -> str:
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def _check_backend() -> None:
+    if connection.vendor != 'postgresql':
+        raise PartitioningNotSupported(
+            f'Секционирование доступно только на PostgreSQL (текущая СУБД: {connection.vendor})'
+        )
+
+
+def is_partitioned() -> bool:
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def _month_bounds_sql(month) -> str:
+    return f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+
+
+def create_month_partition_sql(month) -> str:
+    return f'CREATE TABLE IF NOT EXISTS {_partition_name(month)} PARTITION OF {TABLE} {_month_bounds_sql(month)}'
+
+
+def get_month_partition_sql(month) -> list:
+    """
+    Statements that add the partition for ``month`` to a partitioned table;
+    run in one transaction. Rows the DEFAULT partition already caught for
+    that month would make CREATE ... PARTITION OF fail, so they are moved
+    into the new table before it is attached.
+    """
+    name = _partition_name(month)
+    return [
+        f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)',
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE search_date >= '{month.isoformat()}' "
+        f"AND search_date < '{_add_months(month, 1).isoformat()}' RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved",
+        f'ALTER TABLE {TABLE} ATTACH PARTITION {name} {_month_bounds_sql(month)}',
+    ]
+
+
+def _foreign_key_sql(field_name) -> str:
+    field = SearchHistory._meta.get_field(field_name)
+    return (
+        f'ALTER TABLE {TABLE} ADD FOREIGN KEY ({field.column}) '
+        f'REFERENCES {field.related_model._meta.db_table} (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+
+
+def _index_sql(index) -> str:
+    columns = ', '.join(
+        f'{SearchHistory._meta.get_field(name).column} {order}'.strip() for name, order in index.fields_orders
+    )
+    return f'CREATE INDEX {index.name} ON {TABLE} ({columns})'
+
+
+def _first_partitioned_month(now=None) -> datetime:
+    return _add_months(_month_start(now or datetime.now(dt_timezone.utc)), 1)
+
+
+def get_preparation_sql(now=None) -> list:
+    """
+    Statements to run before ``get_partitioning_sql``, outside a transaction
+    (CREATE INDEX CONCURRENTLY). The CHECK is added NOT VALID and validated
+    separately, which reads the table under a lock that lets writes through;
+    with it and the (id, search_date) index ATTACH PARTITION scans nothing.
+    """
+    _check_backend()
+    first_month = _first_partitioned_month(now)
+    return [
+        f'ALTER TABLE {TABLE} DROP CONSTRAINT IF EXISTS {LEGACY_RANGE_CONSTRAINT}',
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {LEGACY_RANGE_CONSTRAINT} "
+        f"CHECK (search_date < '{first_month.isoformat()}') NOT VALID",
+        f'ALTER TABLE {TABLE} VALIDATE CONSTRAINT {LEGACY_RANGE_CONSTRAINT}',
+        f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {LEGACY_KEY_INDEX} ON {TABLE} (id, search_date)',
+    ]
+
+
+def get_partitioning_sql(months_ahead=3, now=None) -> list:
+    """Statements that turn the plain table into a partitioned one; run in one transaction."""
+    _check_backend()
+    first_month = _first_partitioned_month(now)
+    quote = connection.ops.quote_name
+    city_index = models.Index(fields=['city'], name=f'{TABLE}_city_id_part_idx')
+
+    statements = [
+        f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE',
+        # The parent owns the id sequence; the identity of the old table cannot move to a partitioned one.
+        f'CREATE SEQUENCE {ID_SEQUENCE} AS bigint',
+        f"SELECT setval('{ID_SEQUENCE}', COALESCE((SELECT MAX(id) FROM {TABLE}), 0) + 1, false)",
+        f'ALTER TABLE {TABLE} ALTER COLUMN id DROP IDENTITY IF EXISTS',
+        f'ALTER TABLE {TABLE} ALTER COLUMN id DROP DEFAULT',
+        # ATTACH PARTITION reuses only a primary key for the parent's one; the prebuilt index becomes it here.
+        f'ALTER TABLE {TABLE} DROP CONSTRAINT {LEGACY_PRIMARY_KEY}',
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {LEGACY_KEY_INDEX} PRIMARY KEY USING INDEX {LEGACY_KEY_INDEX}',
+        f'ALTER TABLE {TABLE} RENAME TO {LEGACY_PARTITION}',
+    ]
+    # Free the index names for the parent; the old indexes are reused by ATTACH PARTITION.
+    statements += [
+        f'ALTER INDEX {quote(index.name)} RENAME TO {quote(index.name + "_legacy")}'
+        for index in SearchHistory._meta.indexes
+    ]
+    statements += [
+        f'CREATE TABLE {TABLE} (LIKE {LEGACY_PARTITION} INCLUDING DEFAULTS) PARTITION BY RANGE (search_date)',
+        f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{ID_SEQUENCE}')",
+        f'ALTER SEQUENCE {ID_SEQUENCE} OWNED BY {TABLE}.id',
+        # The partition key has to be part of every unique constraint.
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_partitioned_pkey PRIMARY KEY (id, search_date)',
+        *(_foreign_key_sql(field_name) for field_name in ('city', 'user')),
+        *(_index_sql(index) for index in [*SearchHistory._meta.indexes, city_index]),
+        # Matches the validated CHECK and reuses the (id, search_date) key, so nothing is scanned or built.
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {LEGACY_PARTITION} "
+        f"FOR VALUES FROM (MINVALUE) TO ('{first_month.isoformat()}')",
+        f'ALTER TABLE {LEGACY_PARTITION} DROP CONSTRAINT {LEGACY_RANGE_CONSTRAINT}',
+        *(create_month_partition_sql(_add_months(first_month, offset)) for offset in range(months_ahead)),
+        f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT',
+    ]
+    return statements
+
+
+def partition_search_history(months_ahead=3, now=None) -> list:
+    if is_partitioned():
+        return []
+    now = now or datetime.now(dt_timezone.utc)
+    preparation = get_preparation_sql(now)
+    with connection.cursor() as cursor:
+        for statement in preparation:
+            cursor.execute(statement)
+    statements = get_partitioning_sql(months_ahead, now)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    return preparation + statements
+
+
+def get_month_partitions() -> dict:
+    """Returns ``{month start: partition name}`` for the monthly partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = %s::regclass',
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = _MONTH_PARTITION.match(name)
+        if match:
+            partitions[datetime(int(match[1]), int(match[2]), 1, tzinfo=dt_timezone.utc)] = name
+    return partitions
+
+
+def ensure_month_partitions(months_ahead=3, now=None) -> list:
+    current = _month_start(now or datetime.now(dt_timezone.utc))
+    existing = get_month_partitions()
+    created = []
+    for offset in range(1, months_ahead + 1):
+        month = _add_months(current, offset)
+        if month not in existing:
+            with transaction.atomic(), connection.cursor() as cursor:
+                for statement in get_month_partition_sql(month):
+                    cursor.execute(statement)
+            created.append(_partition_name(month))
+    return created
+
+
+def _count_partition_searches(cursor, name) -> dict:
+    cursor.execute(
+        f'SELECT user_id, city_id, COUNT(*) FROM {name} WHERE user_id IS NOT NULL GROUP BY user_id, city_id'
+    )
+    return {(user_id, city_id): count for user_id, city_id, count in cursor.fetchall()}
+
+
+def remove_expired_partitions(cutoff, detach=False) -> list:
+    """
+    Drops (or, with ``detach``, detaches for archiving) monthly partitions that
+    end before ``cutoff``. Each one is a quick catalog change instead of a
+    long DELETE; its searches are taken out of CitySearchStats in the same
+    transaction.
+    """
+    removed = []
+    for month, name in sorted(get_month_partitions().items()):
+        if _add_months(month, 1) > cutoff:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            counts = _count_partition_searches(cursor, name)
+            if detach:
+                cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+            else:
+                cursor.execute(f'DROP TABLE {name}')
+            forget_searches(counts)
+        removed.append(name)
+    return removed
@@ -0,0 +1,26 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import metrics
+from .city_index import city_index
+from .city_stats import record_searches
+from .models import City, SearchHistory
+
+
+@receiver(post_save, sender=City)
+def add_city_to_index(sender, instance, created, **kwargs):
+    if created:
+        city_index.add(instance.name)
+
+
+@receiver(post_save, sender=SearchHistory)
+def update_city_stats(sender, instance, created, **kwargs):
+    if created:
+        record_searches([instance])
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    if metrics.record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.record_query)
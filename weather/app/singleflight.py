@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+import uuid
+import weakref
+
+from django.core.cache import caches
+
+_MISSING = object()
+# Set by a cancelled leader: its followers start over instead of failing with it.
+_RETRY = object()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one execution.
+
+    Callers inside a process wait on the leader thread. Across processes the
+    leader holds a lock in the shared cache and publishes its result there,
+    so followers in other workers poll for it instead of calling upstream.
+    ``ado`` does the same for coroutines, coalescing per event loop.
+    """
+
+    def __init__(self, namespace, cache_alias='shared', lock_timeout=30, result_timeout=10, poll_interval=0.05):
+        self.namespace = namespace
+        self.cache_alias = cache_alias
+        self.lock_timeout = lock_timeout
+        self.result_timeout = result_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = weakref.WeakKeyDictionary()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_shared(key, fn)
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def _do_shared(self, key, fn):
+        cache = caches[self.cache_alias]
+        lock_key = f'singleflight:{self.namespace}:{key}:lock'
+        token = uuid.uuid4().hex
+
+        if cache.add(lock_key, token, self.lock_timeout):
+            try:
+                result = fn()
+                cache.set(self._result_key(key, token), result, self.result_timeout)
+                return result
+            finally:
+                cache.delete(lock_key)
+
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            leader_token = cache.get(lock_key)
+            if leader_token is None:
+                break
+            time.sleep(self.poll_interval)
+            result = cache.get(self._result_key(key, leader_token), _MISSING)
+            if result is not _MISSING:
+                return result
+        return fn()
+
+    async def ado(self, key, fn):
+        loop = asyncio.get_running_loop()
+        calls = self._async_calls.setdefault(loop, {})
+        while (future := calls.get(key)) is not None:
+            result = await asyncio.shield(future)
+            if result is not _RETRY:
+                return result
+
+        future = calls[key] = loop.create_future()
+        try:
+            result = await self._ado_shared(key, fn)
+        except Exception as error:
+            future.set_exception(error)
+            # Mark the exception as retrieved when nobody else was waiting for it.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            calls.pop(key, None)
+            if not future.done():
+                future.set_result(_RETRY)
+
+    async def _ado_shared(self, key, fn):
+        cache = caches[self.cache_alias]
+        lock_key = f'singleflight:{self.namespace}:{key}:lock'
+        token = uuid.uuid4().hex
+
+        if await cache.aadd(lock_key, token, self.lock_timeout):
+            try:
+                result = await fn()
+                await cache.aset(self._result_key(key, token), result, self.result_timeout)
+                return result
+            finally:
+                await cache.adelete(lock_key)
+
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            leader_token = await cache.aget(lock_key)
+            if leader_token is None:
+                break
+            await asyncio.sleep(self.poll_interval)
+            result = await cache.aget(self._result_key(key, leader_token), _MISSING)
+            if result is not _MISSING:
+                return result
+        return await fn()
+
+    def _result_key(self, key, token):
+        return f'singleflight:{self.namespace}:{key}:result:{token}'
@@ -0,0 +1,179 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import requests
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase
+
+from . import async_views, forecasts
+from .models import City, SearchHistory
+from .open_meteo import OpenMeteoClient
+from .singleflight import SingleFlight
+from .tests_forecasts import isolate_forecasts
+
+GEOCODING_URL = 'https://geo.test/v1/search'
+FORECAST_URL = 'https://forecast.test/v1/forecast'
+
+
+def make_response(status_code, payload, url=FORECAST_URL):
+    return httpx.Response(status_code, json=payload, request=httpx.Request('GET', url))
+
+
+class AsyncOpenMeteoClientTestCase(SimpleTestCase):
+    def setUp(self):
+        self.client_ = OpenMeteoClient(GEOCODING_URL, FORECAST_URL, retries=2, backoff_factor=0, backoff_jitter=0)
+
+    @patch('httpx.AsyncClient.get', new_callable=AsyncMock)
+    async def test_asearch(self, mock_get):
+        mock_get.return_value = make_response(200, {'results': [{'name': 'Moscow'}]}, GEOCODING_URL)
+
+        results = await self.client_.asearch('Mosc', 5)
+
+        self.assertEqual(results, [{'name': 'Moscow'}])
+        mock_get.assert_awaited_once_with(
+            GEOCODING_URL, params={'name': 'Mosc', 'count': 5, 'language': 'en', 'format': 'json'}
+        )
+
+    @patch('httpx.AsyncClient.get', new_callable=AsyncMock)
+    async def test_aforecast_retries_server_errors(self, mock_get):
+        mock_get.side_effect = [make_response(503, {}), make_response(200, {'current_weather': {}})]
+
+        data = await self.client_.aforecast(55.75, 37.62, {'current_weather': 'true'})
+
+        self.assertEqual(data, {'current_weather': {}})
+        self.assertEqual(mock_get.await_count, 2)
+
+    @patch('httpx.AsyncClient.get', new_callable=AsyncMock)
+    async def test_transport_errors_surface_as_request_exceptions(self, mock_get):
+        mock_get.side_effect = httpx.ConnectError('down')
+
+        with self.assertRaises(requests.RequestException):
+            await self.client_.aforecast(55.75, 37.62, {'current_weather': 'true'})
+        self.assertEqual(mock_get.await_count, 3)
+
+    @patch('httpx.AsyncClient.get', new_callable=AsyncMock, side_effect=asyncio.CancelledError)
+    async def test_cancelled_trial_frees_breaker(self, mock_get):
+        breaker = self.client_.breakers[FORECAST_URL]
+        breaker.state, breaker.opened_at = breaker.OPEN, time.monotonic() - breaker.recovery_timeout
+
+        with self.assertRaises(asyncio.CancelledError):
+            await self.client_.aforecast(55.75, 37.62, {'current_weather': 'true'})
+        self.assertTrue(breaker.allow())
+
+    @patch('httpx.AsyncClient.get', new_callable=AsyncMock)
+    async def test_invalid_json_counts_as_failure(self, mock_get):
+        mock_get.return_value = httpx.Response(200, text='<html>Bad gateway</html>',
+                                               request=httpx.Request('GET', FORECAST_URL))
+        breaker = self.client_.breakers[FORECAST_URL]
+        breaker.state, breaker.opened_at = breaker.OPEN, time.monotonic() - breaker.recovery_timeout
+
+        with self.assertRaises(requests.RequestException):
+            await self.client_.aforecast(55.75, 37.62, {'current_weather': 'true'})
+        mock_get.assert_awaited_once()
+        self.assertEqual(breaker.state, breaker.OPEN)
+
+
+class AsyncSingleFlightTestCase(SimpleTestCase):
+    async def test_concurrent_coroutines_share_one_execution(self):
+        cache.clear()
+        flight = SingleFlight('async-test')
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'value'
+
+        results = await asyncio.gather(*(flight.ado('key', fetch) for _ in range(10)))
+
+        self.assertEqual(results, ['value'] * 10)
+        self.assertEqual(len(calls), 1)
+
+    async def test_cancelled_leader_hands_over_to_follower(self):
+        flight = SingleFlight('async-cancel-test')
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(10)
+
+        async def fetch():
+            return 'value'
+
+        leader = asyncio.ensure_future(flight.ado('key', hang))
+        await started.wait()
+        follower = asyncio.ensure_future(flight.ado('key', fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await follower, 'value')
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+
+
+class AsyncWeatherViewTestCase(TestCase):
+    def setUp(self):
+        isolate_forecasts(self)
+        cache.clear()
+        forecasts.get_forecast_cache().clear()
+        self.factory = AsyncRequestFactory()
+        self.weather_data = {'current_weather': {'temperature': 15.5, 'weathercode': 3}}
+
+    def make_request(self, city_name):
+        request = self.factory.post('/get-weather/', {'city': city_name})
+        request.META['REMOTE_ADDR'] = '192.168.1.1'
+        request.user = AnonymousUser()
+
+        async def auser():
+            return request.user
+
+        request.auser = auser
+        return request
+
+    async def fake_aget(self, url, params):
+        if 'name' in params:
+            return {'results': [{'name': 'New City', 'latitude': 40.7128, 'longitude': -74.006}]}
+        return self.weather_data
+
+    async def test_get_weather_for_new_city(self):
+        with patch.object(OpenMeteoClient, 'aget', side_effect=self.fake_aget):
+            response = await async_views.get_weather(self.make_request('New City'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Погода в New City')
+        city = await City.objects.aget(name='New City')
+        self.assertTrue(await SearchHistory.objects.filter(city=city, ip_address='192.168.1.1').aexists())
+        self.assertEqual(await cache.aget('recent_cities:ip:192.168.1.1'), [{'id': city.id, 'name': 'New City'}])
+
+    async def test_get_weather_forecast_error_is_not_recorded(self):
+        async def fail_forecast(url, params):
+            if 'name' in params:
+                return await self.fake_aget(url, params)
+            raise requests.ConnectionError('down')
+
+        with patch.object(OpenMeteoClient, 'aget', side_effect=fail_forecast):
+            response = await async_views.get_weather(self.make_request('New City'))
+
+        self.assertContains(response, 'Не удалось подключиться к сервису погоды')
+        self.assertTrue(await City.objects.filter(name='New City').aexists())
+        self.assertFalse(await SearchHistory.objects.aexists())
+
+    async def test_get_weather_geocoding_error(self):
+        with patch.object(OpenMeteoClient, 'aget', side_effect=requests.ConnectionError('down')):
+            response = await async_views.get_weather(self.make_request('Nowhere'))
+
+        self.assertContains(response, 'Не удалось подключиться к сервису геокодинга')
+        self.assertFalse(await SearchHistory.objects.aexists())
+
+    async def test_city_autocomplete(self):
+        await City.objects.acreate(name='Moscow', latitude=55.75, longitude=37.62)
+        request = self.factory.get('/city-autocomplete/', {'query': 'Mo'})
+
+        with patch.object(OpenMeteoClient, 'aget', AsyncMock(return_value={'results': [{'name': 'Mosul'}]})):
+            response = await async_views.city_autocomplete(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'{"cities": ["Moscow", "Mosul"]}')
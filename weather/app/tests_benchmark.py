@@ -0,0 +1,56 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+import requests
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase
+
+from .benchmark import OpenMeteoStub, percentile
+from .tests_forecasts import isolate_forecasts
+
+
+class OpenMeteoStubTestCase(SimpleTestCase):
+    def test_stub_serves_geocoding_and_multi_location_forecasts(self):
+        with OpenMeteoStub(forecast_days=2) as stub:
+            results = requests.get(f'{stub.url}/search', params={'name': 'Moscow', 'count': 3}).json()['results']
+            self.assertEqual([result['name'] for result in results], ['Moscow', 'Moscow 1', 'Moscow 2'])
+
+            forecast = requests.get(f'{stub.url}/forecast', params={'latitude': '1', 'longitude': '2'}).json()
+            self.assertEqual(len(forecast['hourly']['time']), 48)
+
+            forecasts = requests.get(f'{stub.url}/forecast', params={'latitude': '1,3', 'longitude': '2,4'}).json()
+            self.assertEqual([item['latitude'] for item in forecasts], [1.0, 3.0])
+            self.assertEqual(stub.calls, 3)
+
+    def test_stub_error_rate(self):
+        with OpenMeteoStub(error_rate=1.0) as stub:
+            self.assertEqual(requests.get(f'{stub.url}/search', params={'name': 'Moscow'}).status_code, 503)
+
+    def test_percentile(self):
+        self.assertEqual(percentile([4, 1, 3, 2, 5], 50), 3)
+        self.assertEqual(percentile([1, 2], 95), 1.95)
+        self.assertEqual(percentile([], 99), 0.0)
+
+
+class BenchmarkCommandTestCase(TransactionTestCase):
+    def setUp(self):
+        isolate_forecasts(self)
+
+    def test_command_writes_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'report.json')
+            call_command('benchmark', '--requests', '4', '--concurrency', '1', '--cities', '2',
+                         '--latency-ms', '0', '--output', output, '--clear-cache', stdout=StringIO())
+            with open(output, encoding='utf-8') as file:
+                report = json.load(file)
+
+        results = report['results']
+        self.assertEqual(set(results), {'get_weather', 'city_autocomplete', 'search_history', 'search_history_api'})
+        self.assertEqual(results['get_weather']['requests'], 4)
+        self.assertEqual(results['get_weather']['errors'], 0)
+        # Two cities: one geocoding and one forecast call each, the other requests are served from the cache.
+        self.assertEqual(results['get_weather']['upstream_calls_per_request'], 1.0)
+        self.assertGreater(results['search_history']['db_queries_per_request'], 0)
+        self.assertIn('p99', results['search_history_api']['latency_ms'])
@@ -0,0 +1,119 @@
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+
+def two_tier_caches(location):
+    return {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default-test'},
+        'worker_a': {
+            'BACKEND': 'app.cache_backends.TwoTierCache',
+            'LOCATION': f'{location}-a',
+            'KEY_PREFIX': 'test',
+            'OPTIONS': {'SHARED_ALIAS': 'l2', 'L1_TIMEOUT': 60, 'L1_MAX_ENTRIES': 2,
+                        'GENERATION_CHECK_INTERVAL': 0},
+        },
+        'worker_b': {
+            'BACKEND': 'app.cache_backends.TwoTierCache',
+            'LOCATION': f'{location}-b',
+            'KEY_PREFIX': 'test',
+            'OPTIONS': {'SHARED_ALIAS': 'l2', 'L1_TIMEOUT': 60, 'GENERATION_CHECK_INTERVAL': 0},
+        },
+        'other': {
+            'BACKEND': 'app.cache_backends.TwoTierCache',
+            'LOCATION': f'{location}-other',
+            'KEY_PREFIX': 'other',
+            'OPTIONS': {'SHARED_ALIAS': 'l2'},
+        },
+        'l2': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'{location}-l2'},
+    }
+
+
+class TwoTierCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.settings_override = override_settings(CACHES=two_tier_caches(self.id()))
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.worker_a, self.worker_b, self.l2 = caches['worker_a'], caches['worker_b'], caches['l2']
+        self.worker_a.clear()
+
+    def test_workers_share_l2(self):
+        self.worker_a.set('recent_cities_10.0.0.1', [1, 2])
+
+        self.assertEqual(self.worker_b.get('recent_cities_10.0.0.1'), [1, 2])
+        self.assertEqual(self.worker_b.get_stats()['l2_hits'], 1)
+
+        self.assertEqual(self.worker_b.get('recent_cities_10.0.0.1'), [1, 2])
+        self.assertEqual(self.worker_b.get_stats()['l1_hits'], 1)
+
+    def test_get_fresh_skips_stale_l1(self):
+        self.worker_a.set('key', 1)
+        self.assertEqual(self.worker_b.get('key'), 1)
+        self.worker_a.set('key', 2)
+
+        self.assertEqual(self.worker_b.get('key'), 1)
+        self.assertEqual(self.worker_b.get_fresh('key'), 2)
+        self.assertEqual(self.worker_b.get('key'), 2)
+        self.assertIsNone(self.worker_b.get_fresh('missing'))
+
+    def test_l1_serves_without_l2_round_trip(self):
+        self.worker_a.set('key', 'value')
+        with patch.object(self.l2, 'get', side_effect=AssertionError('L2 must not be read')):
+            with patch.object(self.worker_a, '_sync_generation'):
+                self.assertEqual(self.worker_a.get('key'), 'value')
+
+    def test_cached_values_are_copies(self):
+        self.worker_a.set('key', [1])
+        self.worker_a.get('key').append(2)
+        self.assertEqual(self.worker_a.get('key'), [1])
+
+    def test_l1_is_bounded_lru(self):
+        for key in ('a', 'b', 'c'):
+            self.worker_a.set(key, key)
+        self.assertEqual(self.worker_a.get_stats()['l1_entries'], 2)
+        self.assertEqual(self.worker_a.get('a'), 'a')
+        self.assertEqual(self.worker_a.get_stats()['l2_hits'], 1)
+
+    def test_atomic_operations_go_to_l2(self):
+        self.assertTrue(self.worker_a.add('lock', 'token'))
+        self.assertFalse(self.worker_b.add('lock', 'other'))
+
+        self.worker_a.set('counter', 1)
+        self.assertEqual(self.worker_b.incr('counter'), 2)
+        self.worker_a._store.data.clear()
+        self.assertEqual(self.worker_a.get('counter'), 2)
+
+    def test_generation_bump_drops_other_workers_l1(self):
+        self.worker_a.set('key', 'old')
+        self.worker_b.get('key')
+        self.l2.set('test:key', 'new')
+        self.assertEqual(self.worker_b.get('key'), 'old')
+
+        self.worker_b.invalidate_local()
+        self.worker_a.invalidate_local()
+        self.assertEqual(self.worker_a.get('key'), 'new')
+        self.assertEqual(self.worker_b.get('key'), 'new')
+
+    def test_get_many_and_delete(self):
+        self.worker_a.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.worker_b.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+
+        self.worker_a.delete('a')
+        self.assertIsNone(self.worker_a.get('a'))
+
+    def test_key_is_prefixed_once_in_l2(self):
+        self.worker_a.set('key', 'value')
+        self.assertEqual(self.l2.get('test:key'), 'value')
+        self.assertIn(':1:test:key', self.l2._cache)
+
+    def test_clear_keeps_other_aliases(self):
+        self.worker_a.set('key', 'mine')
+        caches['other'].set('key', 'theirs')
+        self.l2.set('unrelated', 1)
+
+        self.worker_a.clear()
+
+        self.assertIsNone(self.worker_b.get('key'))
+        self.assertEqual(caches['other'].get('key'), 'theirs')
+        self.assertEqual(self.l2.get('unrelated'), 1)
@@ -0,0 +1,89 @@
+from unittest.mock import patch
+
+import requests
+from django.test import SimpleTestCase
+
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .open_meteo import OpenMeteoClient
+
+
+class CircuitBreakerTestCase(SimpleTestCase):
+    def test_opens_after_threshold_and_recovers(self):
+        breaker = CircuitBreaker('test', failure_threshold=2, recovery_timeout=10)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        with patch('app.circuit_breaker.time.monotonic', return_value=breaker.opened_at + 10):
+            self.assertTrue(breaker.allow())
+            # Only one trial call while half-open.
+            self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.as_dict(), {'state': 'closed', 'failures': 0})
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_trial_without_outcome_is_released(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=10)
+        breaker.record_failure()
+        with patch('app.circuit_breaker.time.monotonic', return_value=breaker.opened_at + 10):
+            self.assertTrue(breaker.allow())
+            breaker.release()
+            self.assertTrue(breaker.allow())
+
+    def test_lost_trial_is_retried_after_recovery_timeout(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=10)
+        breaker.record_failure()
+        with patch('app.circuit_breaker.time.monotonic', return_value=breaker.opened_at + 10):
+            self.assertTrue(breaker.allow())
+        with patch('app.circuit_breaker.time.monotonic', return_value=breaker.opened_at + 5):
+            self.assertFalse(breaker.allow())
+        with patch('app.circuit_breaker.time.monotonic', return_value=breaker.opened_at + 10):
+            self.assertTrue(breaker.allow())
+
+    def test_check_raises_connection_error(self):
+        breaker = CircuitBreaker('test', failure_threshold=1)
+        breaker.record_failure()
+        with self.assertRaises(requests.ConnectionError):
+            breaker.check()
+
+
+class ClientCircuitBreakerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.client_ = OpenMeteoClient(
+            geocoding_url='https://geo.test/v1/search',
+            forecast_url='https://forecast.test/v1/forecast',
+            breaker_failure_threshold=2,
+        )
+
+    @patch('requests.Session.get', side_effect=requests.ConnectionError('down'))
+    def test_open_breaker_fails_fast(self, mock_get):
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                self.client_.forecast(1, 2, {})
+
+        with self.assertRaises(CircuitOpenError):
+            self.client_.forecast(1, 2, {})
+        self.assertEqual(mock_get.call_count, 2)
+
+        # Each endpoint has its own breaker.
+        mock_get.side_effect = None
+        mock_get.return_value.json.return_value = {'results': []}
+        self.assertEqual(self.client_.search('Moscow', 1), [])
+
+    @patch('requests.Session.get')
+    def test_client_errors_do_not_open_breaker(self, mock_get):
+        response = requests.Response()
+        response.status_code = 400
+        mock_get.return_value = response
+
+        for _ in range(3):
+            with self.assertRaises(requests.HTTPError):
+                self.client_.forecast(1, 2, {})
+        self.assertEqual(self.client_.breakers[self.client_.forecast_url].state, CircuitBreaker.CLOSED)
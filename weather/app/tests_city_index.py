@@ -0,0 +1,74 @@
+from unittest.mock import patch
+
+from django.core.cache import cache, caches
+from django.test import TestCase
+
+from .city_index import VERSION_CACHE_KEY, CityPrefixIndex, city_index, get_added_key
+from .cruds import create_city, request_cities
+from .models import City
+
+
+class CityPrefixIndexTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        for name in ('Moscow', 'Mosul', 'Monaco', 'London', 'Москва'):
+            City.objects.create(name=name, latitude=0, longitude=0)
+        self.index = CityPrefixIndex(check_interval=0)
+
+    def test_prefix_lookup_is_case_insensitive_and_sorted(self):
+        self.assertEqual(self.index.lookup('mo'), ['Monaco', 'Moscow', 'Mosul'])
+        self.assertEqual(self.index.lookup('MOS'), ['Moscow', 'Mosul'])
+        self.assertEqual(self.index.lookup('моск'), ['Москва'])
+        self.assertEqual(self.index.lookup('mo', limit=1), ['Monaco'])
+        self.assertEqual(self.index.lookup('xyz'), [])
+
+    def test_lookup_without_database_queries_once_built(self):
+        self.index.lookup('mo')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.index.lookup('lon'), ['London'])
+
+    def test_created_city_is_added_incrementally(self):
+        self.index.lookup('mo')
+        version = caches['shared'].get(VERSION_CACHE_KEY)
+
+        with patch.object(self.index, 'refresh') as mock_refresh:
+            self.index.add('Mombasa')
+            self.assertEqual(self.index.lookup('mom'), ['Mombasa'])
+            mock_refresh.assert_not_called()
+        self.assertGreater(caches['shared'].get(VERSION_CACHE_KEY), version)
+
+    def test_other_worker_addition_is_applied_without_rebuild(self):
+        self.index.lookup('mo')
+        other_worker = CityPrefixIndex(check_interval=0)
+        other_worker.add('Mombasa')
+        other_worker.add('Montreal')
+
+        with patch.object(self.index, 'refresh') as mock_refresh, self.assertNumQueries(0):
+            self.assertEqual(self.index.lookup('mo'), ['Mombasa', 'Monaco', 'Montreal', 'Moscow', 'Mosul'])
+        mock_refresh.assert_not_called()
+
+    def test_expired_addition_triggers_rebuild(self):
+        self.index.lookup('mo')
+        City.objects.bulk_create([City(name='Montreal', latitude=0, longitude=0)])
+        CityPrefixIndex().add('Montreal')
+        caches['shared'].delete(get_added_key(caches['shared'].get(VERSION_CACHE_KEY)))
+
+        with patch.object(self.index, 'refresh', wraps=self.index.refresh) as mock_refresh:
+            self.assertEqual(self.index.lookup('mon'), ['Monaco', 'Montreal'])
+        mock_refresh.assert_called_once()
+
+    def test_other_worker_change_triggers_rebuild(self):
+        self.index.lookup('mo')
+        City.objects.bulk_create([City(name='Montreal', latitude=0, longitude=0)])
+        self.index.invalidate()
+
+        self.assertEqual(self.index.lookup('mon'), ['Monaco', 'Montreal'])
+
+    @patch('requests.Session.get')
+    def test_create_city_updates_shared_index(self, mock_get):
+        mock_get.return_value.json.return_value = {'results': []}
+        city_index.lookup('')
+        create_city('Murmansk', 68.97, 33.09)
+
+        self.assertIn({'name': 'Murmansk'}, request_cities('Murm'))
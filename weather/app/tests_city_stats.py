@@ -0,0 +1,84 @@
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from unittest.mock import patch
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .cruds import get_city_stats_from_db
+from .history_writer import SearchHistoryWriter
+from .models import City, CitySearchStats, SearchHistory
+
+
+class CitySearchStatsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.london = City.objects.create(name='London', latitude=51.5074, longitude=-0.1278)
+        self.paris = City.objects.create(name='Paris', latitude=48.8566, longitude=2.3522)
+
+    def test_stats_are_updated_on_every_search(self):
+        earlier = timezone.now() - timedelta(days=1)
+        SearchHistory.objects.create(user=self.user, city=self.london)
+        SearchHistory.objects.create(user=self.user, city=self.london, search_date=earlier)
+        SearchHistory.objects.create(user=self.user, city=self.paris)
+        SearchHistory.objects.create(city=self.paris, ip_address='10.0.0.1')
+
+        stats = CitySearchStats.objects.get(user=self.user, city=self.london)
+        self.assertEqual(stats.count, 2)
+        self.assertGreater(stats.last_searched, earlier)
+        self.assertEqual(CitySearchStats.objects.count(), 2)
+
+    def test_stats_query_does_not_scan_history(self):
+        for _ in range(3):
+            SearchHistory.objects.create(user=self.user, city=self.paris)
+        SearchHistory.objects.create(user=self.user, city=self.london)
+
+        with self.assertNumQueries(1):
+            stats = list(get_city_stats_from_db(self.user))
+        self.assertEqual(stats, [
+            {'city__name': 'Paris', 'count': 3},
+            {'city__name': 'London', 'count': 1},
+        ])
+
+    @override_settings(SEARCH_HISTORY_BUFFER={'MODE': 'buffered', 'MAX_SIZE': 10, 'MAX_DELAY': 60})
+    @patch('threading.Thread.start')
+    def test_buffered_flush_updates_stats(self, mock_start):
+        writer = SearchHistoryWriter()
+        writer.write(SearchHistory(user=self.user, city=self.london))
+        writer.write(SearchHistory(user=self.user, city=self.london))
+        writer.flush()
+
+        self.assertEqual(CitySearchStats.objects.get(user=self.user, city=self.london).count, 2)
+
+    def test_rebuild_command(self):
+        SearchHistory.objects.bulk_create([
+            SearchHistory(user=self.user, city=self.london),
+            SearchHistory(user=self.user, city=self.london),
+            SearchHistory(user=self.user, city=self.paris),
+            SearchHistory(city=self.paris),
+        ])
+        self.assertFalse(CitySearchStats.objects.exists())
+
+        out = StringIO()
+        call_command('rebuild_city_stats', '--batch-size', '1', stdout=out)
+
+        self.assertIn('2', out.getvalue())
+        self.assertEqual(CitySearchStats.objects.get(user=self.user, city=self.london).count, 2)
+        self.assertEqual(CitySearchStats.objects.get(user=self.user, city=self.paris).count, 1)
+
+    def test_migration_backfills_existing_history(self):
+        SearchHistory.objects.bulk_create([
+            SearchHistory(user=self.user, city=self.london),
+            SearchHistory(user=self.user, city=self.london),
+            SearchHistory(city=self.paris),
+        ])
+        migration = import_module('app.migrations.0007_backfill_city_search_stats')
+
+        migration.backfill_city_search_stats(apps, None)
+
+        self.assertEqual(CitySearchStats.objects.get(user=self.user, city=self.london).count, 2)
+        self.assertEqual(CitySearchStats.objects.count(), 1)
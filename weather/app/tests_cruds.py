@@ -6,7 +6,7 @@ from django.core.cache import cache
 from .models import City, SearchHistory
 from .cruds import (
     get_client_ip,
-    get_recent_cities_from_db,
+    get_recent_cities,
     create_city,
     convert_weather_data,
     request_cities,
@@ -59,27 +59,26 @@ class CrudsTestCase(TestCase):
         ip = get_client_ip(request)
         self.assertEqual(ip, '192.168.1.2')
 
-    def test_get_recent_cities_from_db_authenticated(self):
+    def test_get_recent_cities_authenticated(self):
         SearchHistory.objects.create(user=self.user, city=self.city)
         request = self.factory.get('/')
         request.user = self.user
-        cities = get_recent_cities_from_db(request)
-        self.assertEqual(len(cities), 1)
-        self.assertEqual(cities[0].name, 'Test City')
+        cities = get_recent_cities(request)
+        self.assertEqual(cities, [{'id': self.city.id, 'name': 'Test City'}])
 
-    def test_get_recent_cities_from_db_anonymous(self):
+    def test_get_recent_cities_anonymous(self):
         ip = '192.168.1.1'
         request = self.factory.get('/')
         request.user = AnonymousUser()
         request.META = {'REMOTE_ADDR': ip}
 
         # Add to cache
-        cache_key = f'recent_cities_{ip}'
-        cache.set(cache_key, [self.city.id])
+        cache.set(f'recent_cities:ip:{ip}', [{'id': self.city.id, 'name': self.city.name}])
 
-        cities = get_recent_cities_from_db(request)
+        with self.assertNumQueries(0):
+            cities = get_recent_cities(request)
         self.assertEqual(len(cities), 1)
-        self.assertEqual(cities[0].name, 'Test City')
+        self.assertEqual(cities[0]['name'], 'Test City')
 
     def test_create_city_new(self):
         city = create_city('New City', 40.7128, -74.0060)
@@ -148,8 +147,8 @@ class CrudsTestCase(TestCase):
             city=self.city
         ).exists())
 
-        cache_key = f'recent_cities_{ip}'
-        self.assertEqual(cache.get(cache_key), [self.city.id])
+        cache_key = f'recent_cities:ip:{ip}'
+        self.assertEqual(cache.get(cache_key), [{'id': self.city.id, 'name': 'Test City'}])
 
     def test_get_search_history_from_db(self):
         SearchHistory.objects.create(user=self.user, city=self.city)
@@ -168,11 +167,12 @@ from unittest.mock import patch
 
 class CrudsMockAPITests(TestCase):
     def setUp(self):
+        cache.clear()
         self.city = City.objects.create(
             name='Test City', latitude=51.5074, longitude=-0.1278
         )
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_request_cities_api(self, mock_get):
         City.objects.create(name='Mock City Local', latitude=51.5074, longitude=-0.1278)
 
@@ -190,7 +190,7 @@ class CrudsMockAPITests(TestCase):
         self.assertEqual(cities[0]['name'], 'Mock City Local')
         self.assertEqual(cities[1]['name'], 'Mock City 1')
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_city_from_web_success(self, mock_get):
         mock_response = {
             'results': [
@@ -209,7 +209,7 @@ class CrudsMockAPITests(TestCase):
         self.assertEqual(city.latitude, 40.7128)
         self.assertTrue(City.objects.filter(name='New City').exists())
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_city_from_web_not_found(self, mock_get):
         mock_response = {'results': []}
         mock_get.return_value.json.return_value = mock_response
@@ -218,7 +218,7 @@ class CrudsMockAPITests(TestCase):
         city = get_city_from_web('Non-existent City')
         self.assertIsNone(city)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_city_from_web_request_exception(self, mock_get):
         mock_get.side_effect = requests.RequestException('API Error')
 
@@ -3,11 +3,13 @@ from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
 from .models import City, SearchHistory
+from .tests_forecasts import isolate_forecasts
 import json
 
 
 class WeatherViewTests(TestCase):
     def setUp(self):
+        isolate_forecasts(self)
         self.client = Client()
         self.user = User.objects.create_user(username='testuser', password='testpass')
         self.city = City.objects.create(name='Test City', latitude=51.5074, longitude=-0.1278)
@@ -0,0 +1,106 @@
+from unittest.mock import patch
+
+import requests
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from . import forecasts
+from .models import City
+from .tests_forecasts import isolate_forecasts
+
+
+class ForecastApiTestCase(TestCase):
+    def setUp(self):
+        isolate_forecasts(self)
+        forecasts.get_forecast_cache().clear()
+        self.city = City.objects.create(name='London', latitude=51.50853, longitude=-0.12574)
+        self.url = reverse('api:forecast_api')
+        self.weather_data = {
+            'current_weather': {'temperature': 15.5, 'windspeed': 10.2, 'winddirection': 180,
+                                'weathercode': 3, 'time': '2025-05-26T14:00'},
+            'hourly': {
+                'time': ['2025-05-26T00:00', '2025-05-26T01:00'],
+                'temperature_2m': [11.0, 12.0],
+                'relativehumidity_2m': [80, 70],
+                'weathercode': [3, 2],
+            },
+            'daily': {
+                'time': ['2025-05-26'],
+                'temperature_2m_max': [18.0],
+                'temperature_2m_min': [10.0],
+                'weathercode': [3],
+            },
+        }
+        patcher = patch('app.forecasts.fetch_forecast', return_value=self.weather_data)
+        self.mock_fetch = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_forecast_by_city(self):
+        response = self.client.get(self.url, {'city': 'london'})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['city']['name'], 'London')
+        self.assertEqual(data['current']['weathercode'], 'Пасмурно')
+        self.assertEqual(data['hourly'][1]['weather'], 'Переменная облачность')
+        self.assertEqual(data['daily'][0]['avg_temp'], 11.5)
+
+    def test_caching_headers(self):
+        response = self.client.get(self.url, {'city': 'London'})
+
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertIn('public', response['Cache-Control'])
+        max_age = int(response['Cache-Control'].split('max-age=')[1].split(',')[0])
+        self.assertLessEqual(max_age, 3600)
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url, {'city': 'London'})['ETag']
+
+        response = self.client.get(self.url, {'city': 'London'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(self.url, {'city': 'London'}, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.mock_fetch.call_count, 1)
+
+    def test_stale_forecast_has_no_last_modified(self):
+        cache_key = forecasts.get_forecast_cache_key(self.city.latitude, self.city.longitude)
+        forecasts.get_forecast_cache().set(forecasts.get_stale_cache_key(cache_key), self.weather_data)
+
+        response = self.client.get(self.url, {'city': 'London'},
+                                   HTTP_IF_MODIFIED_SINCE=http_date(timezone.now().timestamp()))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['stale'])
+        self.assertNotIn('Last-Modified', response)
+
+    def test_if_modified_since_returns_304(self):
+        last_modified = self.client.get(self.url, {'city': 'London'})['Last-Modified']
+        response = self.client.get(self.url, {'city': 'London'}, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_forecast_by_coordinates(self):
+        response = self.client.get(self.url, {'lat': '48.85', 'lon': '2.35'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['city']['latitude'], 48.85)
+        self.mock_fetch.assert_called_once_with(48.85, 2.35, None)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'lat': '91', 'lon': '0'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'lat': 'north', 'lon': '0'}).status_code, 400)
+
+    def test_unknown_city(self):
+        with patch('api.views.get_city_from_web', return_value=None):
+            response = self.client.get(self.url, {'city': 'Nowhere'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_upstream_error(self):
+        self.mock_fetch.side_effect = requests.ConnectionError('down')
+        response = self.client.get(self.url, {'city': 'London'})
+        self.assertEqual(response.status_code, 503)
@@ -0,0 +1,133 @@
+import json
+import threading
+from unittest.mock import patch
+
+import requests
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from . import forecasts
+from .models import City
+from .tests_forecasts import isolate_forecasts
+
+
+def fake_forecasts(coordinates, variables=None):
+    return [
+        {'latitude': latitude, 'current_weather': {'temperature': latitude, 'weathercode': 0}}
+        for latitude, _ in coordinates
+    ]
+
+
+@override_settings(FORECAST_BATCH={'MAX_CITIES': 5, 'BATCH_SIZE': 2, 'MAX_PARALLEL_REQUESTS': 2})
+class ForecastBatchTestCase(TestCase):
+    def setUp(self):
+        isolate_forecasts(self)
+        forecasts.get_forecast_cache().clear()
+        forecasts.stats.reset()
+        self.url = reverse('api:forecast_batch_api')
+        self.cities = [
+            City.objects.create(name=f'City {i}', latitude=10.0 + i, longitude=20.0 + i) for i in range(4)
+        ]
+
+    def post(self, cities):
+        response = self.client.post(self.url, {'cities': cities}, content_type='application/json')
+        if response.streaming:
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+            return response, {str(line['query']): line for line in lines}
+        return response, None
+
+    @patch('api.views.search_cities_in_web', return_value=[])
+    @patch('app.forecasts.fetch_forecasts', side_effect=fake_forecasts)
+    def test_misses_are_fetched_in_multi_location_batches(self, mock_fetch, mock_geocode):
+        forecasts.get_forecast_cache().set(
+            forecasts.get_forecast_cache_key(10.0, 20.0), {'current_weather': {'temperature': -1}}
+        )
+
+        response, lines = self.post(['City 0', 'city 1', self.cities[2].id, 'City 3', 'Nowhere'])
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines['City 0']['current']['temperature'], -1)
+        self.assertEqual(lines['city 1']['city']['name'], 'City 1')
+        self.assertEqual(lines[str(self.cities[2].id)]['current']['temperature'], 12.0)
+        self.assertEqual(lines['Nowhere']['error'], 'Город не найден')
+        mock_geocode.assert_called_once_with('Nowhere', count=1)
+
+        self.assertEqual(mock_fetch.call_count, 2)
+        self.assertEqual(sorted(len(call.args[0]) for call in mock_fetch.call_args_list), [1, 2])
+        self.assertEqual(forecasts.stats.as_dict()['hits'], 1)
+
+    @patch('app.forecasts.fetch_forecasts', side_effect=fake_forecasts)
+    def test_results_are_cached(self, mock_fetch):
+        self.post(['City 0', 'City 1'])
+        _, lines = self.post(['City 0', 'City 1'])
+
+        self.assertEqual(mock_fetch.call_count, 1)
+        self.assertEqual(lines['City 1']['current']['temperature'], 11.0)
+
+    @patch('app.forecasts.fetch_forecasts', side_effect=fake_forecasts)
+    def test_same_city_is_fetched_once(self, mock_fetch):
+        _, lines = self.post(['City 0', self.cities[0].id])
+
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(mock_fetch.call_args.args[0], [(10.0, 20.0)])
+
+    @patch('app.forecasts.fetch_forecasts', side_effect=requests.ConnectionError('down'))
+    def test_upstream_error_is_reported_per_city(self, mock_fetch):
+        _, lines = self.post(['City 0', 'City 1'])
+        self.assertEqual(lines['City 0']['error'], 'Не удалось подключиться к сервису погоды')
+
+    @patch('app.forecasts.fetch_forecasts', side_effect=fake_forecasts)
+    def test_unknown_names_are_geocoded(self, mock_fetch):
+        result = {'name': 'Geocoded', 'latitude': 30.0, 'longitude': 40.0}
+        with patch('api.views.search_cities_in_web', return_value=[result]) as mock_geocode:
+            _, lines = self.post(['City 0', 'Geocoded town', 999999])
+
+        mock_geocode.assert_called_once_with('Geocoded town', count=1)
+        self.assertEqual(lines['Geocoded town']['city']['name'], 'Geocoded')
+        self.assertEqual(lines['Geocoded town']['current']['temperature'], 30.0)
+        self.assertEqual(lines['999999']['error'], 'Город не найден')
+        self.assertTrue(City.objects.filter(name='Geocoded').exists())
+        # Geocoded cities are fetched as one more batch after the known ones.
+        self.assertEqual(mock_fetch.call_count, 2)
+
+    @patch('app.forecasts.fetch_forecasts', side_effect=fake_forecasts)
+    def test_known_cities_are_streamed_while_geocoding(self, mock_fetch):
+        both_started, release = threading.Barrier(2, timeout=5), threading.Event()
+
+        def geocode(name, count):
+            # Both lookups run at once, and neither holds back the known city.
+            both_started.wait()
+            release.wait(5)
+            return []
+
+        with patch('api.views.search_cities_in_web', side_effect=geocode):
+            response = self.client.post(self.url, {'cities': ['Nowhere', 'City 0', 'Elsewhere']},
+                                        content_type='application/json')
+            content = iter(response.streaming_content)
+            first = json.loads(next(content))
+            release.set()
+            rest = [json.loads(line) for line in b''.join(content).splitlines()]
+
+        self.assertEqual(first['query'], 'City 0')
+        self.assertEqual({line['query']: line['error'] for line in rest},
+                         {'Nowhere': 'Город не найден', 'Elsewhere': 'Город не найден'})
+
+    @patch('api.views.search_cities_in_web', side_effect=requests.ConnectionError('down'))
+    def test_geocoding_error_is_reported(self, mock_geocode):
+        _, lines = self.post(['Nowhere'])
+        self.assertEqual(lines['Nowhere']['error'], 'Не удалось подключиться к сервису погоды')
+
+    @patch('app.forecasts.fetch_forecasts', side_effect=fake_forecasts)
+    async def test_asgi_response_is_streamed_asynchronously(self, mock_fetch):
+        response = await self.async_client.post(self.url, {'cities': ['City 0', 'City 1']},
+                                                content_type='application/json')
+
+        self.assertTrue(response.is_async)
+        lines = [json.loads(line) async for chunk in response.streaming_content for line in chunk.splitlines()]
+        self.assertEqual({line['query'] for line in lines}, {'City 0', 'City 1'})
+
+    def test_validation(self):
+        self.assertEqual(self.post([])[0].status_code, 400)
+        self.assertEqual(self.post(['City 0'] * 6)[0].status_code, 400)
+        self.assertEqual(self.post([{'name': 'City 0'}])[0].status_code, 400)
@@ -0,0 +1,73 @@
+from datetime import datetime, timezone as dt_timezone
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import translation
+
+from . import cruds, forecasts
+from .models import City
+from .tests_forecasts import isolate_forecasts
+
+
+class ForecastFragmentTestCase(TestCase):
+    def setUp(self):
+        isolate_forecasts(self)
+        forecasts.get_forecast_cache().clear()
+        self.city = City.objects.create(name='Test City', latitude=51.50741, longitude=-0.12782)
+        self.weather_data = {
+            'current_weather': {'temperature': 15.5, 'windspeed': 10, 'winddirection': 180,
+                                'weathercode': 3, 'time': '2025-05-15T12:00'},
+            'hourly': {'time': ['2025-05-15T12:00'], 'temperature_2m': [15.5],
+                       'relativehumidity_2m': [70], 'weathercode': [3]},
+            'daily': {'time': ['2025-05-15'], 'temperature_2m_max': [18.0],
+                      'temperature_2m_min': [9.0], 'weathercode': [3]},
+        }
+        forecasts.get_forecast_cache().set(
+            forecasts.get_forecast_cache_key(self.city.latitude, self.city.longitude),
+            self.weather_data,
+        )
+
+    def test_second_view_reuses_rendered_block(self):
+        with patch('app.cruds.convert_weather_data', wraps=cruds.convert_weather_data) as convert, \
+                patch('app.cruds.get_forecast', wraps=cruds.get_forecast) as get_forecast:
+            first = self.client.post(reverse('app:get_weather'), {'city': 'Test City'})
+            second = self.client.post(reverse('app:get_weather'), {'city': 'Test City'})
+
+        self.assertContains(first, 'Погода в Test City')
+        self.assertContains(second, 'Погода в Test City')
+        self.assertEqual(convert.call_count, 1)
+        self.assertEqual(get_forecast.call_count, 1)
+
+    def test_user_specific_parts_stay_dynamic(self):
+        cruds.render_forecast_block(self.city)
+        response = self.client.post(reverse('app:get_weather'), {'city': 'Test City'})
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertNotIn('csrfmiddlewaretoken', cruds.render_forecast_block(self.city))
+
+    def test_key_depends_on_language_and_model_run(self):
+        with translation.override('ru'):
+            russian = cruds.get_forecast_fragment_key(self.city)
+        with translation.override('en'):
+            english = cruds.get_forecast_fragment_key(self.city)
+        self.assertNotEqual(russian, english)
+
+        next_run = datetime(2025, 5, 15, 13, 0, tzinfo=dt_timezone.utc)
+        with translation.override('ru'), patch('app.cruds.get_model_run', return_value=next_run):
+            self.assertNotEqual(cruds.get_forecast_fragment_key(self.city), russian)
+
+    def test_stale_block_is_not_cached(self):
+        with patch('app.cruds.get_forecast', return_value={**self.weather_data, 'stale': True}):
+            cruds.render_forecast_block(self.city)
+        self.assertIsNone(forecasts.get_forecast_cache().get(cruds.get_forecast_fragment_key(self.city)))
+
+        async_to_sync(cruds.arender_forecast_block)(self.city)
+        self.assertIsNotNone(forecasts.get_forecast_cache().get(cruds.get_forecast_fragment_key(self.city)))
+
+    def test_async_render_shares_cache(self):
+        html = async_to_sync(cruds.arender_forecast_block)(self.city)
+        with patch('app.cruds.convert_weather_data') as convert:
+            self.assertEqual(cruds.render_forecast_block(self.city), html)
+        convert.assert_not_called()
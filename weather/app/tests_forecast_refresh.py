@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest.mock import patch
+
+import requests
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from . import forecast_refresh, forecasts
+from .models import City, ForecastSnapshot, SearchHistory
+from .tests_forecasts import isolate_forecasts
+
+
+class ForecastRefreshTestCase(TestCase):
+    def setUp(self):
+        isolate_forecasts(self)
+        cache.clear()
+        forecasts.get_forecast_cache().clear()
+        self.london = City.objects.create(name='London', latitude=51.50741, longitude=-0.12782)
+        self.paris = City.objects.create(name='Paris', latitude=48.85341, longitude=2.3488)
+        self.london_copy = City.objects.create(name='Лондон', latitude=51.5098, longitude=-0.1301)
+        self.add_searches(self.paris, 3)
+        self.add_searches(self.london, 2)
+        self.add_searches(self.london_copy, 1)
+        old = SearchHistory.objects.create(city=self.london_copy, ip_address='127.0.0.1')
+        SearchHistory.objects.filter(pk=old.pk).update(search_date=timezone.now() - timedelta(days=3))
+        self.weather_data = {'current_weather': {'temperature': 15.5, 'weathercode': 3}}
+
+    def add_searches(self, city, count):
+        for _ in range(count):
+            SearchHistory.objects.create(city=city, ip_address='127.0.0.1')
+
+    def test_popular_cities_are_ranked_and_deduplicated(self):
+        self.assertEqual(forecast_refresh.get_popular_cities(10, 24), [self.paris, self.london])
+        self.assertEqual(forecast_refresh.get_popular_cities(1, 24), [self.paris])
+
+    @patch('app.forecast_refresh.fetch_forecast')
+    def test_refresh_fills_cache_until_next_model_update(self, mock_fetch):
+        mock_fetch.return_value = self.weather_data
+        now = timezone.now()
+
+        with patch('app.forecast_refresh.store_forecasts') as mock_store:
+            result = forecast_refresh.refresh_popular_forecasts(10, 24, 2, 10, now=now)
+
+        self.assertEqual(result, {'refreshed': 2, 'failed': 0, 'skipped': 0})
+        timeout = mock_store.call_args.args[1]
+        expected = (forecasts.get_next_model_update(now) - timezone.now()).total_seconds()
+        self.assertAlmostEqual(timeout, expected, delta=2)
+
+    @patch('app.forecast_refresh.fetch_forecast')
+    def test_refreshed_forecast_is_served_from_cache(self, mock_fetch):
+        mock_fetch.return_value = self.weather_data
+        forecast_refresh.refresh_popular_forecasts(10, 24, 2, 10)
+
+        with patch('app.forecasts.fetch_forecast') as mock_view_fetch:
+            self.assertEqual(forecasts.get_forecast(self.london_copy), self.weather_data)
+            mock_view_fetch.assert_not_called()
+
+    @patch('app.forecast_refresh.fetch_forecast')
+    def test_refreshed_forecasts_are_snapshotted(self, mock_fetch):
+        mock_fetch.return_value = self.weather_data
+        forecast_refresh.refresh_popular_forecasts(10, 24, 2, 10)
+
+        snapshots = ForecastSnapshot.objects.order_by('city__name')
+        self.assertEqual([snapshot.city for snapshot in snapshots], [self.london, self.paris])
+        self.assertEqual({snapshot.model_run for snapshot in snapshots}, {forecasts.get_model_run()})
+
+    @patch('app.forecast_refresh.fetch_forecast')
+    def test_hourly_budget_is_shared_between_runs(self, mock_fetch):
+        mock_fetch.return_value = self.weather_data
+        now = timezone.now()
+
+        first = forecast_refresh.refresh_popular_forecasts(10, 24, 2, 3, now=now)
+        second = forecast_refresh.refresh_popular_forecasts(10, 24, 2, 3, now=now)
+
+        self.assertEqual(first['refreshed'], 2)
+        self.assertEqual(second, {'refreshed': 1, 'failed': 0, 'skipped': 1})
+        self.assertEqual(mock_fetch.call_count, 3)
+
+    @patch('app.forecast_refresh.fetch_forecast', side_effect=requests.ConnectionError('down'))
+    def test_upstream_errors_are_counted(self, mock_fetch):
+        result = forecast_refresh.refresh_popular_forecasts(10, 24, 2, 10)
+        self.assertEqual(result, {'refreshed': 0, 'failed': 2, 'skipped': 0})
+
+    def test_next_run_is_delay_seconds_after_boundary(self):
+        now = datetime(2025, 5, 15, 12, 30, tzinfo=dt_timezone.utc)
+        self.assertEqual(forecast_refresh.get_seconds_until_next_run(120, now), 32 * 60)
+        early = datetime(2025, 5, 15, 12, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(forecast_refresh.get_seconds_until_next_run(120, early), 60)
+
+    @patch('app.forecast_refresh.fetch_forecast')
+    def test_command(self, mock_fetch):
+        mock_fetch.return_value = self.weather_data
+        out = StringIO()
+        call_command('refresh_forecasts', '--workers', '2', stdout=out)
+        self.assertIn('Обновлено прогнозов: 2', out.getvalue())
@@ -0,0 +1,152 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+import requests
+from asgiref.sync import async_to_sync
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import forecast_snapshots, forecasts
+from .models import City, ForecastSnapshot
+from .tests_forecasts import isolate_forecasts
+
+WEATHER_DATA = {
+    'latitude': 51.5,
+    'current_weather': {'temperature': 15.3, 'windspeed': 10.8, 'winddirection': 180,
+                        'weathercode': 3, 'time': '2025-05-15T12:00'},
+    'hourly': {
+        'time': ['2025-05-15T00:00', '2025-05-15T01:00', '2025-05-15T02:00'],
+        'temperature_2m': [12.1, -3.7, None],
+        'relativehumidity_2m': [70, 100, None],
+        'weathercode': [3, 61, 95],
+    },
+    'daily': {
+        'time': ['2025-05-15'],
+        'temperature_2m_max': [18.4],
+        'temperature_2m_min': [9.9],
+        'weathercode': [61],
+    },
+}
+
+
+class PackForecastTestCase(TestCase):
+    def test_round_trip(self):
+        expected = {key: value for key, value in WEATHER_DATA.items() if key != 'latitude'}
+        self.assertEqual(forecast_snapshots.unpack_forecast(forecast_snapshots.pack_forecast(WEATHER_DATA)), expected)
+
+    def test_missing_sections(self):
+        weather_data = {'current_weather': {'temperature': 15.5}}
+        self.assertEqual(forecast_snapshots.unpack_forecast(forecast_snapshots.pack_forecast(weather_data)),
+                         weather_data)
+
+    def test_packed_is_smaller_than_json(self):
+        packed = forecast_snapshots.pack_forecast(WEATHER_DATA)
+        self.assertLess(len(packed), len(json.dumps(WEATHER_DATA)) / 2)
+
+    def test_unknown_version(self):
+        with self.assertRaises(ValueError):
+            forecast_snapshots.unpack_forecast(b'\x09')
+
+
+class ForecastSnapshotTestCase(TestCase):
+    def setUp(self):
+        isolate_forecasts(self)
+        forecasts.get_forecast_cache().clear()
+        self.city = City.objects.create(name='Test City', latitude=51.50741, longitude=-0.12782)
+
+    def _save(self, model_run, weather_data=WEATHER_DATA):
+        forecast_snapshots.save_snapshots({self.city: weather_data}, model_run)
+
+    def test_latest_snapshot_in_one_query(self):
+        run = forecasts.get_model_run()
+        self._save(run - timedelta(hours=1), {'current_weather': {'temperature': 1.0}})
+        self._save(run)
+        with self.assertNumQueries(1):
+            model_run, weather_data = forecast_snapshots.get_latest_snapshot(self.city)
+        self.assertEqual(model_run, run)
+        self.assertEqual(weather_data['current_weather']['temperature'], 15.3)
+
+    def test_same_run_is_replaced(self):
+        run = forecasts.get_model_run()
+        self._save(run, {'current_weather': {'temperature': 1.0}})
+        self._save(run)
+        self.assertEqual(ForecastSnapshot.objects.count(), 1)
+        self.assertEqual(forecast_snapshots.get_latest_snapshot(self.city)[1]['current_weather']['temperature'], 15.3)
+
+    @patch('requests.Session.get')
+    def test_fetch_is_saved_and_reused_after_cache_loss(self, mock_get):
+        mock_get.return_value.json.return_value = WEATHER_DATA
+        mock_get.return_value.raise_for_status.return_value = None
+
+        forecasts.get_forecast(self.city)
+        self.assertEqual(ForecastSnapshot.objects.get().model_run, forecasts.get_model_run())
+
+        forecasts.get_forecast_cache().clear()
+        weather_data = forecasts.get_forecast(self.city)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(weather_data['hourly']['temperature_2m'], [12.1, -3.7, None])
+
+    @patch('requests.Session.get', side_effect=requests.ConnectionError)
+    def test_latest_snapshot_served_as_stale_when_upstream_fails(self, mock_get):
+        self._save(forecasts.get_model_run() - timedelta(hours=3))
+
+        weather_data = forecasts.get_forecast(self.city)
+        self.assertTrue(weather_data['stale'])
+        self.assertEqual(weather_data['current_weather']['temperature'], 15.3)
+        # A stale snapshot is not cached as the fresh forecast.
+        self.assertIsNone(forecasts.get_forecast_cache().get(
+            forecasts.get_forecast_cache_key(self.city.latitude, self.city.longitude)))
+
+    @patch('requests.Session.get', side_effect=requests.ConnectionError)
+    def test_stale_snapshot_is_not_shared_through_the_flight(self, mock_get):
+        self._save(forecasts.get_model_run() - timedelta(hours=3))
+        flight_do, outcomes = forecasts.forecast_flight.do, []
+
+        def do(key, fn):
+            try:
+                result = flight_do(key, fn)
+            except requests.RequestException as error:
+                outcomes.append(error)
+                raise
+            outcomes.append(result)
+            return result
+
+        with patch.object(forecasts.forecast_flight, 'do', side_effect=do):
+            weather_data = forecasts.get_forecast(self.city)
+        self.assertTrue(weather_data['stale'])
+        # refresh_forecast() and _revalidate() joining the flight store its result as fresh.
+        self.assertEqual(len(outcomes), 1)
+        self.assertIsInstance(outcomes[0], requests.ConnectionError)
+
+    @patch('requests.Session.get', side_effect=requests.ConnectionError)
+    def test_upstream_error_without_snapshot(self, mock_get):
+        with self.assertRaises(requests.ConnectionError):
+            forecasts.get_forecast(self.city)
+
+    def test_async_reads_current_snapshot(self):
+        self._save(forecasts.get_model_run())
+        with patch('app.forecasts.afetch_forecast') as afetch:
+            weather_data = async_to_sync(forecasts.aget_forecast)(self.city)
+        afetch.assert_not_called()
+        self.assertEqual(weather_data['daily']['weathercode'], [61])
+
+    @override_settings(FORECAST_SNAPSHOTS={'ENABLED': False, 'RETENTION_DAYS': 7})
+    @patch('requests.Session.get')
+    def test_disabled(self, mock_get):
+        mock_get.return_value.json.return_value = WEATHER_DATA
+        mock_get.return_value.raise_for_status.return_value = None
+        forecasts.get_forecast(self.city)
+        self.assertFalse(ForecastSnapshot.objects.exists())
+
+    def test_purge_command(self):
+        now = timezone.now()
+        self._save(now - timedelta(days=10))
+        self._save(now - timedelta(days=1))
+        out = StringIO()
+        call_command('purge_forecast_snapshots', days=7, stdout=out)
+        self.assertIn('Удалено снимков прогнозов: 1', out.getvalue())
+        self.assertEqual(ForecastSnapshot.objects.count(), 1)
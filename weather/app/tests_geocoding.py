@@ -0,0 +1,93 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from . import geocoding
+from .cruds import search_cities_in_web
+
+MOSCOW = {'name': 'Moscow', 'latitude': 55.75, 'longitude': 37.62}
+MOSCOW_IDAHO = {'name': 'Moscow Mills', 'latitude': 38.95, 'longitude': -90.92}
+MOSUL = {'name': 'Mosul', 'latitude': 36.34, 'longitude': 43.13}
+
+
+@patch('app.open_meteo.OpenMeteoClient.search')
+class GeocodingCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_repeated_query_is_served_from_cache(self, mock_search):
+        mock_search.return_value = [MOSCOW]
+
+        self.assertEqual(search_cities_in_web('Moscow', 1), [MOSCOW])
+        self.assertEqual(search_cities_in_web('  moscow ', 1), [MOSCOW])
+        mock_search.assert_called_once_with('Moscow', 1)
+
+    @override_settings(GEOCODING_CACHE={'TIMEOUT': 3600, 'NEGATIVE_TIMEOUT': 60})
+    def test_empty_answer_is_cached_with_negative_timeout(self, mock_search):
+        mock_search.return_value = []
+
+        with patch.object(cache, 'set_many', wraps=cache.set_many) as mock_set_many:
+            self.assertEqual(search_cities_in_web('Mosckow', 1), [])
+        self.assertEqual(search_cities_in_web('Mosckow', 1), [])
+
+        mock_search.assert_called_once()
+        self.assertEqual(mock_set_many.call_args.args[1], 60)
+
+    def test_longer_prefix_reuses_complete_shorter_result(self, mock_search):
+        mock_search.return_value = [MOSCOW, MOSCOW_IDAHO, MOSUL]
+
+        search_cities_in_web('Mos', 10)
+        self.assertEqual(search_cities_in_web('Mosco', 10), [MOSCOW, MOSCOW_IDAHO])
+        self.assertEqual(search_cities_in_web('Moscow M', 5), [MOSCOW_IDAHO])
+        mock_search.assert_called_once()
+
+    def test_incomplete_shorter_result_is_not_reused(self, mock_search):
+        mock_search.return_value = [MOSCOW, MOSUL]
+
+        search_cities_in_web('Mos', 2)
+        search_cities_in_web('Mosu', 2)
+        self.assertEqual(mock_search.call_count, 2)
+
+    def test_complete_result_serves_smaller_counts(self, mock_search):
+        mock_search.return_value = [MOSCOW, MOSUL]
+
+        search_cities_in_web('Mos', 10)
+        self.assertEqual(geocoding.get_cached_results('mos', 1), [MOSCOW])
+        mock_search.assert_called_once()
+
+    def test_localized_query_is_not_filtered_by_english_names(self, mock_search):
+        mock_search.return_value = [MOSCOW, MOSUL]
+        search_cities_in_web('Мос', 10)
+
+        mock_search.return_value = [MOSCOW]
+        self.assertEqual(search_cities_in_web('Москва', 10), [MOSCOW])
+        self.assertEqual(mock_search.call_count, 2)
+
+    def test_single_city_lookup_never_reuses_prefix(self, mock_search):
+        mock_search.return_value = [MOSCOW, MOSUL]
+        search_cities_in_web('Mos', 10)
+
+        mock_search.return_value = [MOSCOW]
+        self.assertEqual(search_cities_in_web('Moscow', 1), [MOSCOW])
+        self.assertEqual(mock_search.call_count, 2)
+
+    def test_two_character_answers_are_not_reused(self, mock_search):
+        mock_search.return_value = []
+        search_cities_in_web('Mo', 10)
+
+        mock_search.return_value = [MOSCOW]
+        self.assertEqual(search_cities_in_web('Moscow', 10), [MOSCOW])
+        self.assertEqual(mock_search.call_count, 2)
+
+    def test_no_name_match_falls_back_to_upstream(self, mock_search):
+        mock_search.return_value = [MOSCOW, MOSUL]
+        search_cities_in_web('Mos', 10)
+
+        mock_search.return_value = [MOSCOW]
+        self.assertEqual(search_cities_in_web('Moskva', 10), [MOSCOW])
+        self.assertEqual(mock_search.call_count, 2)
+
+    def test_cache_key_has_no_spaces(self, mock_search):
+        self.assertNotIn(' ', geocoding.get_cache_key(geocoding.normalize_query('New  York'), 1))
+        self.assertNotIn(' ', geocoding.get_complete_cache_key('new york'))
@@ -0,0 +1,66 @@
+from unittest.mock import patch
+
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+
+class HealthTestCase(TestCase):
+    def test_healthz(self):
+        response = self.client.get(reverse('app:healthz'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'ok'})
+
+    def test_readyz(self):
+        response = self.client.get(reverse('app:readyz'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'ok', 'database': 'ok', 'cache': 'ok'})
+
+    def test_urls_end_with_slash(self):
+        self.assertEqual(reverse('app:healthz'), '/healthz/')
+        self.assertEqual(reverse('app:readyz'), '/readyz/')
+
+    @patch('app.views.connection.cursor', side_effect=OperationalError('connection refused'))
+    def test_readyz_without_database(self, mock_cursor):
+        with self.assertLogs('app.views', 'ERROR') as logs:
+            response = self.client.get(reverse('app:readyz'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['database'], 'unavailable')
+        self.assertNotIn('connection refused', response.content.decode())
+        self.assertIn('connection refused', logs.output[0])
+
+    @patch('app.views.cache.add', side_effect=ConnectionError('redis is down'))
+    def test_readyz_without_cache(self, mock_add):
+        with self.assertLogs('app.views', 'ERROR') as logs:
+            response = self.client.get(reverse('app:readyz'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['cache'], 'unavailable')
+        self.assertNotIn('redis is down', response.content.decode())
+        self.assertIn('redis is down', logs.output[0])
+
+
+class ServerModeSettingsTestCase(SimpleTestCase):
+    def load_settings(self, **environ):
+        import importlib
+
+        import weather.settings
+        with patch.dict('os.environ', environ):
+            module = importlib.reload(weather.settings)
+        self.addCleanup(importlib.reload, weather.settings)
+        return module
+
+    def test_dev_mode(self):
+        module = self.load_settings(SERVER_MODE='dev')
+        self.assertTrue(module.DEBUG)
+        self.assertEqual(module.DATABASES['default']['ENGINE'], 'django.db.backends.postgresql')
+
+    def test_gevent_mode_uses_bounded_pool(self):
+        module = self.load_settings(SERVER_MODE='gevent', DB_POOL_MAX_CONNS='8')
+        self.assertFalse(module.DEBUG)
+        database = module.DATABASES['default']
+        self.assertEqual(database['ENGINE'], 'django_db_geventpool.backends.postgresql_psycopg2')
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['OPTIONS']['MAX_CONNS'], 8)
+
+    def test_asgi_mode_enables_async_views(self):
+        self.assertTrue(self.load_settings(SERVER_MODE='asgi').ASYNC_VIEWS)
@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from .models import City, SearchHistory
+
+
+class SearchHistoryExportTestCase(TestCase):
+    def setUp(self):
+        self.url = reverse('api:search_history_export_api')
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.other = User.objects.create_user(username='other', password='testpass')
+        self.london = City.objects.create(name='London', latitude=51.5, longitude=-0.12)
+        self.paris = City.objects.create(name='Paris', latitude=48.85, longitude=2.35)
+        for day, city, user in [(1, self.london, self.user), (2, self.paris, self.user),
+                                (3, self.london, self.user), (3, self.paris, self.other)]:
+            entry = SearchHistory.objects.create(user=user, city=city, ip_address='127.0.0.1')
+            SearchHistory.objects.filter(pk=entry.pk).update(
+                search_date=datetime(2025, 5, day, 12, tzinfo=dt_timezone.utc),
+            )
+        self.client.force_login(self.user)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('search_history.csv', response['Content-Disposition'])
+
+        rows = list(csv.reader(io.StringIO(self.read(response))))
+        self.assertEqual(rows[0], ['id', 'user_id', 'city', 'latitude', 'longitude', 'search_date'])
+        self.assertEqual([row[2] for row in rows[1:]], ['London', 'Paris', 'London'])
+        self.assertEqual(rows[1][5], '2025-05-03T12:00:00+00:00')
+
+    def test_ndjson(self):
+        response = self.client.get(self.url, {'export_format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        lines = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[0]['city'], 'London')
+        self.assertEqual(lines[0]['latitude'], 51.5)
+        self.assertEqual({line['user_id'] for line in lines}, {self.user.pk})
+
+    async def test_asgi_response_is_streamed_asynchronously(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url, {'export_format': 'ndjson'})
+
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual([json.loads(line)['city'] for line in body.splitlines()], ['London', 'Paris', 'London'])
+
+    def test_date_range(self):
+        response = self.client.get(self.url, {'export_format': 'ndjson', 'date_from': '2025-05-02',
+                                              'date_to': '2025-05-02'})
+        self.assertEqual([json.loads(line)['city'] for line in self.read(response).splitlines()], ['Paris'])
+
+        response = self.client.get(self.url, {'export_format': 'ndjson', 'date_to': '2025-05-02T12:00:00Z'})
+        self.assertEqual(len(self.read(response).splitlines()), 1)
+
+    def test_single_query(self):
+        response = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.read(response)
+
+    def test_validation(self):
+        self.assertEqual(self.client.get(self.url, {'export_format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'date_from': 'yesterday'}).status_code, 400)
+
+    def test_all_users_requires_staff(self):
+        self.assertEqual(self.client.get(self.url, {'all_users': '1'}).status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(self.url, {'all_users': '1', 'export_format': 'ndjson'})
+        self.assertEqual(len(self.read(response).splitlines()), 4)
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
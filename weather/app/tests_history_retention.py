@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import history_retention, search_history_partitions
+from .city_stats import rebuild_city_stats
+from .models import City, CitySearchStats, SearchHistory
+
+
+class HistoryRetentionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.city = City.objects.create(name='Test City', latitude=51.5, longitude=-0.1)
+        self.now = timezone.now()
+
+    def add_search(self, days_ago, user=None):
+        entry = SearchHistory.objects.create(city=self.city, user=user, ip_address='127.0.0.1')
+        SearchHistory.objects.filter(pk=entry.pk).update(search_date=self.now - timedelta(days=days_ago))
+        return entry
+
+    def test_anonymous_and_authenticated_retention(self):
+        kept = [self.add_search(5), self.add_search(100, self.user)]
+        self.add_search(40)
+        self.add_search(400, self.user)
+
+        result = history_retention.purge_search_history(30, 365, now=self.now)
+
+        self.assertEqual(result['deleted'], {'anonymous': 1, 'authenticated': 1})
+        self.assertEqual(list(SearchHistory.objects.order_by('pk')), kept)
+
+    def test_purge_updates_city_stats(self):
+        other_city = City.objects.create(name='Other City', latitude=48.8, longitude=2.3)
+        self.add_search(100, self.user)
+        self.add_search(400, self.user)
+        SearchHistory.objects.create(city=other_city, user=self.user, search_date=self.now - timedelta(days=400))
+        rebuild_city_stats()
+
+        history_retention.purge_search_history(30, 365, now=self.now)
+
+        self.assertEqual(CitySearchStats.objects.get(user=self.user, city=self.city).count, 1)
+        self.assertFalse(CitySearchStats.objects.filter(city=other_city).exists())
+
+    def test_zero_days_keeps_rows_forever(self):
+        self.add_search(400, self.user)
+        result = history_retention.purge_search_history(30, 0, now=self.now)
+        self.assertEqual(result['deleted']['authenticated'], 0)
+        self.assertEqual(SearchHistory.objects.count(), 1)
+
+    def test_deletes_in_batches(self):
+        for _ in range(5):
+            self.add_search(40)
+        expired = SearchHistory.objects.filter(search_date__lt=self.now - timedelta(days=30))
+
+        # Every batch is one SELECT of ids and one DELETE; the last short batch ends the loop.
+        with self.assertNumQueries(6):
+            deleted = history_retention.delete_in_batches(expired, batch_size=2)
+        self.assertEqual(deleted, 5)
+        self.assertFalse(SearchHistory.objects.exists())
+
+    def test_purge_command(self):
+        self.add_search(40)
+        out = StringIO()
+        call_command('purge_search_history', anonymous_days=30, authenticated_days=365, stdout=out)
+        self.assertIn('Удалено записей: анонимных 1, авторизованных 0', out.getvalue())
+
+
+class SearchHistoryPartitionsTestCase(TestCase):
+    def test_add_months_wraps_years(self):
+        month = datetime(2026, 11, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(search_history_partitions._add_months(month, 2), datetime(2027, 1, 1, tzinfo=dt_timezone.utc))
+
+    def test_partition_command_requires_postgresql(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('PostgreSQL supports partitioning')
+        with self.assertRaises(CommandError):
+            call_command('partition_search_history', stdout=StringIO())
+
+    def test_partitioning_sql(self):
+        now = datetime(2026, 10, 18, tzinfo=dt_timezone.utc)
+        with patch.object(connection, 'vendor', 'postgresql'):
+            statements = search_history_partitions.get_partitioning_sql(months_ahead=2, now=now)
+
+        sql = '\n'.join(statements)
+        self.assertIn("ATTACH PARTITION app_searchhistory_legacy FOR VALUES FROM (MINVALUE) TO ('2026-11-01", sql)
+        self.assertIn('CREATE TABLE IF NOT EXISTS app_searchhistory_p202611 PARTITION OF app_searchhistory', sql)
+        self.assertIn('app_searchhistory_p202612', sql)
+        self.assertNotIn('app_searchhistory_p202701', sql)
+        self.assertIn('PRIMARY KEY (id, search_date)', sql)
+        self.assertIn('DROP CONSTRAINT app_searchhistory_pkey', sql)
+        self.assertIn('PRIMARY KEY USING INDEX app_searchhistory_legacy_id_date', sql)
+        self.assertLess(sql.index('USING INDEX'), sql.index('ATTACH PARTITION app_searchhistory_legacy'))
+        self.assertIn('search_user_date_idx', sql)
+        self.assertIn('DROP CONSTRAINT app_searchhistory_legacy_range', sql)
+        self.assertTrue(statements[-1].endswith('DEFAULT'))
+
+    def test_preparation_validates_without_exclusive_lock(self):
+        now = datetime(2026, 10, 18, tzinfo=dt_timezone.utc)
+        with patch.object(connection, 'vendor', 'postgresql'):
+            statements = search_history_partitions.get_preparation_sql(now=now)
+
+        self.assertTrue(any(statement.endswith("CHECK (search_date < '2026-11-01T00:00:00+00:00') NOT VALID")
+                            for statement in statements))
+        self.assertIn('VALIDATE CONSTRAINT app_searchhistory_legacy_range', '\n'.join(statements))
+        self.assertIn('CONCURRENTLY', statements[-1])
+        self.assertFalse(any('LOCK TABLE' in statement for statement in statements))
+
+    def test_month_partition_takes_rows_from_default(self):
+        month = datetime(2027, 1, 1, tzinfo=dt_timezone.utc)
+        statements = search_history_partitions.get_month_partition_sql(month)
+
+        self.assertIn('DELETE FROM app_searchhistory_default', statements[1])
+        self.assertIn('INSERT INTO app_searchhistory_p202701', statements[1])
+        self.assertTrue(statements[-1].startswith(
+            'ALTER TABLE app_searchhistory ATTACH PARTITION app_searchhistory_p202701'
+        ))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Секционирование доступно только на PostgreSQL')
+class SearchHistoryPartitioningTestCase(TransactionTestCase):
+    def setUp(self):
+        self.addCleanup(self.restore_table)
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.city = City.objects.create(name='Test City', latitude=51.5, longitude=-0.1)
+        self.now = timezone.now()
+        self.first_month = search_history_partitions._first_partitioned_month(self.now)
+
+    def restore_table(self):
+        # DDL is not rolled back between tests: put the plain table back for the rest of the suite.
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {search_history_partitions.TABLE} CASCADE')
+        with connection.schema_editor() as editor:
+            editor.create_model(SearchHistory)
+
+    def add_search(self, search_date):
+        entry = SearchHistory.objects.create(city=self.city, user=self.user)
+        SearchHistory.objects.filter(pk=entry.pk).update(search_date=search_date)
+        return entry
+
+    def count_rows(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {table}')
+            return cursor.fetchone()[0]
+
+    def test_partition_ensure_and_remove(self):
+        self.add_search(self.now)
+        search_history_partitions.partition_search_history(months_ahead=1, now=self.now)
+        self.assertTrue(search_history_partitions.is_partitioned())
+        self.assertEqual(self.count_rows(search_history_partitions.LEGACY_PARTITION), 1)
+
+        next_month = self.add_search(self.first_month)
+        later_month = search_history_partitions._add_months(self.first_month, 2)
+        self.add_search(later_month)
+        self.assertEqual(self.count_rows(search_history_partitions.DEFAULT_PARTITION), 1)
+
+        created = search_history_partitions.ensure_month_partitions(months_ahead=3, now=self.now)
+        self.assertIn(search_history_partitions._partition_name(later_month), created)
+        self.assertEqual(self.count_rows(search_history_partitions._partition_name(later_month)), 1)
+        self.assertEqual(self.count_rows(search_history_partitions.DEFAULT_PARTITION), 0)
+
+        rebuild_city_stats()
+        removed = search_history_partitions.remove_expired_partitions(
+            search_history_partitions._add_months(self.first_month, 1),
+        )
+        self.assertEqual(removed, [search_history_partitions._partition_name(self.first_month)])
+        self.assertFalse(SearchHistory.objects.filter(pk=next_month.pk).exists())
+        self.assertEqual(SearchHistory.objects.count(), 2)
+        self.assertEqual(CitySearchStats.objects.get(user=self.user, city=self.city).count, 2)
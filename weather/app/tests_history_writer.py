@@ -0,0 +1,59 @@
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .history_writer import SearchHistoryWriter
+from .models import City, SearchHistory
+
+BUFFERED = {'MODE': 'buffered', 'MAX_SIZE': 3, 'MAX_DELAY': 60}
+
+
+class SearchHistoryWriterTestCase(TestCase):
+    def setUp(self):
+        self.city = City.objects.create(name='Test City', latitude=51.5074, longitude=-0.1278)
+        self.writer = SearchHistoryWriter()
+
+    def test_sync_mode_writes_immediately(self):
+        self.writer.write(SearchHistory(city=self.city, ip_address='10.0.0.1'))
+        self.assertEqual(SearchHistory.objects.count(), 1)
+
+    @override_settings(SEARCH_HISTORY_BUFFER=BUFFERED)
+    @patch('threading.Thread.start')
+    def test_buffered_mode_defers_to_flush(self, mock_start):
+        first = SearchHistory(city=self.city, ip_address='10.0.0.1')
+        self.writer.write(first)
+        self.writer.write(SearchHistory(city=self.city, ip_address='10.0.0.2'))
+        self.assertEqual(SearchHistory.objects.count(), 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.writer.flush(), 2)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "app_searchhistory"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(SearchHistory.objects.count(), 2)
+        self.assertEqual(SearchHistory.objects.get(ip_address='10.0.0.1').search_date, first.search_date)
+        self.assertEqual(self.writer.flush(), 0)
+        mock_start.assert_called_once()
+
+    @override_settings(SEARCH_HISTORY_BUFFER=BUFFERED)
+    @patch('threading.Thread.start')
+    def test_full_buffer_wakes_flusher(self, mock_start):
+        for _ in range(2):
+            self.writer.write(SearchHistory(city=self.city))
+        self.assertFalse(self.writer._wakeup.is_set())
+
+        self.writer.write(SearchHistory(city=self.city))
+        self.assertTrue(self.writer._wakeup.is_set())
+
+    @override_settings(SEARCH_HISTORY_BUFFER=BUFFERED)
+    @patch('threading.Thread.start')
+    def test_failed_flush_keeps_bounded_rows(self, mock_start):
+        for _ in range(2):
+            self.writer.write(SearchHistory(city=self.city))
+
+        with patch.object(SearchHistory.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                self.writer.flush()
+
+        self.assertEqual(self.writer.flush(), 2)
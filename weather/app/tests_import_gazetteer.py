@@ -0,0 +1,65 @@
+import os
+import tempfile
+import zipfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from .models import City
+
+
+def geonames_row(geonameid, name, latitude, longitude, population, ascii_name=None):
+    columns = [''] * 19
+    columns[0] = str(geonameid)
+    columns[1] = name
+    columns[2] = ascii_name or name
+    columns[4] = str(latitude)
+    columns[5] = str(longitude)
+    columns[14] = str(population)
+    return '\t'.join(columns)
+
+
+ROWS = [
+    geonames_row(1, 'Moscow', 46.73, -117.0, 25000),
+    geonames_row(2, 'Moscow', 55.75, 37.62, 10381222),
+    geonames_row(3, 'London', 51.51, -0.13, 7556900),
+    geonames_row(4, 'Tiny Village', 10.0, 10.0, 12),
+    'broken line',
+]
+
+
+class ImportGazetteerTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.tsv_path = os.path.join(self.directory.name, 'cities.txt')
+        with open(self.tsv_path, 'w', encoding='utf-8') as tsv:
+            tsv.write('\n'.join(ROWS) + '\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_import(self, path, *args):
+        out = StringIO()
+        call_command('import_gazetteer', path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_import_tsv_keeps_most_populated_duplicate(self):
+        output = self.run_import(self.tsv_path, '--chunk-size', '1')
+
+        self.assertEqual(City.objects.count(), 3)
+        moscow = City.objects.get(name='Moscow')
+        self.assertEqual((moscow.latitude, moscow.longitude), (55.75, 37.62))
+        self.assertIn('строк/с', output)
+
+    def test_import_zip_with_min_population_upserts_existing(self):
+        City.objects.create(name='London', latitude=0, longitude=0)
+        zip_path = os.path.join(self.directory.name, 'cities.zip')
+        with zipfile.ZipFile(zip_path, 'w') as archive:
+            archive.write(self.tsv_path, 'cities.txt')
+
+        self.run_import(zip_path, '--min-population', '1000')
+
+        self.assertFalse(City.objects.filter(name='Tiny Village').exists())
+        london = City.objects.get(name='London')
+        self.assertEqual((london.latitude, london.longitude), (51.51, -0.13))
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+from unittest.mock import patch
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from weather import settings as settings_module
+
+from . import forecasts, metrics
+from .middleware import TimingMiddleware
+from .models import City
+from .tests_forecasts import isolate_forecasts
+
+
+class MetricsTestCase(SimpleTestCase):
+    def test_workers_are_aggregated_in_multiprocess_mode(self):
+        script = "from app import metrics; metrics.requests_total.labels(view='test', status='200').inc()"
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': directory}
+            for _ in range(2):
+                subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env, check=True)
+            with patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+                body = metrics.render_metrics().decode()
+
+        self.assertIn('weather_requests_total{status="200",view="test"} 2.0', body)
+
+    def test_span_outside_request_is_noop(self):
+        with metrics.span('render'):
+            pass
+        self.assertIsNone(metrics.current_timings.get())
+
+
+@override_settings(METRICS={'SERVER_TIMING': True, 'ALLOWED_IPS': ['127.0.0.1']})
+class TimingMiddlewareTestCase(TestCase):
+    def setUp(self):
+        isolate_forecasts(self)
+        metrics.reset_metrics()
+        forecasts.get_forecast_cache().clear()
+        self.city = City.objects.create(name='Test City', latitude=51.5, longitude=-0.12)
+        forecasts.get_forecast_cache().set(
+            forecasts.get_forecast_cache_key(self.city.latitude, self.city.longitude),
+            {'current_weather': {'temperature': 15.5, 'weathercode': 3}},
+        )
+
+    def test_server_timing_header(self):
+        response = self.client.post(reverse('app:get_weather'), {'city': 'Test City'})
+
+        header = response['Server-Timing']
+        self.assertRegex(header, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertRegex(header, r'render;dur=[\d.]+')
+        self.assertRegex(header, r'convert;dur=[\d.]+')
+        self.assertRegex(header, r'total;dur=[\d.]+')
+
+    @override_settings(METRICS={'SERVER_TIMING': False, 'ALLOWED_IPS': []})
+    def test_server_timing_can_be_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('app:index')))
+
+    @patch('requests.Session.get')
+    def test_upstream_time_per_host(self, mock_get):
+        mock_get.return_value.json.return_value = {'current_weather': {'temperature': 1}}
+        City.objects.create(name='Other City', latitude=10, longitude=10)
+
+        response = self.client.post(reverse('app:get_weather'), {'city': 'Other City'})
+
+        self.assertIn('upstream;dur=', response['Server-Timing'])
+        self.assertIn('desc="api.open-meteo.com x1"', response['Server-Timing'])
+
+    def test_async_requests(self):
+        async def view(request):
+            await asyncio.sleep(0)
+            return HttpResponse()
+
+        response = asyncio.run(TimingMiddleware(view)(RequestFactory().get('/')))
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    def test_metrics_endpoint(self):
+        self.client.post(reverse('app:get_weather'), {'city': 'Test City'})
+
+        response = self.client.get(reverse('app:metrics'))
+
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('weather_request_duration_seconds_count{view="app:get_weather"} 1.0', body)
+        self.assertIn('weather_requests_total{status="200",view="app:get_weather"} 1.0', body)
+        self.assertIn('weather_request_db_queries_bucket{le="0.0",view="app:get_weather"}', body)
+        self.assertIn('weather_request_render_duration_seconds_count{view="app:get_weather"} 1.0', body)
+
+    def test_metrics_endpoint_is_local_only_by_default(self):
+        with self.settings(METRICS=settings_module.METRICS):
+            self.assertEqual(self.client.get(reverse('app:metrics'), REMOTE_ADDR='10.0.0.2').status_code, 403)
+            self.assertEqual(self.client.get(reverse('app:metrics')).status_code, 200)
+
+    @override_settings(METRICS={'SERVER_TIMING': True, 'ALLOWED_IPS': ['10.0.0.1']})
+    def test_metrics_endpoint_allowed_ips(self):
+        self.assertEqual(self.client.get(reverse('app:metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('app:metrics'), REMOTE_ADDR='10.0.0.1').status_code, 200)
@@ -0,0 +1,76 @@
+from unittest.mock import patch
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from .open_meteo import OpenMeteoClient, get_client
+
+
+class OpenMeteoClientTestCase(SimpleTestCase):
+    def setUp(self):
+        self.client_ = OpenMeteoClient(
+            geocoding_url='https://geo.test/v1/search',
+            forecast_url='https://forecast.test/v1/forecast',
+            connect_timeout=1,
+            read_timeout=2,
+            retries=3,
+            pool_size=4,
+            max_concurrency=1,
+        )
+
+    def test_session_is_reused_with_pooled_adapter(self):
+        session = self.client_.session
+        self.assertIs(session, self.client_.session)
+
+        adapter = session.get_adapter('https://forecast.test/')
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.total, 3)
+        self.assertIn(503, adapter.max_retries.status_forcelist)
+
+    @patch('requests.Session.get')
+    def test_search_builds_params_and_timeouts(self, mock_get):
+        mock_get.return_value.json.return_value = {'results': [{'name': 'Moscow'}]}
+
+        results = self.client_.search('Mosc', 5)
+
+        self.assertEqual(results, [{'name': 'Moscow'}])
+        mock_get.assert_called_once_with(
+            'https://geo.test/v1/search',
+            params={'name': 'Mosc', 'count': 5, 'language': 'en', 'format': 'json'},
+            timeout=(1, 2),
+        )
+
+    @patch('requests.Session.get')
+    def test_search_without_results(self, mock_get):
+        mock_get.return_value.json.return_value = {}
+        self.assertEqual(self.client_.search('Nowhere', 1), [])
+
+    @patch('requests.Session.get')
+    def test_forecast_many_joins_coordinates(self, mock_get):
+        mock_get.return_value.json.return_value = [{'latitude': 55.75}, {'latitude': 51.5}]
+
+        results = self.client_.forecast_many([(55.75, 37.62), (51.5, -0.13)], {'current_weather': 'true'})
+
+        self.assertEqual(len(results), 2)
+        params = mock_get.call_args.kwargs['params']
+        self.assertEqual(params['latitude'], '55.75,51.5')
+        self.assertEqual(params['longitude'], '37.62,-0.13')
+
+        mock_get.return_value.json.return_value = {'latitude': 55.75}
+        self.assertEqual(self.client_.forecast_many([(55.75, 37.62)], {}), [{'latitude': 55.75}])
+
+    @patch('requests.Session.get')
+    def test_concurrency_limit(self, mock_get):
+        self.client_.timeout = (1, 0.01)
+        self.client_._slots.acquire()
+        try:
+            with self.assertRaises(requests.ConnectionError):
+                self.client_.forecast(55.75, 37.62, {'current_weather': 'true'})
+        finally:
+            self.client_._slots.release()
+        mock_get.assert_not_called()
+
+    def test_client_follows_settings(self):
+        with override_settings(OPEN_METEO={'GEOCODING_URL': 'http://stub/search', 'FORECAST_URL': 'http://stub/forecast'}):
+            self.assertEqual(get_client().forecast_url, 'http://stub/forecast')
+        self.assertNotEqual(get_client().forecast_url, 'http://stub/forecast')
@@ -0,0 +1,67 @@
+from base64 import b64encode
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import City, SearchHistory
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, paginate_by_keyset
+
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.city = City.objects.create(name='Test City', latitude=51.5074, longitude=-0.1278)
+        now = timezone.now()
+        # Two rows share a timestamp to check that the id breaks ties.
+        dates = [now, now - timedelta(minutes=1), now - timedelta(minutes=1), now - timedelta(minutes=2)]
+        SearchHistory.objects.bulk_create([
+            SearchHistory(user=self.user, city=self.city, search_date=date) for date in dates
+        ])
+        self.expected = list(SearchHistory.objects.order_by('-search_date', '-id').values_list('id', flat=True))
+
+    def test_cursor_round_trip(self):
+        search = SearchHistory.objects.first()
+        self.assertEqual(decode_cursor(encode_cursor(search.search_date, search.pk)), (search.search_date, search.pk))
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('not-a-cursor')
+
+    def test_pages_cover_all_rows_once(self):
+        seen, cursor = [], None
+        while True:
+            page = paginate_by_keyset(SearchHistory.objects.all(), cursor=cursor, page_size=3 if cursor else 1)
+            seen += [search.id for search in page]
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        self.assertEqual(seen, self.expected)
+
+    def test_history_view_pages(self):
+        self.client.login(username='testuser', password='testpass')
+        response = self.client.get(reverse('app:search_history'), {'page_size': 2})
+        self.assertEqual([search.id for search in response.context['searches']], self.expected[:2])
+
+        cursor = response.context['searches'].next_cursor
+        self.assertContains(response, f'?cursor={cursor}')
+        response = self.client.get(reverse('app:search_history'), {'page_size': 2, 'cursor': cursor})
+        self.assertEqual([search.id for search in response.context['searches']], self.expected[2:])
+        self.assertIsNone(response.context['searches'].next_cursor)
+
+        response = self.client.get(reverse('app:search_history'), {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_history_api_pages(self):
+        credentials = b64encode(b'testuser:testpass').decode('utf-8')
+        url = reverse('api:search_history_api')
+
+        data = self.client.get(url, {'page_size': 3}, HTTP_AUTHORIZATION=f'Basic {credentials}').json()
+        self.assertEqual([search['id'] for search in data['searches']], self.expected[:3])
+
+        data = self.client.get(url, {'cursor': data['next']}, HTTP_AUTHORIZATION=f'Basic {credentials}').json()
+        self.assertEqual([search['id'] for search in data['searches']], self.expected[3:])
+        self.assertIsNone(data['next'])
+
+        response = self.client.get(url, {'cursor': '%%%'}, HTTP_AUTHORIZATION=f'Basic {credentials}')
+        self.assertEqual(response.status_code, 400)
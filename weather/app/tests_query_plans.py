@@ -0,0 +1,159 @@
+import re
+from base64 import b64encode
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from . import forecasts, recent_cities
+from .city_index import city_index
+from .models import City, CitySearchStats, SearchHistory
+from .pagination import encode_cursor, order_after_cursor
+from .tests_forecasts import isolate_forecasts
+
+SEQUENTIAL_SCAN = {
+    'postgresql': r'Seq Scan on {table}\b',
+    'sqlite': r'\bSCAN {table}\b',
+}
+SORT = {
+    'postgresql': r'\bSort\b',
+    'sqlite': r'USE TEMP B-TREE FOR ORDER BY',
+}
+
+
+class QueryPlanAssertionsMixin:
+    """
+    EXPLAIN-based assertions for the hot queries.
+
+    On PostgreSQL sequential scans are disabled for the check, because tiny
+    test tables would otherwise be scanned even when a usable index exists.
+    """
+
+    def explain(self, queryset) -> str:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertNoSequentialScan(self, queryset, plan=None):
+        plan = plan or self.explain(queryset)
+        table = re.escape(queryset.model._meta.db_table)
+        pattern = SEQUENTIAL_SCAN.get(connection.vendor)
+        if pattern:
+            self.assertNotRegex(plan, pattern.format(table=table), f'Sequential scan in plan:\n{plan}')
+        return plan
+
+    def assertIndexScan(self, queryset, index_name, ordered=True):
+        plan = self.assertNoSequentialScan(queryset)
+        self.assertIn(index_name, plan, f'Index {index_name} is not used:\n{plan}')
+        if ordered and connection.vendor in SORT:
+            self.assertNotRegex(plan, SORT[connection.vendor], f'Extra sort in plan:\n{plan}')
+
+
+class QueryPlanTestCase(QueryPlanAssertionsMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.city = City.objects.create(name='Test City', latitude=51.5074, longitude=-0.1278)
+
+    def test_user_history_page_uses_composite_index(self):
+        queryset = SearchHistory.objects.filter(user=self.user).order_by('-search_date', '-id')[:51]
+        self.assertIndexScan(queryset, 'search_user_date_idx')
+
+    def test_user_history_next_page_uses_composite_index(self):
+        cursor = encode_cursor(timezone.now(), 100)
+        queryset = order_after_cursor(SearchHistory.objects.filter(user=self.user), cursor)[:51]
+        self.assertIndexScan(queryset, 'search_user_date_idx')
+
+    def test_user_recent_cities_use_an_index(self):
+        # Either the user_id or the composite index; the planner picks by table statistics.
+        self.assertNoSequentialScan(recent_cities._recent_from_db_query(recent_cities.Identity(user_id=self.user.pk)))
+
+    def test_anonymous_recent_cities_use_ip_index(self):
+        queryset = recent_cities._recent_from_db_query(recent_cities.Identity(ip='10.0.0.1'))
+        self.assertIndexScan(queryset, 'search_ip_date_idx', ordered=False)
+
+    def test_anonymous_searches_use_ip_index(self):
+        queryset = SearchHistory.objects.filter(ip_address='10.0.0.1').order_by('-search_date')[:5]
+        self.assertIndexScan(queryset, 'search_ip_date_idx')
+
+    def test_city_stats_use_user_count_index(self):
+        queryset = CitySearchStats.objects.filter(user=self.user).order_by('-count')
+        self.assertIndexScan(queryset, 'city_stats_user_count_idx')
+
+    def test_city_lookup_by_name_uses_functional_index(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Functional pattern index exists only on PostgreSQL')
+        self.assertIndexScan(City.objects.filter(name__iexact='test city'), 'app_city_name_upper_like', ordered=False)
+        self.assertIndexScan(City.objects.filter(name__istartswith='tes'), 'app_city_name_upper_like', ordered=False)
+
+
+class ViewQueryCountTestCase(TestCase):
+    """Query budgets per view; an N+1 shows up as a budget that grows with the data."""
+
+    def setUp(self):
+        isolate_forecasts(self)
+        cache.clear()
+        forecasts.get_forecast_cache().clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.cities = [
+            City.objects.create(name=f'Test City {i}', latitude=50 + i, longitude=10 + i) for i in range(5)
+        ]
+        for city in self.cities:
+            for _ in range(3):
+                SearchHistory.objects.create(user=self.user, city=city)
+        self.credentials = b64encode(b'testuser:testpass').decode('utf-8')
+
+    def test_index_anonymous(self):
+        # recent cities of this IP, cached even when empty
+        with self.assertNumQueries(1):
+            self.client.get(reverse('app:index'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('app:index'))
+
+    def test_index_authenticated(self):
+        self.client.login(username='testuser', password='testpass')
+        # session + user + recent cities, which are then cached
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('app:index'))
+        self.assertContains(response, 'Test City 4')
+        # session + user
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('app:index'))
+        self.assertContains(response, 'Test City 4')
+
+    @patch('requests.Session.get')
+    def test_get_weather_with_cached_forecast(self, mock_get):
+        city = self.cities[0]
+        forecasts.get_forecast_cache().set(
+            forecasts.get_forecast_cache_key(city.latitude, city.longitude),
+            {'current_weather': {'temperature': 15.5}},
+        )
+        # city lookup + recent cities of this IP + history insert
+        with self.assertNumQueries(3):
+            self.client.post(reverse('app:get_weather'), {'city': city.name})
+        # city lookup + history insert
+        with self.assertNumQueries(2):
+            self.client.post(reverse('app:get_weather'), {'city': city.name})
+        mock_get.assert_not_called()
+
+    @patch('requests.Session.get')
+    def test_city_autocomplete(self, mock_get):
+        city_index.refresh()
+        mock_get.return_value.json.return_value = {'results': []}
+        with self.assertNumQueries(0):
+            self.client.get(reverse('app:city_autocomplete'), {'query': 'Test'})
+
+    def test_history_page(self):
+        self.client.login(username='testuser', password='testpass')
+        # session + user + one page of searches with cities + stats
+        with self.assertNumQueries(4):
+            self.client.get(reverse('app:search_history'))
+
+    def test_history_api(self):
+        # user + one page of searches with cities + stats
+        with self.assertNumQueries(3):
+            self.client.get(reverse('api:search_history_api'), HTTP_AUTHORIZATION=f'Basic {self.credentials}')
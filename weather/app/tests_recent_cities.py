@@ -0,0 +1,92 @@
+import threading
+from datetime import timedelta
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.test import TestCase
+from django.utils import timezone
+
+from . import recent_cities
+from .models import City, SearchHistory
+
+
+class RecentCitiesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.identity = recent_cities.Identity(user_id=self.user.pk)
+        self.cities = [City.objects.create(name=f'City {i}', latitude=i, longitude=i) for i in range(8)]
+
+    def search(self, city, minutes_ago, user=None, ip='10.0.0.1'):
+        entry = SearchHistory.objects.create(city=city, user=user, ip_address=ip)
+        SearchHistory.objects.filter(pk=entry.pk).update(search_date=timezone.now() - timedelta(minutes=minutes_ago))
+
+    def names(self, recent):
+        return [entry['name'] for entry in recent]
+
+    def test_warms_from_db_deduplicated_and_ordered(self):
+        for minutes_ago, index in enumerate([0, 1, 0, 2, 3, 4, 5, 6]):
+            self.search(self.cities[index], minutes_ago, self.user)
+
+        with self.assertNumQueries(1):
+            recent = recent_cities.get_recent_cities(self.identity)
+        self.assertEqual(self.names(recent), ['City 0', 'City 1', 'City 2', 'City 3', 'City 4'])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(recent_cities.get_recent_cities(self.identity), recent)
+
+    def test_identities_are_separate(self):
+        self.search(self.cities[0], 1, self.user, ip='10.0.0.1')
+        self.search(self.cities[1], 1, ip='10.0.0.1')
+        self.search(self.cities[2], 1, ip='10.0.0.2')
+
+        self.assertEqual(self.names(recent_cities.get_recent_cities(self.identity)), ['City 0'])
+        self.assertEqual(self.names(recent_cities.get_recent_cities(recent_cities.Identity(ip='10.0.0.1'))),
+                         ['City 1'])
+        self.assertEqual(recent_cities.get_recent_cities(recent_cities.Identity()), [])
+
+    def test_remember_moves_city_to_front_and_bounds_list(self):
+        for city in self.cities[:6]:
+            recent_cities.remember_city(self.identity, city)
+        recent_cities.remember_city(self.identity, self.cities[3])
+
+        with self.assertNumQueries(0):
+            recent = recent_cities.get_recent_cities(self.identity)
+        self.assertEqual(self.names(recent), ['City 3', 'City 5', 'City 4', 'City 2', 'City 1'])
+
+    def test_concurrent_updates_are_not_lost(self):
+        cache.set(self.identity.cache_key, [])
+        barrier = threading.Barrier(len(self.cities))
+
+        def remember(city):
+            barrier.wait()
+            recent_cities.remember_city(self.identity, city)
+
+        with patch.object(recent_cities, 'RECENT_CITIES_LIMIT', len(self.cities)):
+            threads = [threading.Thread(target=remember, args=(city,)) for city in self.cities]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        recent = recent_cities.get_recent_cities(self.identity)
+        self.assertCountEqual(self.names(recent), [city.name for city in self.cities])
+
+    def test_busy_lock_drops_list(self):
+        recent_cities.remember_city(self.identity, self.cities[0])
+        caches['shared'].add(f'{self.identity.cache_key}:lock', 1)
+
+        with patch.object(recent_cities, 'LOCK_ATTEMPTS', 2):
+            recent_cities.remember_city(self.identity, self.cities[1])
+
+        self.assertIsNone(cache.get(self.identity.cache_key))
+
+    def test_async(self):
+        self.search(self.cities[0], 5, self.user)
+        async_to_sync(recent_cities.aremember_city)(self.identity, self.cities[1])
+        recent = async_to_sync(recent_cities.aget_recent_cities)(self.identity)
+        self.assertEqual(self.names(recent), ['City 1', 'City 0'])
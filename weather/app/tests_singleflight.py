@@ -0,0 +1,91 @@
+import threading
+import time
+from unittest.mock import patch
+
+from django.core.cache import cache, caches
+from django.test import SimpleTestCase
+
+from .cruds import search_cities_in_web
+from .singleflight import SingleFlight
+
+
+class SingleFlightTestCase(SimpleTestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        self.flight = SingleFlight('test', poll_interval=0.01)
+
+    def run_concurrently(self, fn, workers=5):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.flight.do('key', fn)))
+            for _ in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_calls_share_one_execution(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.1)
+            return {'value': 42}
+
+        results = self.run_concurrently(fetch)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'value': 42}] * 5)
+
+    def test_error_is_shared_and_not_cached(self):
+        def fail():
+            raise ValueError('upstream down')
+
+        with self.assertRaises(ValueError):
+            self.flight.do('key', fail)
+        self.assertEqual(self.flight.do('key', lambda: 'ok'), 'ok')
+
+    def test_follower_in_other_worker_reuses_published_result(self):
+        shared = caches['shared']
+        lock_key = 'singleflight:test:key:lock'
+        shared.set(lock_key, 'other-worker')
+
+        def publish():
+            time.sleep(0.05)
+            shared.set('singleflight:test:key:result:other-worker', 'shared')
+            shared.delete(lock_key)
+
+        threading.Thread(target=publish).start()
+        result = self.flight.do('key', lambda: self.fail('upstream must not be called'))
+
+        self.assertEqual(result, 'shared')
+
+
+class GeocodingSingleFlightTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    @patch('requests.Session.get')
+    def test_concurrent_geocoding_calls_are_coalesced(self, mock_get):
+        def slow_response(*args, **kwargs):
+            time.sleep(0.1)
+            return mock_get.return_value
+
+        mock_get.side_effect = slow_response
+        mock_get.return_value.json.return_value = {'results': [{'name': 'Mock City'}]}
+        mock_get.return_value.raise_for_status.return_value = None
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(search_cities_in_web('Mock', 10)))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(results, [[{'name': 'Mock City'}]] * 3)
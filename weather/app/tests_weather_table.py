@@ -0,0 +1,64 @@
+from django.template import Context, Template
+from django.test import SimpleTestCase
+
+from .weather_table import ForecastTable, build_daily_table, build_hourly_table, describe_weather
+
+
+class WeatherTableTestCase(SimpleTestCase):
+    def setUp(self):
+        times = [f'2023-05-{15 + hour // 24}T{hour % 24:02d}:00' for hour in range(7 * 24)]
+        self.hourly = build_hourly_table({
+            'time': times,
+            'temperature_2m': [float(hour % 24) for hour in range(7 * 24)],
+            'relativehumidity_2m': [50 + hour // 24 for hour in range(7 * 24)],
+            'weathercode': [3] * (7 * 24),
+        })
+        self.daily = build_daily_table({
+            'time': [f'2023-05-{15 + day}' for day in range(7)],
+            'temperature_2m_max': [23.0] * 7,
+            'temperature_2m_min': [0.0] * 7,
+            'weathercode': [0, 1, 2, 3, 45, 95, 100],
+        }, self.hourly)
+
+    def test_full_hourly_horizon(self):
+        self.assertEqual(len(self.hourly), 168)
+        self.assertEqual(self.hourly[-1]['time'], '2023-05-21T23:00')
+        self.assertEqual(self.hourly[25].temperature, 1.0)
+
+    def test_derived_columns(self):
+        self.assertEqual(self.hourly['weather'][0], 'Пасмурно')
+        self.assertEqual(self.hourly[10]['temperature_f'], 50.0)
+        self.assertEqual(self.daily['weather'][-1], 'Unknown')
+        self.assertEqual(self.daily[0]['max_temp_f'], 73.4)
+
+    def test_daily_aggregates_from_hourly(self):
+        self.assertEqual(self.daily['avg_temp'], [11.5] * 7)
+        self.assertEqual(self.daily[6]['avg_humidity'], 56)
+
+    def test_derived_columns_are_lazy(self):
+        self.assertNotIn('weather', self.hourly._columns)
+        self.hourly[0]['weather']
+        self.assertIn('weather', self.hourly._columns)
+
+    def test_slice(self):
+        day = self.hourly[24:48]
+        self.assertIsInstance(day, ForecastTable)
+        self.assertEqual(len(day), 24)
+        self.assertEqual(day[0]['time'], '2023-05-16T00:00')
+        self.assertEqual(day[0]['weather'], 'Пасмурно')
+
+    def test_rows_compare_to_dicts(self):
+        table = ForecastTable({'time': ['t1'], 'value': [1]})
+        self.assertEqual(table, [{'time': 't1', 'value': 1}])
+        self.assertEqual(list(ForecastTable({'time': []})), [])
+
+    def test_template_access(self):
+        rendered = Template('{% for hour in hourly|slice:":2" %}{{ hour.time }}={{ hour.weather }};{% endfor %}').render(
+            Context({'hourly': self.hourly})
+        )
+        self.assertEqual(rendered, '2023-05-15T00:00=Пасмурно;2023-05-15T01:00=Пасмурно;')
+
+    def test_describe_weather(self):
+        self.assertEqual(describe_weather(0), 'Ясно')
+        self.assertEqual(describe_weather(None), 'Unknown')
+        self.assertEqual(describe_weather(-1), 'Unknown')
@@ -1,15 +1,21 @@
+from django.conf import settings
 from django.contrib.auth.views import LogoutView, LoginView
 from django.urls import path
 
-from . import views
+from . import async_views, views
 
 app_name = 'app'
 
+weather_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     path('', views.index, name='index'),
-    path('get-weather/', views.get_weather, name='get_weather'),
-    path('city-autocomplete/', views.city_autocomplete, name='city_autocomplete'),
+    path('get-weather/', weather_views.get_weather, name='get_weather'),
+    path('city-autocomplete/', weather_views.city_autocomplete, name='city_autocomplete'),
     path('history/', views.search_history, name='search_history'),
+    path('healthz/', views.healthz, name='healthz'),
+    path('readyz/', views.readyz, name='readyz'),
+    path('metrics', views.prometheus_metrics, name='metrics'),
     path('login/', LoginView.as_view(template_name='app/login.html'), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
 ]
@@ -1,21 +1,30 @@
+import logging
+
 import requests
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render, redirect
 
 from .cruds import (
     add_search_history_into_db,
-    convert_weather_data,
     get_city_from_web,
-    get_recent_cities_from_db,
+    get_recent_cities,
     get_search_history_from_db,
+    render_forecast_block,
     request_cities,
 )
+from . import metrics
 from .models import City
+from .pagination import InvalidCursor, get_page_size
+
+logger = logging.getLogger(__name__)
 
 
 def index(request):
     location_city = None
-    recent_cities = get_recent_cities_from_db(request)
+    recent_cities = get_recent_cities(request)
 
     return render(request, 'app/index.html', {
         'recent_cities': recent_cities,
@@ -43,29 +52,14 @@ def get_weather(request):
                     'error': 'Не удалось подключиться к сервису геокодинга. Пожалуйста, попробуйте позже.'
                 })
 
-        weather_url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            'latitude': city.latitude,
-            'longitude': city.longitude,
-            'current_weather': 'true',
-            'hourly': 'temperature_2m,relativehumidity_2m,weathercode',
-            'daily': 'weathercode,temperature_2m_max,temperature_2m_min',
-            'timezone': 'auto'
-        }
-
         try:
-            response = requests.get(weather_url, params=params)
-            response.raise_for_status()
-            weather_data = response.json()
+            forecast_block = render_forecast_block(city)
 
             add_search_history_into_db(request, city)
-            current_weather, daily_forecast, hourly_forecast = convert_weather_data(weather_data=weather_data)
 
             return render(request, 'app/index.html', {
                 'city': city,
-                'current': current_weather,
-                'daily_forecast': daily_forecast,
-                'hourly_forecast': hourly_forecast
+                'forecast_block': forecast_block,
             })
 
         except requests.RequestException:
@@ -89,9 +83,48 @@ def search_history(request):
     if not request.user.is_authenticated:
         return redirect('app:index')
 
-    searches, city_stats = get_search_history_from_db(user=request.user)
+    try:
+        searches, city_stats = get_search_history_from_db(
+            user=request.user,
+            cursor=request.GET.get('cursor'),
+            page_size=get_page_size(request.GET.get('page_size')),
+        )
+    except InvalidCursor:
+        raise Http404('Некорректный курсор страницы')
 
     return render(request, 'app/history.html', {
         'searches': searches,
         'city_stats': city_stats
     })
+
+
+def prometheus_metrics(request):
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS['ALLOWED_IPS']:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render_metrics(), content_type=metrics.CONTENT_TYPE_LATEST)
+
+
+def healthz(request):
+    return JsonResponse({'status': 'ok'})
+
+
+def readyz(request):
+    checks = {}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        checks['database'] = 'ok'
+    except Exception:
+        # The probe is public, so the reason goes only to the log.
+        logger.exception('Проверка готовности: БД недоступна')
+        checks['database'] = 'unavailable'
+    try:
+        # add() always reaches the shared cache tier, unlike get().
+        cache.add('readyz', 1, 5)
+        checks['cache'] = 'ok'
+    except Exception:
+        logger.exception('Проверка готовности: кэш недоступен')
+        checks['cache'] = 'unavailable'
+
+    ready = all(result == 'ok' for result in checks.values())
+    return JsonResponse({'status': 'ok' if ready else 'unavailable', **checks}, status=200 if ready else 503)
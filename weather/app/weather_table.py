@@ -0,0 +1,175 @@
+from itertools import groupby
+from statistics import fmean
+
+UNKNOWN_WEATHER = 'Unknown'
+
+WEATHER_CODES = {
+    0: 'Ясно',
+    1: 'Преимущественно ясно',
+    2: 'Переменная облачность',
+    3: 'Пасмурно',
+    45: 'Туман',
+    48: 'Туман с инеем',
+    51: 'Легкая морось',
+    53: 'Умеренная морось',
+    55: 'Сильная морось',
+    56: 'Легкая ледяная морось',
+    57: 'Сильная ледяная морось',
+    61: 'Небольшой дождь',
+    63: 'Умеренный дождь',
+    65: 'Сильный дождь',
+    66: 'Легкий ледяной дождь',
+    67: 'Сильный ледяной дождь',
+    71: 'Небольшой снег',
+    73: 'Умеренный снег',
+    75: 'Сильный снег',
+    77: 'Снежные зерна',
+    80: 'Небольшие ливни',
+    81: 'Умеренные ливни',
+    82: 'Сильные ливни',
+    85: 'Небольшие снегопады',
+    86: 'Сильные снегопады',
+    95: 'Гроза',
+    96: 'Гроза с небольшим градом',
+    99: 'Гроза с сильным градом'
+}
+
+# WMO codes are 0..99, so a tuple index replaces the dict lookup in the column transforms.
+_WEATHER_NAMES = tuple(WEATHER_CODES.get(code, UNKNOWN_WEATHER) for code in range(100))
+
+
+def describe_weather(code) -> str:
+    if isinstance(code, int) and 0 <= code < len(_WEATHER_NAMES):
+        return _WEATHER_NAMES[code]
+    return UNKNOWN_WEATHER
+
+
+def celsius_to_fahrenheit(value):
+    return None if value is None else round(value * 9 / 5 + 32, 1)
+
+
+def _mean(values):
+    values = [value for value in values if value is not None]
+    return round(fmean(values), 1) if values else None
+
+
+class Row:
+    """Read-only view of one row of a ``ForecastTable``; supports ``row['name']`` and ``row.name``."""
+
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, name):
+        return self._table.column(name)[self._index]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def as_dict(self) -> dict:
+        return {name: self[name] for name in self._table.names}
+
+    def __eq__(self, other):
+        if isinstance(other, Row):
+            other = other.as_dict()
+        return self.as_dict() == other
+
+    def __repr__(self):
+        return f'Row({self.as_dict()!r})'
+
+
+class ForecastTable:
+    """
+    Forecast stored as columns of equal length.
+
+    Derived columns (``name: (function, source columns)``) are computed with
+    one ``map`` over the zipped sources the first time they are read, and
+    iteration yields lightweight ``Row`` views instead of one dict per row.
+    """
+
+    def __init__(self, columns, derived=None):
+        self._columns = dict(columns)
+        self._derived = dict(derived or {})
+        self.names = tuple(self._columns) + tuple(name for name in self._derived if name not in self._columns)
+        self._length = len(next(iter(self._columns.values()), ()))
+
+    def column(self, name) -> list:
+        if name not in self._columns:
+            function, sources = self._derived[name]
+            self._columns[name] = list(map(function, *(self.column(source) for source in sources)))
+        return self._columns[name]
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return (Row(self, index) for index in range(self._length))
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return ForecastTable(
+                {name: self._columns[name][item] for name in self._columns},
+                self._derived,
+            )
+        if isinstance(item, str):
+            return self.column(item)
+        if item < 0:
+            item += self._length
+        if not 0 <= item < self._length:
+            raise IndexError(item)
+        return Row(self, item)
+
+    def as_records(self) -> list:
+        columns = [self.column(name) for name in self.names]
+        return [dict(zip(self.names, values)) for values in zip(*columns)]
+
+    def __eq__(self, other):
+        if isinstance(other, (ForecastTable, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f'ForecastTable({len(self)} rows, columns={self.names})'
+
+
+def _columns(data, **names) -> dict:
+    if not data or any(source not in data for source in names.values()):
+        return {name: [] for name in names}
+    return {name: data[source] for name, source in names.items()}
+
+
+def build_hourly_table(hourly) -> ForecastTable:
+    columns = _columns(hourly, time='time', temperature='temperature_2m',
+                       humidity='relativehumidity_2m', weathercode='weathercode')
+    return ForecastTable(columns, {
+        'weather': (describe_weather, ('weathercode',)),
+        'temperature_f': (celsius_to_fahrenheit, ('temperature',)),
+    })
+
+
+def _hourly_means(hourly_table, column) -> dict:
+    rows = zip(hourly_table['time'], hourly_table.column(column))
+    return {date: _mean(value for _, value in group) for date, group in groupby(rows, key=lambda row: row[0][:10])}
+
+
+def build_daily_table(daily, hourly_table=None) -> ForecastTable:
+    columns = _columns(daily, date='time', max_temp='temperature_2m_max',
+                       min_temp='temperature_2m_min', weathercode='weathercode')
+    derived = {
+        'weather': (describe_weather, ('weathercode',)),
+        'max_temp_f': (celsius_to_fahrenheit, ('max_temp',)),
+        'min_temp_f': (celsius_to_fahrenheit, ('min_temp',)),
+    }
+    if hourly_table is not None and len(hourly_table):
+        average_temperature = _hourly_means(hourly_table, 'temperature')
+        average_humidity = _hourly_means(hourly_table, 'humidity')
+        derived['avg_temp'] = (average_temperature.get, ('date',))
+        derived['avg_humidity'] = (average_humidity.get, ('date',))
+    return ForecastTable(columns, derived)
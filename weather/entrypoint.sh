@@ -6,6 +6,29 @@ echo "${0}: running migrations."
 python manage.py makemigrations --merge
 python manage.py migrate --noinput
 
+# Workers of one server share their metrics through this directory; values of a previous run are dropped.
+reset_metrics_dir() {
+  export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}"
+  rm -rf "${PROMETHEUS_MULTIPROC_DIR}"
+  mkdir -p "${PROMETHEUS_MULTIPROC_DIR}"
+}
 
-echo "${0}: starting server."
-python manage.py runserver 0.0.0.0:8000
+case "${SERVER_MODE:-dev}" in
+  gevent)
+    python manage.py collectstatic --noinput
+    reset_metrics_dir
+    echo "${0}: starting gunicorn with gevent workers."
+    exec gunicorn weather.wsgi:application -c gunicorn.conf.py
+    ;;
+  asgi)
+    python manage.py collectstatic --noinput
+    reset_metrics_dir
+    echo "${0}: starting uvicorn."
+    exec uvicorn weather.asgi:application --host 0.0.0.0 --port 8000 --workers "${WEB_CONCURRENCY:-4}" \
+      --timeout-keep-alive 5
+    ;;
+  *)
+    echo "${0}: starting server."
+    python manage.py runserver 0.0.0.0:8000
+    ;;
+esac
@@ -3,11 +3,15 @@ from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-SECRET_KEY = 'django-insecure-f@lr&39$()thd1ezaz1yyq^z$!f1xio3d98e_&r20*ms^$nh!d'
+SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-f@lr&39$()thd1ezaz1yyq^z$!f1xio3d98e_&r20*ms^$nh!d')
 
-DEBUG = True
+# 'dev' - runserver; 'gevent' - gunicorn with gevent workers and a pooled DB backend;
+# 'asgi' - uvicorn workers with the async views (see entrypoint.sh and gunicorn.conf.py).
+SERVER_MODE = os.getenv('SERVER_MODE', 'dev')
 
-ALLOWED_HOSTS = []
+DEBUG = os.getenv('DEBUG', '1' if SERVER_MODE == 'dev' else '0') == '1'
+
+ALLOWED_HOSTS = [host for host in os.getenv('ALLOWED_HOSTS', '').split(',') if host]
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -26,7 +30,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.middleware.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -39,7 +45,7 @@ ROOT_URLCONF = 'weather.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'app.template_backends.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -62,9 +68,22 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'weather_pass'),
         'HOST': os.getenv('POSTGRES_HOST', 'db'),
         'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+if SERVER_MODE == 'gevent':
+    # Greenlets share a bounded per-worker pool; keep MAX_CONNS x workers below max_connections.
+    DATABASES['default'].update({
+        'ENGINE': 'django_db_geventpool.backends.postgresql_psycopg2',
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            'MAX_CONNS': int(os.getenv('DB_POOL_MAX_CONNS', '20')),
+            'REUSE_CONNS': int(os.getenv('DB_POOL_REUSE_CONNS', '10')),
+        },
+    })
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -125,12 +144,123 @@ USE_L10N = True
 
 USE_TZ = True
 
+REDIS_URL = os.getenv('REDIS_URL')
+
+# Every alias below is a per-process LRU (L1) in front of the 'shared' store (L2), namespaced there
+# by KEY_PREFIX. Locks and other coordination keys use 'shared' directly, past any L1 copy.
+# Without REDIS_URL the shared store is a local in-memory stand-in (development and tests).
 CACHES = {
     'default': {
+        'BACKEND': 'app.cache_backends.TwoTierCache',
+        'LOCATION': 'default',
+        'KEY_PREFIX': 'default',
+        'OPTIONS': {
+            'SHARED_ALIAS': 'shared',
+            'L1_TIMEOUT': int(os.getenv('CACHE_L1_TIMEOUT', '5')),
+            'L1_MAX_ENTRIES': int(os.getenv('CACHE_L1_MAX_ENTRIES', '1000')),
+        },
+    },
+    'forecasts': {
+        'BACKEND': 'app.cache_backends.TwoTierCache',
+        'LOCATION': 'forecasts',
+        'KEY_PREFIX': 'forecasts',
+        'OPTIONS': {
+            'SHARED_ALIAS': 'shared',
+            'L1_TIMEOUT': int(os.getenv('CACHE_L1_TIMEOUT', '5')),
+            'L1_MAX_ENTRIES': int(os.getenv('FORECAST_CACHE_MAX_ENTRIES', '1000')),
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+OPEN_METEO = {
+    'GEOCODING_URL': os.getenv('OPEN_METEO_GEOCODING_URL', 'https://geocoding-api.open-meteo.com/v1/search'),
+    'FORECAST_URL': os.getenv('OPEN_METEO_FORECAST_URL', 'https://api.open-meteo.com/v1/forecast'),
+    'CONNECT_TIMEOUT': float(os.getenv('OPEN_METEO_CONNECT_TIMEOUT', '3.05')),
+    'READ_TIMEOUT': float(os.getenv('OPEN_METEO_READ_TIMEOUT', '10')),
+    'RETRIES': int(os.getenv('OPEN_METEO_RETRIES', '2')),
+    'BACKOFF_FACTOR': float(os.getenv('OPEN_METEO_BACKOFF_FACTOR', '0.2')),
+    'BACKOFF_JITTER': float(os.getenv('OPEN_METEO_BACKOFF_JITTER', '0.2')),
+    'POOL_SIZE': int(os.getenv('OPEN_METEO_POOL_SIZE', '10')),
+    'MAX_CONCURRENCY': int(os.getenv('OPEN_METEO_MAX_CONCURRENCY', '20')),
+    'ASYNC_MAX_CONCURRENCY': int(os.getenv('OPEN_METEO_ASYNC_MAX_CONCURRENCY', '200')),
+    # Consecutive failures before an endpoint is skipped, and seconds until the next trial call.
+    'BREAKER_FAILURE_THRESHOLD': int(os.getenv('OPEN_METEO_BREAKER_FAILURE_THRESHOLD', '5')),
+    'BREAKER_RECOVERY_TIMEOUT': float(os.getenv('OPEN_METEO_BREAKER_RECOVERY_TIMEOUT', '30')),
 }
 
+# How long the last good forecast is kept to be served (marked as stale) while
+# a background revalidation runs or Open-Meteo is unavailable.
+FORECAST_STALE_TIMEOUT = int(os.getenv('FORECAST_STALE_TIMEOUT', str(60 * 60 * 24)))
+
+# How long search history is kept by manage.py purge_search_history (0 keeps rows forever). On PostgreSQL
+# the table can be partitioned by month (manage.py partition_search_history) so expired months are dropped whole.
+SEARCH_HISTORY_RETENTION = {
+    'ANONYMOUS_DAYS': int(os.getenv('SEARCH_HISTORY_ANONYMOUS_DAYS', '30')),
+    'AUTHENTICATED_DAYS': int(os.getenv('SEARCH_HISTORY_AUTHENTICATED_DAYS', '365')),
+    'BATCH_SIZE': int(os.getenv('SEARCH_HISTORY_PURGE_BATCH_SIZE', '5000')),
+}
+
+# Every fetched forecast is also stored in the database (app.ForecastSnapshot), packed as typed arrays.
+# manage.py purge_forecast_snapshots removes snapshots older than RETENTION_DAYS.
+FORECAST_SNAPSHOTS = {
+    'ENABLED': os.getenv('FORECAST_SNAPSHOTS_ENABLED', '1') == '1',
+    'RETENTION_DAYS': int(os.getenv('FORECAST_SNAPSHOTS_RETENTION_DAYS', '7')),
+}
+
+GEOCODING_CACHE = {
+    'TIMEOUT': int(os.getenv('GEOCODING_CACHE_TIMEOUT', str(60 * 60 * 24))),
+    'NEGATIVE_TIMEOUT': int(os.getenv('GEOCODING_CACHE_NEGATIVE_TIMEOUT', str(60 * 10))),
+}
+
+# 'sync' writes each search inside the request; 'buffered' trades up to MAX_SIZE rows
+# or MAX_DELAY seconds of history on a worker crash for one bulk INSERT per batch.
+SEARCH_HISTORY_BUFFER = {
+    'MODE': os.getenv('SEARCH_HISTORY_WRITE_MODE', 'sync'),
+    'MAX_SIZE': int(os.getenv('SEARCH_HISTORY_BUFFER_SIZE', '100')),
+    'MAX_DELAY': float(os.getenv('SEARCH_HISTORY_BUFFER_DELAY', '5')),
+}
+
+HISTORY_PAGINATION = {
+    'PAGE_SIZE': int(os.getenv('HISTORY_PAGE_SIZE', '50')),
+    'MAX_PAGE_SIZE': int(os.getenv('HISTORY_MAX_PAGE_SIZE', '200')),
+}
+
+# Batch forecast API: misses are fetched in multi-location upstream requests.
+FORECAST_BATCH = {
+    'MAX_CITIES': int(os.getenv('FORECAST_BATCH_MAX_CITIES', '200')),
+    'BATCH_SIZE': int(os.getenv('FORECAST_BATCH_SIZE', '50')),
+    'MAX_PARALLEL_REQUESTS': int(os.getenv('FORECAST_BATCH_MAX_PARALLEL_REQUESTS', '4')),
+}
+
+# Background refresh of the most searched cities (manage.py refresh_forecasts).
+FORECAST_REFRESH = {
+    'CITIES': int(os.getenv('FORECAST_REFRESH_CITIES', '300')),
+    'WINDOW_HOURS': int(os.getenv('FORECAST_REFRESH_WINDOW_HOURS', '24')),
+    'WORKERS': int(os.getenv('FORECAST_REFRESH_WORKERS', '8')),
+    'HOURLY_BUDGET': int(os.getenv('FORECAST_REFRESH_HOURLY_BUDGET', '500')),
+    'DELAY_SECONDS': int(os.getenv('FORECAST_REFRESH_DELAY_SECONDS', '5')),
+}
+
+# Server-Timing header on every response (DEBUG only unless enabled explicitly) and
+# Prometheus metrics at /metrics, served only to ALLOWED_IPS.
+METRICS = {
+    'SERVER_TIMING': os.getenv('METRICS_SERVER_TIMING', '1' if DEBUG else '0') == '1',
+    'ALLOWED_IPS': [ip for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip],
+}
+
+# Serve the forecast and autocomplete views as coroutines (use with an ASGI server).
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', '1' if SERVER_MODE == 'asgi' else '0') == '1'
+
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]